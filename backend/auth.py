@@ -1,10 +1,13 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, Header
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from database import SessionLocal
+from database import SessionLocal, AsyncSessionLocal, ReadSessionLocal, AsyncReadSessionLocal
 import models
+from principal_cache import load_principal, load_principal_async
+from tracing import span
 import uuid
 
 
@@ -17,6 +20,27 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Get async database session (for async def routes)."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_db():
+    """Get read-only database session (for GET endpoints)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """Get async read-only database session (for async GET endpoints)."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
 def create_token(data: dict) -> str:
     """Create a JWT access token from the provided data."""
     to_encode = data.copy()
@@ -29,14 +53,15 @@ def create_token(data: dict) -> str:
 def decode_token(token: str) -> dict:
     """Decode and verify a JWT access token."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("jwt.decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
         return None
 
 
-def get_current_user(authorization: str = Header(None), db: Session = Depends(get_db)):
-    """Get the current authenticated user from the JWT token in Authorization header."""
+def principal_id(authorization: str, principal_type: str) -> str:
+    """Return the subject id of a bearer token issued to principal_type, or raise 401."""
     if authorization is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
@@ -49,88 +74,87 @@ def get_current_user(authorization: str = Header(None), db: Session = Depends(ge
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user_id = payload.get("sub")
+    subject = payload.get("sub")
     user_type = payload.get("type")
     
-    if user_id is None or user_type != "user":
+    if subject is None or user_type != principal_type:
         raise HTTPException(status_code=401, detail="Invalid token")
     
     # Validate UUID format
     try:
-        uuid.UUID(user_id)
+        uuid.UUID(subject)
     except (ValueError, AttributeError):
         raise HTTPException(status_code=401, detail="Invalid token format")
     
-    # Query with string UUID (no conversion needed since DB stores as string)
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    return subject
+
+
+def get_current_user(authorization: str = Header(None), db: Session = Depends(get_read_db)):
+    """Get the current authenticated user from the JWT token in Authorization header."""
+    user_id = principal_id(authorization, "user")
+    
+    # Served from the principal cache when possible, otherwise read on the
+    # read-only connection (string UUID, as stored in the DB)
+    user = load_principal(db, models.User, user_id)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
     return user
 
 
-def get_current_pandit(authorization: str = Header(None), db: Session = Depends(get_db)):
-    """Get the current authenticated pandit from the JWT token in Authorization header."""
-    if authorization is None:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+async def get_current_user_async(authorization: str = Header(None), db: AsyncSession = Depends(get_async_read_db)):
+    """Async, read-only version of get_current_user, for async def routes."""
+    user_id = principal_id(authorization, "user")
     
-    # Remove "Bearer " prefix if present
-    token = authorization
-    if token.startswith("Bearer "):
-        token = token[7:]
-    
-    payload = decode_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user = await load_principal_async(db, models.User, user_id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
     
-    pandit_id = payload.get("sub")
-    user_type = payload.get("type")
+    return user
+
+
+def get_current_pandit(authorization: str = Header(None), db: Session = Depends(get_read_db)):
+    """Get the current authenticated pandit from the JWT token in Authorization header."""
+    pandit_id = principal_id(authorization, "pandit")
     
-    if pandit_id is None or user_type != "pandit":
-        raise HTTPException(status_code=401, detail="Invalid token")
+    # Served from the principal cache when possible, otherwise read on the
+    # read-only connection (string UUID, as stored in the DB)
+    pandit = load_principal(db, models.Pandit, pandit_id)
+    if pandit is None:
+        raise HTTPException(status_code=401, detail="Pandit not found")
     
-    # Validate UUID format
-    try:
-        uuid.UUID(pandit_id)
-    except (ValueError, AttributeError):
-        raise HTTPException(status_code=401, detail="Invalid token format")
+    return pandit
+
+
+async def get_current_pandit_async(authorization: str = Header(None), db: AsyncSession = Depends(get_async_read_db)):
+    """Async, read-only version of get_current_pandit, for async def routes."""
+    pandit_id = principal_id(authorization, "pandit")
     
-    # Query with string UUID (no conversion needed since DB stores as string)
-    pandit = db.query(models.Pandit).filter(models.Pandit.id == pandit_id).first()
+    pandit = await load_principal_async(db, models.Pandit, pandit_id)
     if pandit is None:
         raise HTTPException(status_code=401, detail="Pandit not found")
     
     return pandit
 
 
-def get_current_admin(authorization: str = Header(None), db: Session = Depends(get_db)):
+def get_current_admin(authorization: str = Header(None), db: Session = Depends(get_read_db)):
     """Get the current authenticated admin from the JWT token in Authorization header."""
-    if authorization is None:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    # Remove "Bearer " prefix if present
-    token = authorization
-    if token.startswith("Bearer "):
-        token = token[7:]
-    
-    payload = decode_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    admin_id = principal_id(authorization, "admin")
     
-    admin_id = payload.get("sub")
-    user_type = payload.get("type")
-    
-    if admin_id is None or user_type != "admin":
-        raise HTTPException(status_code=401, detail="Invalid token")
+    # Served from the principal cache when possible, otherwise read on the
+    # read-only connection (string UUID, as stored in the DB)
+    admin = load_principal(db, models.Admin, admin_id)
+    if admin is None:
+        raise HTTPException(status_code=401, detail="Admin not found")
     
-    # Validate UUID format
-    try:
-        uuid.UUID(admin_id)
-    except (ValueError, AttributeError):
-        raise HTTPException(status_code=401, detail="Invalid token format")
+    return admin
+
+
+async def get_current_admin_async(authorization: str = Header(None), db: AsyncSession = Depends(get_async_read_db)):
+    """Async, read-only version of get_current_admin, for async def routes."""
+    admin_id = principal_id(authorization, "admin")
     
-    # Query with string UUID (no conversion needed since DB stores as string)
-    admin = db.query(models.Admin).filter(models.Admin.id == admin_id).first()
+    admin = await load_principal_async(db, models.Admin, admin_id)
     if admin is None:
         raise HTTPException(status_code=401, detail="Admin not found")
     
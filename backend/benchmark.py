@@ -0,0 +1,322 @@
+"""
+End-to-end load benchmark.
+
+Replays a mixed workload against the app in-process through httpx's ASGI
+transport: pandit and service searches, catalog and booking lists, new
+bookings, status transitions (confirm, reject, cancel, complete) and reviews,
+from a number of concurrent clients. Requests are drawn from the rows of a
+dataset made by seed_data.py, and the bookings created during the run feed
+the status transitions and reviews that follow.
+
+Latency percentiles and throughput are reported per operation and can be
+saved as JSON and compared with an earlier run:
+
+    DATABASE_URL=sqlite:///./bench.db python seed_data.py
+    DATABASE_URL=sqlite:///./bench.db python benchmark.py --requests 5000 --concurrency 32 --output before.json
+    DATABASE_URL=sqlite:///./bench.db python benchmark.py --requests 5000 --concurrency 32 --compare before.json
+
+Clients and app share one process and event loop, so the numbers are for
+comparing runs with each other rather than for predicting production latency.
+Write operations change the dataset; re-seed with --reset for identical runs.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import deque, namedtuple
+from datetime import date, datetime, timedelta
+import httpx
+from sqlalchemy import select
+from main import app
+from auth import create_token
+from database import SessionLocal
+from seed_data import SERVICE_CATALOG
+from stats import read_stats
+from writes import write_queue
+import models
+
+# Operation -> share of the workload
+DEFAULT_MIX = {
+    "search_pandits": 25,
+    "available_pandits": 5,
+    "search_services": 20,
+    "list_services": 5,
+    "my_bookings": 10,
+    "create_booking": 12,
+    "booking_status": 15,
+    "review": 8,
+}
+# Seeded bookings loaded as the starting pool of each status
+BOOKING_POOL_SIZE = 5000
+KEYWORDS = sorted({
+    word.lower() for name, category, _, _ in SERVICE_CATALOG for word in (name.split()[0], category)
+})
+
+BookingRef = namedtuple("BookingRef", ["id", "user_id", "pandit_id"])
+
+
+class Workload:
+    """Builds the request for each operation from the seeded rows and the bookings made so far."""
+
+    def __init__(self, db, rng: random.Random):
+        self.rng = rng
+        self.users = db.execute(
+            select(models.User.id).where(models.User.latitude.isnot(None)).order_by(models.User.id)
+        ).scalars().all()
+        self.services = db.execute(
+            select(models.Service.id, models.Service.pandit_id)
+            .join(models.Pandit, models.Pandit.id == models.Service.pandit_id)
+            .where(models.Pandit.is_verified == True)
+            .order_by(models.Service.id)
+        ).all()
+        if not self.users or not self.services:
+            raise SystemExit("No users or bookable services found; run seed_data.py first")
+        self.pending = deque(self._bookings(db, "pending"))
+        self.confirmed = deque(self._bookings(db, "confirmed"))
+        # Completed bookings made during the run, which nobody has reviewed yet
+        self.completed = deque()
+        self._tokens = {}
+
+    @staticmethod
+    def _bookings(db, status: str):
+        return [BookingRef(*row) for row in db.execute(
+            select(models.Booking.id, models.Booking.user_id, models.Booking.pandit_id)
+            .where(models.Booking.status == status)
+            .order_by(models.Booking.id)
+            .limit(BOOKING_POOL_SIZE)
+        )]
+
+    def headers(self, principal_type: str, principal_id: str) -> dict:
+        key = (principal_type, principal_id)
+        if key not in self._tokens:
+            self._tokens[key] = create_token({"sub": principal_id, "type": principal_type})
+        return {"Authorization": f"Bearer {self._tokens[key]}"}
+
+    def request(self, operation: str):
+        """
+        (label, method, url, request options, callback on success) for an
+        operation. Operations that need a booking in some status fall back to
+        creating one when none is left, labelled create_booking.
+        """
+        rng = self.rng
+        user_headers = self.headers("user", rng.choice(self.users))
+        if operation == "search_pandits":
+            params = {
+                "max_distance_km": rng.choice([5, 10, 25, 50]),
+                "sort_by": rng.choice(["match_score", "distance", "price", "rating"]),
+                "limit": 20,
+            }
+            if rng.random() < 0.3:
+                params["min_rating"] = rng.choice([3, 4])
+            return operation, "GET", "/user/pandits/search", {"params": params, "headers": user_headers}, None
+        if operation == "available_pandits":
+            options = {"params": {"limit": 20}, "headers": user_headers}
+            return operation, "GET", "/user/pandits/available", options, None
+        if operation == "search_services":
+            params = {
+                "keyword": rng.choice(KEYWORDS),
+                "sort_by": rng.choice(["relevance", "price_asc", "price_desc"]),
+            }
+            if rng.random() < 0.3:
+                params["max_price"] = rng.choice([1500, 3000, 5000])
+            return operation, "GET", "/services/search", {"params": params}, None
+        if operation == "list_services":
+            return operation, "GET", "/services", {}, None
+        if operation == "my_bookings":
+            return operation, "GET", "/user/bookings", {"params": {"limit": 20}, "headers": user_headers}, None
+        if operation == "booking_status":
+            if self.confirmed and (not self.pending or rng.random() < 0.4):
+                booking = self.confirmed.popleft()
+                return (
+                    operation, "PUT", f"/pandit/bookings/{booking.id}/complete",
+                    {"headers": self.headers("pandit", booking.pandit_id)},
+                    lambda response: self.completed.append(booking)
+                )
+            if self.pending:
+                booking = self.pending.popleft()
+                action = rng.random()
+                if action < 0.15:
+                    user_headers = self.headers("user", booking.user_id)
+                    url = f"/user/bookings/{booking.id}/cancel"
+                    return operation, "PUT", url, {"headers": user_headers}, None
+                pandit_headers = self.headers("pandit", booking.pandit_id)
+                if action < 0.3:
+                    url = f"/pandit/bookings/{booking.id}/reject"
+                    return operation, "PUT", url, {"headers": pandit_headers}, None
+                return (
+                    operation, "PUT", f"/pandit/bookings/{booking.id}/confirm",
+                    {"headers": pandit_headers},
+                    lambda response: self.confirmed.append(booking)
+                )
+        if operation == "review" and self.completed:
+            booking = self.completed.popleft()
+            payload = {
+                "booking_id": booking.id,
+                "rating": rng.choice([3, 4, 4, 5, 5]),
+                "comment": "Benchmark review",
+            }
+            return (
+                operation, "POST", f"/user/bookings/{booking.id}/review",
+                {"json": payload, "headers": self.headers("user", booking.user_id)}, None
+            )
+        return self._create_booking()
+
+    def _create_booking(self):
+        user_id = self.rng.choice(self.users)
+        service = self.rng.choice(self.services)
+        payload = {
+            "pandit_id": service.pandit_id,
+            "service_id": service.id,
+            "booking_date": (date.today() + timedelta(days=self.rng.randint(1, 60))).isoformat(),
+            "service_address": "Benchmark address",
+        }
+
+        def created(response):
+            booking_id = response.json()["booking_id"]
+            self.pending.append(BookingRef(booking_id, user_id, service.pandit_id))
+
+        options = {"json": payload, "headers": self.headers("user", user_id)}
+        return "create_booking", "POST", "/user/bookings", options, created
+
+
+def schedule(mix: dict, count: int, rng: random.Random) -> list:
+    """The operations to run, drawn from mix with a fixed seed."""
+    operations = list(mix)
+    return rng.choices(operations, [mix[name] for name in operations], k=count)
+
+
+async def drive(workload: Workload, operations: list, concurrency: int):
+    """Run operations from concurrency clients; returns ([(label, seconds, status)], elapsed)."""
+    results = []
+    pending = iter(operations)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def client_loop():
+            # Clients share the iterator, so each operation runs exactly once
+            for operation in pending:
+                label, method, url, options, on_success = workload.request(operation)
+                started = time.perf_counter()
+                response = await client.request(method, url, **options)
+                results.append((label, time.perf_counter() - started, response.status_code))
+                if response.status_code < 400 and on_success is not None:
+                    on_success(response)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        return results, time.perf_counter() - started
+
+
+def percentile(ordered: list, q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    """Latency and throughput per operation, plus "all"."""
+    by_operation = {}
+    for label, seconds, status in results:
+        by_operation.setdefault(label, []).append((seconds, status))
+    by_operation["all"] = [(seconds, status) for _, seconds, status in results]
+
+    summary = {}
+    for label, samples in by_operation.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in samples)
+        statuses = {}
+        for _, status in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary[label] = {
+            "requests": len(samples),
+            "errors": sum(1 for _, status in samples if status >= 400),
+            "statuses": statuses,
+            "rps": round(len(samples) / elapsed, 1),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+        }
+    return summary
+
+
+def print_summary(summary: dict, baseline: dict = None):
+    def change(label, key):
+        if not baseline or label not in baseline or not baseline[label][key]:
+            return ""
+        return f" ({(summary[label][key] / baseline[label][key] - 1) * 100:+.0f}%)"
+
+    print(f"{'operation':<18}{'requests':>9}{'errors':>8}{'rps':>16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}")
+    for label, row in sorted(summary.items(), key=lambda item: (item[0] == "all", item[0])):
+        print(
+            f"{label:<18}{row['requests']:>9}{row['errors']:>8}"
+            f"{str(row['rps']) + change(label, 'rps'):>16}"
+            f"{str(row['p50_ms']) + change(label, 'p50_ms'):>18}"
+            f"{str(row['p95_ms']) + change(label, 'p95_ms'):>18}"
+            f"{str(row['p99_ms']) + change(label, 'p99_ms'):>18}"
+        )
+
+
+def parse_mix(value: str) -> dict:
+    """"search_pandits=30,create_booking=10" -> {"search_pandits": 30, "create_booking": 10}"""
+    mix = {}
+    for part in filter(None, value.split(",")):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            choices = ", ".join(DEFAULT_MIX)
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; choose from {choices}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mixed load benchmark against the app in-process")
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=200, help="Requests run first and not measured")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Workload shares, e.g. search_pandits=30,create_booking=10 (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--compare", help="Show changes against the results saved in this JSON file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        workload = Workload(db, rng)
+        dataset = read_stats(db)
+    finally:
+        db.close()
+
+    operations = schedule(args.mix, args.warmup + args.requests, rng)
+    asyncio.run(drive(workload, operations[:args.warmup], args.concurrency))
+    results, elapsed = asyncio.run(drive(workload, operations[args.warmup:], args.concurrency))
+    write_queue.stop()
+
+    summary = summarize(results, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print(f"{len(results)} requests from {args.concurrency} clients in {elapsed:.2f}s")
+    print_summary(summary, baseline)
+
+    if args.output:
+        report = {
+            "run_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "config": {
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "concurrency": args.concurrency,
+                "mix": args.mix,
+                "seed": args.seed,
+            },
+            "dataset": dataset,
+            "elapsed_seconds": round(elapsed, 3),
+            "results": summary,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
@@ -1,7 +1,99 @@
 import os
 
-DATABASE_URL = "sqlite:///./pandit.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./pandit.db")
+# Same database through aiosqlite, for async route handlers
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+# Database read by GET endpoints: the primary by default, or a replica
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", DATABASE_URL)
+ASYNC_READ_DATABASE_URL = READ_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+# Connection pool of each engine (primary and read, sync and async)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Write pipeline: booking, review and location writes are queued for a single
+# writer connection that commits them in groups (see writes.py)
+WRITE_QUEUE_LIMIT = int(os.getenv("WRITE_QUEUE_LIMIT", "256"))
+WRITE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("WRITE_QUEUE_TIMEOUT_SECONDS", "5"))
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "32"))
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", "0"))
+WRITE_RETRIES = int(os.getenv("WRITE_RETRIES", "5"))
+WRITE_RETRY_BACKOFF_MS = float(os.getenv("WRITE_RETRY_BACKOFF_MS", "20"))
+
+# SQLite settings applied to every connection. WAL lets readers run while a
+# booking is being written; an empty value leaves SQLite's default in place
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # negative: KiB, so 64 MiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
 
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+
+# Travel radius assumed for pandits that have not set their own
+DEFAULT_SERVICE_RADIUS_KM = 25
+
+# How long optional exact totals for paginated listings are cached
+COUNT_CACHE_TTL_SECONDS = 60
+
+# Authenticated users, pandits and admins kept in memory between requests
+PRINCIPAL_CACHE_TTL_SECONDS = 300
+PRINCIPAL_CACHE_MAX_ENTRIES = 10000
+
+# Rendered responses of the public service catalog (/services and friends),
+# dropped when the services behind them change
+RESPONSE_CACHE_TTL_SECONDS = 60
+RESPONSE_CACHE_MAX_ENTRIES = 2000
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Routes whose list responses are encoded straight from rows with orjson
+# instead of through per-row pydantic models (see serializers.py). A comma
+# separated list of route names, or "*" for all of them
+FAST_JSON_ROUTES = set(filter(None, os.getenv("FAST_JSON_ROUTES", "*").split(",")))
+
+# In-memory read model of verified pandits and services (see read_model.py)
+# answering the proximity searches and per-pandit service listings. A background
+# thread patches in the rows committed by this process; writes by other
+# processes are picked up every READ_MODEL_POLL_SECONDS
+READ_MODEL_ENABLED = os.getenv("READ_MODEL", "1") != "0"
+READ_MODEL_POLL_SECONDS = float(os.getenv("READ_MODEL_POLL_SECONDS", "5"))
+# Grid cell size (degrees) of the read model's pandit geo index (see geo_index.py)
+GEO_INDEX_CELL_DEG = float(os.getenv("GEO_INDEX_CELL_DEG", "0.25"))
+
+# Per-request SQL instrumentation (see query_metrics.py): Server-Timing
+# headers, per-route query statistics and N+1 warnings for statements run at
+# least N_PLUS_ONE_THRESHOLD times in one request
+QUERY_METRICS_ENABLED = os.getenv("QUERY_METRICS", "1") != "0"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_STATEMENTS_KEPT = 10
+
+# Prometheus metrics served at /metrics (see metrics.py)
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+# Bearer token a Prometheus server scrapes /metrics with; admin tokens work too
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Sampling profiler (see profiler.py): requests carrying an admin token in
+# the X-Profile header are always profiled; with PROFILE_SLOW_MS above 0
+# every request is sampled and kept when it takes at least that long
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILES_KEPT = int(os.getenv("PROFILES_KEPT", "20"))
+
+# Request tracing (see tracing.py): the share of requests traced, how many
+# recent traces are kept for /admin/traces, and an optional JSON lines file
+# every trace is appended to
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACES_KEPT = int(os.getenv("TRACES_KEPT", "100"))
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# Password hashing: bcrypt cost (existing hashes are upgraded on login) and
+# the dedicated worker pool that runs it
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "64"))
@@ -1,21 +1,220 @@
-from sqlalchemy import create_engine, event
+import re
+import time
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, READ_DATABASE_URL, ASYNC_READ_DATABASE_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, SQLITE_PRAGMAS
+)
+from utils import calculate_distance, calculate_match_score
+from metrics import pool_checkout_wait
+
+# Readable names for PRAGMAs that report numeric codes
+PRAGMA_NAMES = {
+    "synchronous": {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"},
+    "temp_store": {0: "DEFAULT", 1: "FILE", 2: "MEMORY"},
+}
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started, self.logging_name)
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    pass
+
+def pool_options(url: str, poolclass, name: str):
+    """Explicit pool sizing, except for in-memory SQLite which needs its single connection."""
+    if ":memory:" in url or url.split("///")[-1] == "":
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_logging_name": name,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
 
 engine = create_engine(
     DATABASE_URL, 
     connect_args={"check_same_thread": False},
-    echo=False
+    echo=False,
+    **pool_options(DATABASE_URL, TimedQueuePool, "primary")
+)
+
+# Async engine over the same database
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    **pool_options(ASYNC_DATABASE_URL, TimedAsyncQueuePool, "async")
+)
+
+# Query-only engines for GET endpoints, with their own pools. They read the
+# primary unless READ_DATABASE_URL points at a replica, and never take write locks
+read_engine = create_engine(
+    READ_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    echo=False,
+    **pool_options(READ_DATABASE_URL, TimedQueuePool, "read")
+)
+async_read_engine = create_async_engine(
+    ASYNC_READ_DATABASE_URL,
+    echo=False,
+    **pool_options(ASYNC_READ_DATABASE_URL, TimedAsyncQueuePool, "async_read")
+)
+
+# Dedicated connection for the write pipeline (writes.py). Its transactions
+# start with BEGIN IMMEDIATE, taking the write lock up front so that a
+# transaction never fails halfway when upgrading from a read lock
+write_engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    echo=False,
+    poolclass=QueuePool,
+    pool_size=1,
+    max_overflow=0
 )
 
-# Enable foreign key constraints for SQLite
+@event.listens_for(write_engine, "connect")
+def disable_implicit_transactions(dbapi_connection, connection_record):
+    # Let SQLAlchemy emit BEGIN itself (pysqlite's implicit BEGIN also breaks SAVEPOINT)
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(write_engine, "begin")
+def begin_immediate(connection):
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+# Enable foreign key constraints and the configured SQLite settings, and
+# register the geo SQL functions (on every engine: aiosqlite connections are
+# adapted to the same DB-API calls)
 @event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+@event.listens_for(write_engine, "connect")
+@event.listens_for(read_engine, "connect")
+@event.listens_for(async_read_engine.sync_engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
+    # busy_timeout first, so waiting on a lock also covers the pragmas below
+    for name in sorted(SQLITE_PRAGMAS, key=lambda n: n != "busy_timeout"):
+        value = SQLITE_PRAGMAS[name]
+        if value and re.fullmatch(r"-?\w+", value):
+            cursor.execute(f"PRAGMA {name}={value}")
     cursor.execute("PRAGMA foreign_keys=ON")
     cursor.close()
+    register_sql_functions(dbapi_connection)
+
+@event.listens_for(read_engine, "connect")
+@event.listens_for(async_read_engine.sync_engine, "connect")
+def set_query_only(dbapi_connection, connection_record):
+    # Any INSERT/UPDATE/DELETE on a read connection fails instead of locking
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def register_sql_functions(dbapi_connection):
+    """
+    Expose utils.calculate_distance and utils.calculate_match_score to SQL as
+    haversine_km(lat1, lon1, lat2, lon2) and match_score(distance_km, price, rating),
+    so proximity queries can filter, sort and paginate inside SQLite. SQLite
+    calls them a row at a time, so the NumPy versions (calculate_distances,
+    calculate_match_scores) don't apply here; they serve the read model.
+    """
+    dbapi_connection.create_function(
+        "haversine_km", 4, calculate_distance, deterministic=True
+    )
+    dbapi_connection.create_function(
+        "match_score", 3,
+        lambda distance_km, price, rating: calculate_match_score(distance_km, price or 0, rating or 0),
+        deterministic=True
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessions of the write pipeline; results stay readable after the group commit
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=write_engine, expire_on_commit=False)
+
+# Attributes stay loaded after commit: an async session can't lazy-load them
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Read-only sessions: nothing to flush and nothing to expire
+ReadSessionLocal = sessionmaker(autoflush=False, bind=read_engine, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
+
+def upgrade_schema():
+    """
+    Bring the database up to date with the models: create missing tables, add
+    missing columns and create missing indexes. There is no migration tool, so
+    only additive changes are handled. Returns the added columns as "table.column".
+    """
+    added = set()
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {column.default.arg!r}"
+                connection.execute(text(ddl))
+                added.add(f"{table.name}.{column.name}")
+            # create_all skips indexes on tables that already exist
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+    return added
+
+def assign_index_keys(connection, table_name: str) -> int:
+    """
+    Number the rows of table_name that have no index_key yet, after the highest
+    key in use, and return how many there were. SQLite virtual tables need
+    integer ids and the implicit rowid may change on VACUUM, so the R*Tree and
+    FTS5 indexes use this column; new rows get it from an insert trigger.
+    """
+    start = connection.execute(text(f"SELECT coalesce(max(index_key), 0) FROM {table_name}")).scalar()
+    rowids = connection.execute(
+        text(f"SELECT rowid FROM {table_name} WHERE index_key IS NULL ORDER BY rowid")
+    ).scalars().all()
+    if rowids:
+        connection.execute(
+            text(f"UPDATE {table_name} SET index_key = :key WHERE rowid = :rowid"),
+            [{"key": start + n, "rowid": rowid} for n, rowid in enumerate(rowids, 1)]
+        )
+    return len(rowids)
+
+def storage_settings() -> dict:
+    """Effective SQLite settings and pool sizes, read back from a live connection."""
+    with engine.connect() as connection:
+        pragmas = {}
+        for name in [*SQLITE_PRAGMAS, "foreign_keys"]:
+            value = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            pragmas[name] = PRAGMA_NAMES.get(name, {}).get(value, value)
+
+    def pool_settings(pool):
+        return {
+            "class": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "max_overflow": getattr(pool, "_max_overflow", None),
+            "timeout": pool.timeout() if hasattr(pool, "timeout") else None,
+        }
+
+    return {
+        "database_url": engine.url.render_as_string(hide_password=True),
+        "pragmas": pragmas,
+        "pool": pool_settings(engine.pool),
+        "async_pool": pool_settings(async_engine.pool),
+        "read_database_url": read_engine.url.render_as_string(hide_password=True),
+        "read_pool": pool_settings(read_engine.pool),
+        "async_read_pool": pool_settings(async_read_engine.pool),
+    }
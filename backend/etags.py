@@ -0,0 +1,70 @@
+"""
+Conditional GET support.
+
+Endpoints that clients poll (profiles, bookings, services) send a strong ETag
+and answer a matching If-None-Match with 304 Not Modified and no body. ETags
+are derived from row versions rather than from the rendered body: a single
+row's is its table, id and updated_at, and a collection's is the max
+updated_at and row count of everything it selects, read with one aggregate
+query so checking it never loads or serializes the rows themselves. Every
+write path touches updated_at (onupdate), so any change produces a new ETag.
+Indexes ending in updated_at keep that query on the index alone, and endpoints
+served from the response cache store the ETag with the body, so they only run
+it when rendering a new body.
+"""
+
+import hashlib
+from fastapi import Response
+from sqlalchemy import func, select
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the given version parts."""
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest() + '"'
+
+
+def row_etag(row) -> str:
+    """ETag of a single row such as a profile."""
+    return make_etag(row.__tablename__, row.id, row.updated_at)
+
+
+def collection_version(model, *criteria):
+    """SELECT max(updated_at), count(*) over the rows of model matching criteria."""
+    return select(func.max(model.updated_at), func.count()).select_from(model).where(*criteria)
+
+
+def collection_etag(db, request, model, *criteria) -> str:
+    """ETag of the rows of model matching criteria, as requested with this URL's query string."""
+    version = db.execute(collection_version(model, *criteria)).one()
+    return make_etag(model.__tablename__, request.url.path, str(request.query_params), *version)
+
+
+async def collection_etag_async(db, request, model, *criteria) -> str:
+    """collection_etag for an AsyncSession."""
+    version = (await db.execute(collection_version(model, *criteria))).one()
+    return make_etag(model.__tablename__, request.url.path, str(request.query_params), *version)
+
+
+def etag_matches(request, etag: str) -> bool:
+    """True if If-None-Match lists etag (or is "*")."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def conditional(request, response, etag: str):
+    """
+    Return a 304 response if the client already has etag, otherwise set the
+    ETag header on response and return None so the route builds its body.
+    """
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return None
@@ -0,0 +1,139 @@
+"""
+In-memory grid index over pandit coordinates.
+
+Points are bucketed into fixed-size latitude/longitude cells so that a radius
+query only has to look at the cells overlapping the search circle instead of
+every verified pandit. The read model (read_model.py) keeps its pandits in one.
+
+A GridIndex is never modified once built, so readers need no lock:
+with_changes returns a new index that shares every cell the changes didn't
+touch with the old one.
+"""
+
+import math
+import numpy as np
+from config import GEO_INDEX_CELL_DEG
+from utils import bounding_box, calculate_distances
+
+
+class GridIndex:
+    """Immutable grid of (lat, lon) points keyed by id."""
+
+    def __init__(self, points=(), cell_size_deg: float = GEO_INDEX_CELL_DEG):
+        self.cell_size = cell_size_deg
+        self.columns = math.ceil(360 / cell_size_deg)
+        self._cells = {}
+        self._points = {}
+        for key, lat, lon in points:
+            self._insert(self._cells, key, lat, lon)
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, lat: float, lon: float):
+        row = math.floor((lat + 90) / self.cell_size)
+        col = math.floor((lon + 180) / self.cell_size) % self.columns
+        return row, col
+
+    def _insert(self, cells, key, lat: float, lon: float):
+        cell = self._cell(lat, lon)
+        self._points[key] = (lat, lon, cell)
+        cells.setdefault(cell, {})[key] = (lat, lon)
+
+    def with_changes(self, upserts=(), removals=()):
+        """
+        A new index with upserts, an iterable of (key, lat, lon), added or moved
+        and the keys in removals dropped. Only the cells they touch are copied.
+        """
+        grid = GridIndex.__new__(GridIndex)
+        grid.cell_size = self.cell_size
+        grid.columns = self.columns
+        grid._cells = dict(self._cells)
+        grid._points = dict(self._points)
+        copied = set()
+
+        def bucket(cell):
+            if cell not in copied:
+                grid._cells[cell] = dict(grid._cells.get(cell, ()))
+                copied.add(cell)
+            return grid._cells[cell]
+
+        # The last upsert of a key wins
+        upserts = {key: (lat, lon) for key, lat, lon in upserts}
+        for key in [*removals, *upserts]:
+            entry = grid._points.pop(key, None)
+            if entry is not None:
+                bucket(entry[2]).pop(key, None)
+        for key, (lat, lon) in upserts.items():
+            cell = grid._cell(lat, lon)
+            grid._points[key] = (lat, lon, cell)
+            bucket(cell)[key] = (lat, lon)
+        for cell in copied:
+            if not grid._cells[cell]:
+                del grid._cells[cell]
+        return grid
+
+    def _candidate_buckets(self, min_lat: float, max_lat: float, lon_ranges):
+        """Yield the non-empty cells overlapping a box from utils.bounding_box."""
+        rows = range(self._cell(min_lat, 0)[0], self._cell(max_lat, 0)[0] + 1)
+        cols = set()
+        for low, high in lon_ranges:
+            first = math.floor((low + 180) / self.cell_size)
+            last = math.floor((high + 180) / self.cell_size)
+            if last - first + 1 >= self.columns:
+                cols = set(range(self.columns))
+                break
+            cols.update(c % self.columns for c in range(first, last + 1))
+        if len(rows) * len(cols) > len(self._cells):
+            # A box covering more cells than are occupied: walk the occupied ones
+            for (row, col), bucket in self._cells.items():
+                if row in rows and col in cols:
+                    yield bucket
+            return
+        for row in rows:
+            for col in cols:
+                bucket = self._cells.get((row, col))
+                if bucket:
+                    yield bucket
+
+    def in_box(self, lat: float, lon: float, radius_km: float):
+        """
+        (keys, latitudes, longitudes) of the points inside bounding_box() of the
+        search circle, the same rows utils.within_bounding_box selects in SQL.
+        """
+        min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+        keys = []
+        coords = []
+        for bucket in self._candidate_buckets(min_lat, max_lat, lon_ranges):
+            keys.extend(bucket.keys())
+            coords.extend(bucket.values())
+        if not keys:
+            return [], np.empty(0), np.empty(0)
+        coords = np.array(coords, dtype=float)
+        lats, lons = coords[:, 0], coords[:, 1]
+        # The cells overhang the box; trim them to it exactly
+        inside = (lats >= min_lat) & (lats <= max_lat)
+        in_lon = np.zeros(len(keys), dtype=bool)
+        for low, high in lon_ranges:
+            in_lon |= (lons >= low) & (lons <= high)
+        inside &= in_lon
+        positions = np.flatnonzero(inside)
+        return [keys[i] for i in positions], lats[positions], lons[positions]
+
+    def query_radius(self, lat: float, lon: float, radius_km: float):
+        """
+        Return [(key, distance_km)] for every point within radius_km of the
+        given coordinates. Candidates from the overlapping cells are measured
+        in one utils.calculate_distances call.
+        """
+        if radius_km < 0:
+            return []
+        keys, lats, lons = self.in_box(lat, lon, radius_km)
+        if not keys:
+            return []
+        distances = calculate_distances(lat, lon, lats, lons)
+        hits = np.flatnonzero(distances <= radius_km)
+        return [(keys[i], float(distances[i])) for i in hits]
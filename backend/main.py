@@ -1,9 +1,22 @@
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import Base, engine
-from routers import auth_routes, pandit_routes, user_routes, admin_routes
+from database import engine, async_engine, async_read_engine, storage_settings, upgrade_schema
+from service_area import create_coverage_index
+from service_search import create_service_search_index
+from ratings import backfill_ratings
+from stats import create_stats_counters
+from read_model import read_model
+from config import READ_MODEL_ENABLED
+from writes import write_queue
+from query_metrics import QueryMetricsMiddleware
+from metrics import MetricsMiddleware
+from profiler import ProfilerMiddleware
+from tracing import TracingMiddleware
+from routers import auth_routes, pandit_routes, user_routes, admin_routes, service_routes, metrics_routes
 
 app = FastAPI()
+logger = logging.getLogger("uvicorn.error")
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -12,16 +25,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "X-Profile-Id", "X-Trace-Id"],
 )
 
-# Create tables on startup
-Base.metadata.create_all(bind=engine)
+# Query count and database time of every request (Server-Timing header)
+app.add_middleware(QueryMetricsMiddleware)
+
+# Request counts, latency and response sizes by route (served at /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Sampling profiles of requests sent with an admin token in X-Profile, or slow ones
+app.add_middleware(ProfilerMiddleware)
+
+# Span trees of a sample of requests (TRACE_SAMPLE_RATE)
+app.add_middleware(TracingMiddleware)
+
+# Create or upgrade tables on startup
+added_columns = upgrade_schema()
+if {"users.rating_count", "pandits.rating_count"} & added_columns:
+    # Existing ratings predate the aggregate columns
+    with engine.begin() as connection:
+        backfill_ratings(connection)
+create_coverage_index(engine)
+create_service_search_index(engine)
+create_stats_counters(engine)
+
+# Load the in-memory read model of pandits and services (read_model.py)
+if READ_MODEL_ENABLED:
+    read_model.start()
+
+# Report the effective storage settings
+def describe(settings: dict) -> str:
+    return ", ".join(f"{key}={value}" for key, value in settings.items())
+
+storage = storage_settings()
+logger.info("Database: %s", storage["database_url"])
+logger.info("SQLite: %s", describe(storage["pragmas"]))
+logger.info("Pool: %s", describe(storage["pool"]))
+logger.info("Async pool: %s", describe(storage["async_pool"]))
+logger.info("Read database: %s", storage["read_database_url"])
+logger.info("Read pool: %s", describe(storage["read_pool"]))
+logger.info("Async read pool: %s", describe(storage["async_read_pool"]))
 
 # Include routers
 app.include_router(auth_routes.router, tags=["Authentication"])
 app.include_router(user_routes.router, tags=["User"])
 app.include_router(pandit_routes.router, tags=["Pandit"])
 app.include_router(admin_routes.router, tags=["Admin"])
+app.include_router(service_routes.router, tags=["Services"])
+app.include_router(metrics_routes.router)
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+@app.on_event("shutdown")
+def stop_write_queue():
+    # Commit whatever is still queued before exiting
+    write_queue.stop()
 
 @app.get("/")
 def root():
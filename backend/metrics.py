@@ -0,0 +1,265 @@
+"""
+Prometheus metrics.
+
+Counters, gauges and histograms here keep one set of values per thread:
+recording a sample only touches the calling thread's dict, so the request
+path never waits on a lock, and the shards are summed when /metrics is
+scraped. MetricsMiddleware records the count, latency, response size and
+status of every HTTP request by route template ("/user/bookings/{booking_id}",
+not the raw URL, to keep the number of series bounded). Connection pools
+record how long checkouts wait; pool, cache, thread pool and write queue
+levels are read from their own stats when the endpoint renders.
+
+The output is the Prometheus text exposition format (version 0.0.4).
+"""
+
+import bisect
+import threading
+import time
+from config import METRICS_ENABLED
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class _Shards:
+    """
+    One dict of values per thread, merged when metrics are collected. Worker
+    threads come and go, so the shard of a thread that has exited is folded
+    into a shared base with merge(base, shard), keeping totals monotonic.
+    """
+
+    def __init__(self, merge):
+        self._merge = merge
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._base = {}
+        self._threads = {}
+
+    def mine(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            # First sample from this thread
+            values = self._local.values = {}
+            with self._lock:
+                self._fold_exited()
+                self._threads[threading.current_thread()] = values
+            return values
+
+    def _fold_exited(self):
+        # A thread that has exited can't write to its shard any more
+        for thread in [thread for thread in self._threads if not thread.is_alive()]:
+            self._merge(self._base, self._threads.pop(thread))
+
+    def snapshot(self) -> list:
+        with self._lock:
+            self._fold_exited()
+            shards = [self._base, *self._threads.values()]
+        return [dict(shard) for shard in shards]
+
+
+def _add_values(base: dict, shard: dict):
+    for labels, value in shard.items():
+        base[labels] = base.get(labels, 0) + value
+
+
+def _add_counts(base: dict, shard: dict):
+    # New lists, so snapshots already handed out don't change under a reader
+    for labels, counts in shard.items():
+        total = base.get(labels, [0] * len(counts))
+        base[labels] = [a + b for a, b in zip(total, counts)]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards(_add_values)
+
+    def inc(self, *labels, amount: float = 1):
+        values = self._shards.mine()
+        values[labels] = values.get(labels, 0) + amount
+
+    def samples(self) -> dict:
+        totals = {}
+        for shard in self._shards.snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render(self) -> list:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(self.samples().items())
+        ]
+
+
+class Gauge(Counter):
+    """Level per label values, moved up and down by the threads that change it."""
+
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    """Distribution of observed values per label values, in fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _Shards(_add_counts)
+
+    def observe(self, value: float, *labels):
+        values = self._shards.mine()
+        counts = values.get(labels)
+        if counts is None:
+            # One count per bucket, then +Inf, then the sum
+            counts = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> dict:
+        totals = {}
+        for shard in self._shards.snapshot():
+            for labels, counts in shard.items():
+                total = totals.setdefault(labels, [0] * len(counts))
+                for index, count in enumerate(list(counts)):
+                    total[index] += count
+        return totals
+
+    def render(self) -> list:
+        lines = []
+        for labels, counts in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Snapshot:
+    """A gauge or counter family whose samples are read at collection time."""
+
+    def __init__(self, name: str, type: str, help: str, labelnames=(), samples=None):
+        self.name = name
+        self.type = type
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._samples = samples or {}
+
+    def samples(self) -> dict:
+        return self._samples
+
+    def render(self) -> list:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in self._samples.items()
+            if value is not None
+        ]
+
+
+def render(metrics) -> str:
+    """The text exposition of metrics."""
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_requests = Counter(
+    "pandit_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "pandit_http_request_duration_seconds", "Time to serve HTTP requests.", ("method", "route")
+)
+http_response_size = Histogram(
+    "pandit_http_response_size_bytes", "Size of HTTP response bodies.", ("method", "route"), SIZE_BUCKETS
+)
+http_requests_in_flight = Gauge(
+    "pandit_http_requests_in_flight", "HTTP requests being served.", ("method",)
+)
+pool_checkout_wait = Histogram(
+    "pandit_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection.",
+    ("pool",), WAIT_BUCKETS
+)
+
+REGISTRY = [http_requests, http_request_duration, http_response_size, http_requests_in_flight, pool_checkout_wait]
+
+
+def _route_path(scope) -> str:
+    route = scope.get("route")
+    return route.path if route is not None else "<unmatched>"
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records the count, latency, size and status of each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            http_requests_in_flight.dec(method)
+            route = _route_path(scope)
+            http_requests.inc(method, route, str(status))
+            http_request_duration.observe(time.perf_counter() - started, method, route)
+            http_response_size.observe(size, method, route)
@@ -1,7 +1,8 @@
 import uuid
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Float, Text
+from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Float, Text, Index, FetchedValue
 from sqlalchemy.orm import relationship
 from database import Base
+from config import DEFAULT_SERVICE_RADIUS_KM
 from datetime import datetime
 
 # Helper function to generate UUID as string
@@ -20,6 +21,8 @@ class User(Base):
     longitude = Column(Float, nullable=True)
     location_name = Column(String, nullable=True)
     rating_avg = Column(Float, default=0)
+    rating_count = Column(Integer, default=0)  # Kept in step with rating_avg by ratings.py
+    rating_sum = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -49,11 +52,27 @@ class Pandit(Base):
     longitude = Column(Float, nullable=True)
     location_name = Column(String, nullable=True)
     price_per_service = Column(Float, default=0)
+    service_radius_km = Column(Float, default=DEFAULT_SERVICE_RADIUS_KM)  # How far the pandit travels
     rating_avg = Column(Float, default=0)
+    rating_count = Column(Integer, default=0)  # Kept in step with rating_avg by ratings.py
+    rating_sum = Column(Integer, default=0)
     is_verified = Column(Boolean, default=False)
+    # Integer id of the row in the pandit_coverage R*Tree, set by an insert trigger (service_area.py)
+    index_key = Column(Integer, FetchedValue(), index=True, unique=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Bounding-box prefilter for nearby searches over verified pandits
+        Index("ix_pandits_verified_location", "is_verified", "latitude", "longitude"),
+        Index("ix_pandits_verified_price", "is_verified", "price_per_service"),
+        Index("ix_pandits_verified_rating", "is_verified", "rating_avg"),
+        # Keyset pagination of the admin verification queue
+        Index("ix_pandits_verified_created", "is_verified", "created_at", "id"),
+        # Changes since the read model's watermark (read_model.py)
+        Index("ix_pandits_updated", "updated_at"),
+    )
+
 class Service(Base):
     __tablename__ = "services"
 
@@ -63,9 +82,22 @@ class Service(Base):
     category = Column(String)
     base_price = Column(Float)
     duration_minutes = Column(Integer)
+    # Integer id of the row in the services_fts index, set by an insert trigger (service_search.py)
+    index_key = Column(Integer, FetchedValue(), index=True, unique=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pagination of catalog search sort orders
+        Index("ix_services_price_id", "base_price", "id"),
+        Index("ix_services_duration_id", "duration_minutes", "id"),
+        Index("ix_services_name_id", "name", "id"),
+        # Covering indexes for the ETag version queries (etags.py); updated_at
+        # also finds the changes since the read model's watermark
+        Index("ix_services_updated", "updated_at"),
+        Index("ix_services_pandit_updated", "pandit_id", "updated_at"),
+    )
+
 class Booking(Base):
     __tablename__ = "bookings"
 
@@ -83,6 +115,15 @@ class Booking(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pagination of user and pandit booking lists
+        Index("ix_bookings_user_created", "user_id", "created_at", "id"),
+        Index("ix_bookings_pandit_created", "pandit_id", "created_at", "id"),
+        # Covering indexes for the ETag version queries, with or without a status filter
+        Index("ix_bookings_user_status_updated", "user_id", "status", "updated_at"),
+        Index("ix_bookings_pandit_status_updated", "pandit_id", "status", "updated_at"),
+    )
+
 class Review(Base):
     __tablename__ = "reviews"
 
@@ -95,3 +136,8 @@ class Review(Base):
     rating = Column(Integer)
     comment = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Keyset pagination of reviews received
+        Index("ix_reviews_reviewee_created", "reviewee_id", "reviewee_type", "created_at", "id"),
+    )
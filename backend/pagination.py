@@ -0,0 +1,195 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are ordered by a sort key plus the row id, and a cursor is an opaque token
+holding the last row's (sort key, id). The next page seeks past it with a row
+value comparison on an index instead of skipping rows with OFFSET, so a deep
+page costs the same as the first one. NULL sort keys go where SQLite puts them
+by default, first ascending and last descending; the ORDER BY says so
+explicitly and the seek handles them separately, as a row value comparison is
+never true for NULL.
+"""
+
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import DateTime, and_, or_, tuple_
+from config import COUNT_CACHE_TTL_SECONDS
+
+
+def encode_cursor(sort: str, values) -> str:
+    """Pack the sort name and the last row's key values into an opaque token."""
+    payload = [sort] + [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str, columns) -> list:
+    """Unpack a cursor made by encode_cursor for the same sort and key columns."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(payload, list) or len(payload) != len(columns) + 1 or payload[0] != sort:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    values = payload[1:]
+    for i, column in enumerate(columns):
+        if isinstance(getattr(column, "type", None), DateTime) and values[i] is not None:
+            try:
+                values[i] = datetime.fromisoformat(values[i])
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def seek_past(columns, values, descending: bool = False):
+    """
+    Condition for the rows after values in the page order, where only the
+    first key column may be NULL. Descending past a non-NULL key this leaves
+    out the NULL keys that come last; null_tail_query fetches those, since an
+    OR here would keep SQLite from seeking on the index.
+    """
+    first, rest = columns[0], columns[1:]
+    if values[0] is None:
+        if descending:
+            return and_(first.is_(None), tuple_(*rest) < tuple_(*values[1:]))
+        return or_(first.isnot(None), tuple_(*rest) > tuple_(*values[1:]))
+    key = tuple_(*columns)
+    return key < tuple_(*values) if descending else key > tuple_(*values)
+
+
+def keyset_query(query, columns, limit: int, cursor: str = None,
+                 descending: bool = False, sort: str = ""):
+    """
+    Restrict a single-entity query (ORM Query or select()) to one page past
+    cursor, with the key columns added to each row and one extra row to tell
+    whether another page follows.
+
+    columns is the sort key, ending with a unique column (normally the id), and
+    is ordered entirely ascending or entirely descending. Only the first column
+    may hold NULLs.
+    """
+    if cursor:
+        query = query.filter(seek_past(columns, decode_cursor(cursor, sort, columns), descending))
+
+    order = [c.desc().nulls_last() if descending else c.asc().nulls_first() for c in columns]
+    return query.add_columns(*columns).order_by(None).order_by(*order).limit(limit + 1)
+
+
+def null_tail_query(query, columns, fetched: int, limit: int, cursor: str = None,
+                    descending: bool = False, sort: str = ""):
+    """
+    The rows with a NULL first key that complete a descending page which
+    keyset_query ran out of rows for (fetched of limit + 1), or None if there
+    are none to look for.
+    """
+    if not descending or not cursor or fetched > limit:
+        return None
+    if decode_cursor(cursor, sort, columns)[0] is None:
+        return None
+    order = [c.desc() for c in columns[1:]]
+    return query.filter(columns[0].is_(None)).add_columns(*columns) \
+        .order_by(None).order_by(*order).limit(limit + 1 - fetched)
+
+
+def keyset_page(rows, limit: int, sort: str = ""):
+    """Split rows fetched by keyset_query into (entities, next_cursor)."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1][1:])
+    return [row[0] for row in rows], next_cursor
+
+
+def keyset_paginate(query, columns, limit: int, cursor: str = None,
+                    descending: bool = False, sort: str = ""):
+    """
+    Return one page of a single-entity query and the cursor for the next page.
+    The next cursor is None on the last page.
+    """
+    rows = keyset_query(query, columns, limit, cursor, descending, sort).all()
+    tail = null_tail_query(query, columns, len(rows), limit, cursor, descending, sort)
+    if tail is not None:
+        rows += tail.all()
+    return keyset_page(rows, limit, sort)
+
+
+async def keyset_paginate_async(db, statement, columns, limit: int, cursor: str = None,
+                                descending: bool = False, sort: str = ""):
+    """keyset_paginate for a select() statement run on an AsyncSession."""
+    result = await db.execute(keyset_query(statement, columns, limit, cursor, descending, sort))
+    rows = result.all()
+    tail = null_tail_query(statement, columns, len(rows), limit, cursor, descending, sort)
+    if tail is not None:
+        rows += (await db.execute(tail)).all()
+    return keyset_page(rows, limit, sort)
+
+
+def set_next_cursor(response, next_cursor: str = None):
+    """Expose the next page's cursor on list endpoints whose body is a plain list."""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+
+class CountCache:
+    """
+    TTL cache for exact COUNT(*) totals keyed by normalized filters, so an
+    optional total doesn't cost a full count on every page request.
+    """
+
+    def __init__(self, ttl_seconds: float = COUNT_CACHE_TTL_SECONDS, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Bumped by clear() so a count computed before it isn't stored
+        self.version = 0
+
+    def get(self, key):
+        """Return the cached count for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+        return None
+
+    def put(self, key, value, version: int = None):
+        """Store value unless the cache was cleared since version was read."""
+        now = time.monotonic()
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest ones
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                while len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (value, now + self.ttl_seconds)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached count for key, calling compute() if missing or expired."""
+        value = self.get(key)
+        if value is None:
+            version = self.version
+            value = compute()
+            self.put(key, value, version)
+        return value
+
+    async def get_or_compute_async(self, key, compute):
+        """get_or_compute where compute() returns an awaitable."""
+        value = self.get(key)
+        if value is None:
+            version = self.version
+            value = await compute()
+            self.put(key, value, version)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
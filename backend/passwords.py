@@ -0,0 +1,110 @@
+"""
+Password hashing off the request threadpool.
+
+bcrypt is deliberately slow, so login and registration hash and verify
+passwords on a small dedicated thread pool (bcrypt releases the GIL while it
+works) instead of the threadpool shared by every sync endpoint. The pool
+accepts at most PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT jobs at a time and
+answers 503 beyond that, so a burst of logins waits on itself rather than
+starving other traffic.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from config import BCRYPT_ROUNDS, PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT
+from tracing import span
+from utils import pwd_context
+
+
+class PasswordPool:
+    """Bounded thread pool for password hashing with queue and latency statistics."""
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_limit: int = PASSWORD_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, or raise 503 if the queue is full."""
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many login attempts right now, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            self.in_flight += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.completed += 1
+                    self.wait_seconds += started - submitted
+                    self.run_seconds += finished - started
+                    self.max_wait_seconds = max(self.max_wait_seconds, started - submitted)
+
+        try:
+            # In the request's context, so profiles include the hashing
+            context = contextvars.copy_context()
+            with span("password"):
+                return await asyncio.wrap_future(self._executor.submit(context.run, job))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.completed
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "in_flight": self.in_flight,
+                "queued": max(self.in_flight - self.workers, 0),
+                "completed": done,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_seconds / done * 1000, 2) if done else None,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "avg_run_ms": round(self.run_seconds / done * 1000, 2) if done else None,
+            }
+
+
+password_pool = PasswordPool()
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a new password on the password pool."""
+    return await password_pool.run(pwd_context.hash, password)
+
+
+async def verify_password_async(plain: str, hashed: str):
+    """
+    Check a password on the password pool. Returns (valid, new_hash) where
+    new_hash is set when the stored hash should be replaced, e.g. because
+    BCRYPT_ROUNDS changed since it was made.
+    """
+    return await password_pool.run(pwd_context.verify_and_update, plain, hashed)
+
+
+def save_password_hash(db, principal, new_hash: str):
+    """Store an upgraded hash for a user, pandit or admin and reload the row."""
+    principal.hashed_password = new_hash
+    db.commit()
+    db.refresh(principal)
@@ -0,0 +1,175 @@
+"""
+Cache of authenticated principals (users, pandits and admins).
+
+The auth dependencies look principals up here by (table, id) before querying.
+Entries hold the row's column values and are handed out as a detached copy
+merged into the request's session without loading, so routes can read and
+update them as usual. An entry is dropped whenever the row is updated or
+deleted through the ORM, and expires after PRINCIPAL_CACHE_TTL_SECONDS as a
+backstop for writes made outside it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from config import PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES
+import models
+from tracing import span
+
+PRINCIPAL_MODELS = (models.User, models.Pandit, models.Admin)
+
+
+class PrincipalCache:
+    """Thread-safe LRU cache with a TTL and hit/miss counters."""
+
+    def __init__(self, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS,
+                 max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a lookup that raced with a write
+        # doesn't store the row it read before the write
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version: int):
+        """Store value unless something was invalidated since version was read."""
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            self._entries.pop(key, None)
+
+    def invalidate_table(self, table_name: str):
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            for key in [k for k in self._entries if k[0] == table_name]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+def load_principal(db, model, principal_id: str):
+    """Return the model row with this id attached to db, or None if it doesn't exist."""
+    key = (model.__tablename__, principal_id)
+    with span("principal.load", table=model.__tablename__) as load:
+        values = principal_cache.get(key)
+        if load is not None:
+            load.attributes["cached"] = values is not None
+        if values is not None:
+            principal = model(**values)
+            make_transient_to_detached(principal)
+            return db.merge(principal, load=False)
+
+        version = principal_cache.version
+        principal = db.query(model).filter(model.id == principal_id).first()
+        if principal is not None:
+            values = {attr.key: getattr(principal, attr.key) for attr in model.__mapper__.column_attrs}
+            principal_cache.put(key, values, version)
+        return principal
+
+
+async def load_principal_async(db, model, principal_id: str):
+    """load_principal for an AsyncSession."""
+    key = (model.__tablename__, principal_id)
+    with span("principal.load", table=model.__tablename__) as load:
+        values = principal_cache.get(key)
+        if load is not None:
+            load.attributes["cached"] = values is not None
+        if values is not None:
+            principal = model(**values)
+            make_transient_to_detached(principal)
+            return await db.merge(principal, load=False)
+
+        version = principal_cache.version
+        principal = await db.get(model, principal_id)
+        if principal is not None:
+            values = {attr.key: getattr(principal, attr.key) for attr in model.__mapper__.column_attrs}
+            principal_cache.put(key, values, version)
+        return principal
+
+
+def _forget(principal):
+    """Drop a principal now, and again once its session commits."""
+    key = (principal.__tablename__, principal.id)
+    principal_cache.invalidate(key)
+    session = object_session(principal)
+    if session is not None:
+        session.info.setdefault("principal_keys", set()).add(key)
+
+
+for _model in PRINCIPAL_MODELS:
+    event.listen(_model, "after_update", lambda mapper, connection, target: _forget(target))
+    event.listen(_model, "after_delete", lambda mapper, connection, target: _forget(target))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_write(orm_execute_state):
+    # Bulk query.update()/delete() skips the mapper events, so drop the whole table
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in PRINCIPAL_MODELS:
+            table_name = mapper.class_.__tablename__
+            principal_cache.invalidate_table(table_name)
+            orm_execute_state.session.info.setdefault("principal_tables", set()).add(table_name)
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    # A request that read the old row between the flush and the commit may
+    # have cached it again
+    for key in session.info.pop("principal_keys", ()):
+        principal_cache.invalidate(key)
+    for table_name in session.info.pop("principal_tables", ()):
+        principal_cache.invalidate_table(table_name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    session.info.pop("principal_keys", None)
+    session.info.pop("principal_tables", None)
@@ -0,0 +1,341 @@
+"""
+On-demand sampling profiler for individual requests.
+
+A request is profiled when its X-Profile header holds a valid admin token,
+or, with PROFILE_SLOW_MS set, when it turns out to take at least that long
+(every request is then sampled and fast ones are discarded). While profiled
+requests are in flight a background thread takes the stack of every thread
+each PROFILE_INTERVAL_MS and credits it to the request the thread is working
+for:
+
+- on the event loop thread, the request whose task is running;
+- on threadpool, write queue and password threads, the request whose
+  context the running job was submitted from;
+- on the thread of an aiosqlite connection, the request that has the
+  connection checked out.
+
+Stacks are stored in the folded format of flamegraph.pl (and accepted by
+speedscope), one line per distinct stack with its sample count:
+
+    AnyIO worker thread;routers.user_routes:search_pandits;...;utils:calculate_distance 12
+
+The last PROFILES_KEPT profiles are kept in memory for /admin/profiles.
+"""
+
+import asyncio
+import itertools
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import Context, ContextVar
+from datetime import datetime, timezone
+from functools import partial
+from fastapi import HTTPException
+from sqlalchemy import event
+import models
+from auth import principal_id
+from config import PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILES_KEPT
+from database import AsyncReadSessionLocal, async_engine, async_read_engine
+from principal_cache import load_principal_async
+from writes import WriteJob
+
+logger = logging.getLogger("pandit.profiler")
+
+PROFILE_HEADER = b"x-profile"
+
+current_profile: ContextVar = ContextVar("current_profile", default=None)
+
+
+def _submitted_job(frame):
+    """Context and function of a job run by concurrent.futures with Context.run (the password pool)."""
+    work_item = frame.f_locals["self"]
+    return getattr(work_item.fn, "__self__", None), work_item.args[0] if work_item.args else None
+
+
+def _anyio_job(frame):
+    """Context and function of a sync route handler run by an AnyIO worker thread."""
+    return frame.f_locals.get("context"), frame.f_locals.get("func")
+
+
+# Frames that run a job in the context it was submitted from, and how to get
+# that context and the job's function out of them
+CONTEXT_RUNNERS = {
+    WriteJob.run.__code__: lambda frame: (frame.f_locals["self"].context, frame.f_locals["self"].fn),
+}
+
+# The thread pool runners are private to concurrent.futures and AnyIO, so they
+# are only used if they still look the way the functions above expect. If not,
+# their jobs are sampled without being credited to a request.
+try:
+    from concurrent.futures.thread import _WorkItem
+    if {"fn", "args"} <= set(_WorkItem.__init__.__code__.co_names):
+        CONTEXT_RUNNERS[_WorkItem.run.__code__] = _submitted_job
+except (ImportError, AttributeError):
+    pass
+try:
+    from anyio._backends._asyncio import WorkerThread
+    if {"context", "func"} <= set(WorkerThread.run.__code__.co_varnames):
+        CONTEXT_RUNNERS[WorkerThread.run.__code__] = _anyio_job
+except (ImportError, AttributeError):
+    pass
+if len(CONTEXT_RUNNERS) < 3:
+    logger.info("Thread pool internals not recognised; their jobs won't be attributed to requests")
+
+
+def _runs(frame, fn) -> bool:
+    """Whether frame is a call of fn, rather than the runner's own bookkeeping around it."""
+    while isinstance(fn, partial):
+        fn = fn.func
+    code = getattr(fn, "__code__", None)
+    return code is None or frame.f_code is code
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class Profile:
+    """Samples of one request."""
+
+    def __init__(self, profile_id: int, scope, trigger: str):
+        self.id = profile_id
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.route = None
+        self.scope = scope
+        self.trigger = trigger
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.samples = 0
+        self.stacks = {}
+
+    def add(self, stack: str):
+        self.samples += 1
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def folded(self) -> str:
+        lines = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in lines)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 2),
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL_MS,
+        }
+
+
+class Profiler:
+    """Sampling thread, profiles in flight and the ring buffer of finished ones."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, kept: int = PROFILES_KEPT):
+        self.interval = interval_ms / 1000
+        self.finished = deque(maxlen=kept)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active = {}
+        self._claimed = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self.loop = None
+        self.loop_thread = None
+
+    def start(self, scope, trigger: str) -> Profile:
+        """Start sampling the request running in the current task."""
+        task = asyncio.current_task()
+        with self._lock:
+            if self._thread is None:
+                self.loop = task.get_loop()
+                self.loop_thread = threading.get_ident()
+                self._thread = threading.Thread(target=self._sample_forever, name="profiler", daemon=True)
+                self._thread.start()
+            profile = Profile(next(self._ids), scope, trigger)
+            self._active[task] = profile
+            self._wake.set()
+        return profile
+
+    def finish(self, profile: Profile, status: int, keep: bool):
+        """Stop sampling profile and keep it in the ring buffer if keep."""
+        with self._lock:
+            self._active = {task: active for task, active in self._active.items() if active is not profile}
+            if not self._active:
+                self._wake.clear()
+            profile.duration = time.perf_counter() - profile.started
+            profile.status = status
+            # The route is known once the request has been routed
+            route = profile.scope.get("route")
+            profile.route = route.path if route is not None else None
+            profile.scope = None
+            if keep:
+                self.finished.append(profile)
+
+    def claim(self, thread_id: int, profile: Profile):
+        """Credit the work of thread_id to profile until it is released."""
+        with self._lock:
+            self._claimed[thread_id] = profile
+
+    def release(self, thread_id: int):
+        if thread_id in self._claimed:
+            with self._lock:
+                self._claimed.pop(thread_id, None)
+
+    def get(self, profile_id: int):
+        with self._lock:
+            return next((profile for profile in self.finished if profile.id == profile_id), None)
+
+    def summaries(self) -> list:
+        with self._lock:
+            return [profile.summary() for profile in reversed(self.finished)]
+
+    def _sample_forever(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if self._active:
+                    try:
+                        self._sample()
+                    except Exception:
+                        logger.exception("Sampling failed")
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        names[self.loop_thread] = "event loop"
+        active = set(self._active.values())
+        running = asyncio.current_task(self.loop)
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if ident == self.loop_thread:
+                profile = self._active.get(running)
+                frames = self._loop_frames(frame) if profile is not None else []
+            else:
+                profile, frames = self._job_frames(frame)
+                if profile is None and ident in self._claimed:
+                    profile, frames = self._claimed[ident], self._thread_frames(frame)
+                # A job may outlive the request that submitted it
+                profile = profile if profile in active else None
+            if profile is not None and frames:
+                stack = [names.get(ident, "thread"), *(_frame_name(each) for each in reversed(frames))]
+                profile.add(";".join(stack))
+
+    def _loop_frames(self, frame) -> list:
+        """Frames of the running task above the profiler middleware, innermost first."""
+        frames = []
+        while frame is not None:
+            if frame.f_code is ProfilerMiddleware.__call__.__code__:
+                return frames
+            frames.append(frame)
+            frame = frame.f_back
+        return []
+
+    def _thread_frames(self, frame) -> list:
+        """Frames of a thread above Thread.run, innermost first."""
+        frames = []
+        while frame is not None and frame.f_code is not threading.Thread.run.__code__:
+            frames.append(frame)
+            frame = frame.f_back
+        return frames
+
+    def _job_frames(self, frame):
+        """The profile and frames (innermost first) of the job a worker thread is running, if any."""
+        frames = []
+        while frame is not None:
+            runner = CONTEXT_RUNNERS.get(frame.f_code)
+            if runner is not None:
+                try:
+                    context, fn = runner(frame)
+                except (AttributeError, KeyError, IndexError, TypeError):
+                    return None, []
+                if not isinstance(context, Context) or not frames or not _runs(frames[-1], fn):
+                    return None, []
+                return context.get(current_profile), frames
+            frames.append(frame)
+            frame = frame.f_back
+        return None, []
+
+
+profiler = Profiler()
+
+
+def _connection_thread(dbapi_connection):
+    """Ident of the thread an aiosqlite connection runs its statements on."""
+    thread = getattr(getattr(dbapi_connection, "driver_connection", None), "_thread", None)
+    return thread.ident if thread is not None else None
+
+
+@event.listens_for(async_engine.sync_engine, "checkout")
+@event.listens_for(async_read_engine.sync_engine, "checkout")
+def _claim_connection_thread(dbapi_connection, connection_record, connection_proxy):
+    profile = current_profile.get()
+    thread_id = _connection_thread(dbapi_connection)
+    if profile is not None and thread_id is not None:
+        profiler.claim(thread_id, profile)
+
+
+@event.listens_for(async_engine.sync_engine, "checkin")
+@event.listens_for(async_read_engine.sync_engine, "checkin")
+def _release_connection_thread(dbapi_connection, connection_record):
+    thread_id = _connection_thread(dbapi_connection)
+    if thread_id is not None:
+        profiler.release(thread_id)
+
+
+async def _is_admin(token: bytes) -> bool:
+    """Whether token is a valid admin token of an admin that still exists."""
+    try:
+        admin_id = principal_id(token.decode("latin-1"), "admin")
+    except HTTPException:
+        return False
+    async with AsyncReadSessionLocal() as db:
+        return await load_principal_async(db, models.Admin, admin_id) is not None
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles requests on demand or when they are slow."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = dict(scope["headers"]).get(PROFILE_HEADER)
+        requested = token is not None and await _is_admin(token)
+        if not requested and PROFILE_SLOW_MS <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(scope, "header" if requested else "slow")
+        context_token = current_profile.set(profile)
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if requested:
+                    headers = list(message.get("headers", []))
+                    message["headers"] = headers + [(b"x-profile-id", str(profile.id).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            current_profile.reset(context_token)
+            slow = (time.perf_counter() - profile.started) * 1000 >= PROFILE_SLOW_MS > 0
+            profiler.finish(profile, status, keep=requested or slow)
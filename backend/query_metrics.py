@@ -0,0 +1,187 @@
+"""
+Per-request SQL instrumentation.
+
+QueryMetricsMiddleware opens a RequestQueries record for every HTTP request
+in a context variable, and cursor events on every engine (sync, async and the
+write pipeline, whose jobs run in the submitting request's context) add each
+statement's duration to it. When the response starts the totals are sent as a
+Server-Timing header:
+
+    Server-Timing: db;dur=4.21;desc="7 queries", app;dur=12.80
+
+and folded into per-route aggregates served by /admin/stats/queries. A
+statement shape (the SQL with runs of placeholders collapsed) executed
+N_PLUS_ONE_THRESHOLD or more times in one request is logged as a likely N+1
+pattern, as one JSON object per request on the "pandit.queries" logger.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import QUERY_METRICS_ENABLED, N_PLUS_ONE_THRESHOLD, SLOW_STATEMENTS_KEPT
+
+logger = logging.getLogger("pandit.queries")
+
+_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with whitespace normalized and IN-lists of placeholders collapsed."""
+    return _PLACEHOLDERS.sub("?", _WHITESPACE.sub(" ", statement).strip())
+
+
+def keep_slowest(entries: list, entry: tuple, size: int):
+    """Insert (seconds, ...) into entries, which holds the size slowest sorted slowest first."""
+    if len(entries) < size or entry[0] > entries[-1][0]:
+        entries.append(entry)
+        entries.sort(key=lambda item: item[0], reverse=True)
+        del entries[size:]
+
+
+class RequestQueries:
+    """Statements executed while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = {}
+        self.slowest = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float):
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            keep_slowest(self.slowest, (seconds, shape), SLOW_STATEMENTS_KEPT)
+
+    def repeated(self) -> dict:
+        """Statement shapes run often enough to look like an N+1 pattern."""
+        return {shape: count for shape, count in self.shapes.items() if count >= N_PLUS_ONE_THRESHOLD}
+
+
+current_queries: ContextVar = ContextVar("current_queries", default=None)
+
+
+class QueryStats:
+    """Per-route aggregates of the queries issued by requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.slowest = []
+
+    def add(self, route: str, queries: RequestQueries, repeated: dict):
+        with self._lock:
+            totals = self._routes.setdefault(route, {
+                "requests": 0, "queries": 0, "max_queries": 0, "db_seconds": 0.0, "n_plus_one": 0,
+            })
+            totals["requests"] += 1
+            totals["queries"] += queries.count
+            totals["max_queries"] = max(totals["max_queries"], queries.count)
+            totals["db_seconds"] += queries.seconds
+            totals["n_plus_one"] += bool(repeated)
+            for seconds, shape in queries.slowest:
+                keep_slowest(self.slowest, (seconds, shape, route), SLOW_STATEMENTS_KEPT)
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self.slowest = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {
+                route: {
+                    "requests": totals["requests"],
+                    "avg_queries": round(totals["queries"] / totals["requests"], 2),
+                    "max_queries": totals["max_queries"],
+                    "avg_db_ms": round(totals["db_seconds"] / totals["requests"] * 1000, 2),
+                    "n_plus_one_requests": totals["n_plus_one"],
+                }
+                for route, totals in sorted(self._routes.items())
+            }
+            slowest = [
+                {"ms": round(seconds * 1000, 2), "route": route, "statement": shape}
+                for seconds, shape, route in self.slowest
+            ]
+        return {"n_plus_one_threshold": N_PLUS_ONE_THRESHOLD, "routes": routes, "slowest_statements": slowest}
+
+
+query_stats = QueryStats()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_queries.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = current_queries.get()
+    started = conn.info.get("query_started")
+    if queries is not None and started:
+        queries.record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def _route_name(scope) -> str:
+    """"GET /user/bookings/{booking_id}" style name of the route that served scope."""
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else '<unmatched>'}"
+
+
+class QueryMetricsMiddleware:
+    """ASGI middleware that measures the SQL of each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                app_ms = (time.perf_counter() - queries.started) * 1000
+                db_ms = queries.seconds * 1000
+                timing = f'db;dur={db_ms:.2f};desc="{queries.count} queries", app;dur={app_ms:.2f}'
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_queries.reset(token)
+            route = _route_name(scope)
+            repeated = queries.repeated()
+            query_stats.add(route, queries, repeated)
+            if repeated:
+                logger.warning(json.dumps({
+                    "event": "n_plus_one",
+                    "route": route,
+                    "path": scope["path"],
+                    "queries": queries.count,
+                    "db_ms": round(queries.seconds * 1000, 2),
+                    "repeated": [{"statement": shape, "count": count} for shape, count in repeated.items()],
+                }))
@@ -0,0 +1,96 @@
+"""
+Rating aggregates for users and pandits.
+
+Each reviewee keeps rating_count and rating_sum next to rating_avg. A new review
+bumps them with a single UPDATE of the reviewee's row in the review's
+transaction, so submitting a review no longer reads every earlier review of the
+same person.
+
+Run this file to recompute the aggregates from the reviews table:
+
+    python ratings.py
+"""
+
+from datetime import datetime
+from sqlalchemy import bindparam, func, select, update
+from database import engine, upgrade_schema
+import models
+from principal_cache import principal_cache
+
+# reviewee_type -> model holding the aggregates
+REVIEWEE_MODELS = {"user": models.User, "pandit": models.Pandit}
+
+
+def record_rating(db, model, reviewee_id: str, rating: int):
+    """Add one rating to a user's or pandit's aggregates in the current transaction."""
+    reviewee = db.get(model, reviewee_id)
+    if reviewee is None:
+        return
+    count = func.coalesce(model.rating_count, 0) + 1
+    total = func.coalesce(model.rating_sum, 0) + rating
+    # Flushed as one UPDATE of this row, whose SET expressions all see the row
+    # as it was before it; going through the instance (not a bulk query.update)
+    # lets the cache hooks drop just this reviewee
+    reviewee.rating_count = count
+    reviewee.rating_sum = total
+    reviewee.rating_avg = total * 1.0 / count
+
+
+def backfill_ratings(connection):
+    """
+    Recompute rating_count, rating_sum and rating_avg for every user and pandit
+    from one grouped query over reviews. Returns the number of reviewees with ratings.
+
+    Only rows whose aggregates were wrong are written, and they get a new
+    updated_at so ETags and the read model pick up the corrected ratings.
+    Cached principals are dropped as the writes bypass the ORM hooks.
+    """
+    totals = connection.execute(
+        select(
+            models.Review.reviewee_type,
+            models.Review.reviewee_id,
+            func.count(models.Review.rating),
+            func.sum(models.Review.rating)
+        ).where(models.Review.rating.isnot(None))
+        .group_by(models.Review.reviewee_type, models.Review.reviewee_id)
+    ).all()
+
+    rated = 0
+    now = datetime.utcnow()
+    for reviewee_type, model in REVIEWEE_MODELS.items():
+        table = model.__table__
+        expected = {
+            reviewee_id: (count, total, total / count)
+            for row_type, reviewee_id, count, total in totals
+            if row_type == reviewee_type
+        }
+        rated += len(expected)
+        current = connection.execute(
+            select(table.c.id, table.c.rating_count, table.c.rating_sum, table.c.rating_avg)
+        )
+        # People whose reviews are gone drop back to 0
+        rows = [
+            {"b_id": reviewee_id, "b_count": want[0], "b_sum": want[1], "b_avg": want[2]}
+            for reviewee_id, count, total, avg in current
+            for want in [expected.get(reviewee_id, (0, 0, 0))]
+            if (count, total, avg) != want
+        ]
+        if rows:
+            connection.execute(
+                update(table).where(table.c.id == bindparam("b_id")).values(
+                    rating_count=bindparam("b_count"),
+                    rating_sum=bindparam("b_sum"),
+                    rating_avg=bindparam("b_avg"),
+                    updated_at=now
+                ),
+                rows
+            )
+            principal_cache.invalidate_table(table.name)
+    return rated
+
+
+if __name__ == "__main__":
+    upgrade_schema()
+    with engine.begin() as connection:
+        rated = backfill_ratings(connection)
+    print(f"Rating aggregates rebuilt for {rated} users and pandits")
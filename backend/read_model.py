@@ -0,0 +1,688 @@
+"""
+In-memory read model of the marketplace.
+
+Pandits and services change rarely compared with how often they are searched,
+so the proximity and catalog reads are answered from a MarketSnapshot instead
+of SQLite: verified pandits and every service as __slots__ records, a
+geo_index.GridIndex of the pandits' coordinates (a bounding box looks at the
+cells it overlaps, then distances are computed with NumPy), each pandit's
+services, and an inverted index of service name and category tokens for
+keyword prefix matches. A snapshot is never modified; a refresh builds the next
+one from it and swaps the module-level reference, so a request works on one
+consistent view without taking a lock.
+
+Refreshes run on a background thread and patch in only the rows that changed.
+A commit that wrote pandits or services just queues their ids and wakes the
+thread, which reads those rows back by id; until it has swapped in the new
+snapshot, reads go to the database, so a write is visible to the next read.
+Every READ_MODEL_POLL_SECONDS the thread also re-reads rows whose updated_at is
+at or after the newest one loaded (minus REFRESH_LOOKBACK, for transactions
+that committed after a later one), for writes made by other processes, and
+compares its row counts with stats_counters: when they don't add up (rows
+deleted elsewhere, bulk deletes) the ids are compared with the tables.
+"""
+
+import bisect
+import functools
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from config import DEFAULT_SERVICE_RADIUS_KM, READ_MODEL_ENABLED, READ_MODEL_POLL_SECONDS
+from database import engine
+import models, schemas
+from stats import read_stats
+from geo_index import GridIndex
+from utils import calculate_distances, calculate_match_scores
+
+logger = logging.getLogger("pandit.read_model")
+
+# How far before the newest loaded updated_at a refresh looks for changes: a
+# write's updated_at is set at flush time, which can precede a commit that
+# lands after other writes
+REFRESH_LOOKBACK = timedelta(seconds=30)
+
+# Ids per IN (...) when reading changed rows back
+FETCH_CHUNK = 500
+
+PANDIT_FIELDS = (*schemas.PanditResponse.model_fields, "updated_at")
+SERVICE_FIELDS = (*schemas.ServiceResponse.model_fields, "updated_at")
+
+# A result of /services/nearby-distance, with the columns its SQL query selects
+NearbyService = namedtuple(
+    "NearbyService", ("id", "pandit_id", "name", "category", "base_price", "duration_minutes", "full_name", "distance_km")
+)
+
+
+class PanditRecord:
+    """A verified pandit, with the fields of schemas.PanditResponse."""
+
+    __slots__ = PANDIT_FIELDS
+
+    def __init__(self, *values):
+        for name, value in zip(PANDIT_FIELDS, values):
+            setattr(self, name, value)
+
+
+class ServiceRecord:
+    """A service, with the fields of schemas.ServiceResponse."""
+
+    __slots__ = SERVICE_FIELDS
+
+    def __init__(self, *values):
+        for name, value in zip(SERVICE_FIELDS, values):
+            setattr(self, name, value)
+
+
+def _latin_base(char: str) -> str:
+    """char without a Latin diacritic ("é" -> "e"), as FTS5's remove_diacritics does."""
+    decomposed = unicodedata.normalize("NFD", char)
+    base = "".join(mark for mark in decomposed if not "\u0300" <= mark <= "\u036f")
+    return base if len(base) == 1 and base != decomposed else char
+
+
+def _is_token_char(char: str) -> bool:
+    return char.isalnum() or unicodedata.category(char)[0] == "M" or unicodedata.category(char) == "Co"
+
+
+@functools.lru_cache(maxsize=8192)
+def tokens(text: str) -> tuple:
+    """Tokens of text as the unicode61 tokenizer of services_fts produces them."""
+    folded = "".join(_latin_base(char) for char in (text or "").lower())
+    words, current = [], []
+    for char in folded:
+        if _is_token_char(char):
+            current.append(char)
+        elif current:
+            words.append("".join(current))
+            current = []
+    if current:
+        words.append("".join(current))
+    return tuple(words)
+
+
+def _phrase_prefix(column: tuple, terms: tuple) -> bool:
+    """Whether column holds terms in a row, the last one as a prefix (FTS5 "a b"*)."""
+    *whole, last = terms
+    for start in range(len(column) - len(terms) + 1):
+        if list(column[start:start + len(whole)]) == whole and column[start + len(whole)].startswith(last):
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=256)
+def _like_pattern(pattern: str):
+    """Regex equivalent of a SQLite LIKE pattern (ASCII case-insensitive, no ESCAPE)."""
+    parts = [".*" if char == "%" else "." if char == "_" else re.escape(char) for char in _ascii_lower(pattern)]
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def _ascii_lower(text: str) -> str:
+    return "".join(char.lower() if char.isascii() else char for char in text)
+
+
+def _like(value, pattern: str) -> bool:
+    return value is not None and _like_pattern(pattern).fullmatch(_ascii_lower(value)) is not None
+
+
+def _sorted(records: list, key, descending: bool = False) -> list:
+    """records ordered by key (NULLs first, as in SQLite), then by id."""
+    by_id = sorted(records, key=lambda record: record.id)
+
+    def sort_key(record):
+        value = key(record)
+        return (value is not None, value if value is not None else 0)
+
+    return sorted(by_id, key=sort_key, reverse=descending)
+
+
+def _array(values) -> np.ndarray:
+    return np.array([math.nan if value is None else value for value in values], dtype=float)
+
+
+def _id_rank(records) -> np.ndarray:
+    """Position of each record in id order, to break ties the way ORDER BY id does."""
+    ids = np.array([record.id for record in records], dtype=object)
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[np.argsort(ids, kind="stable")] = np.arange(len(ids))
+    return rank
+
+
+def _radius(pandit) -> float:
+    """Travel radius as coalesce(service_radius_km, DEFAULT_SERVICE_RADIUS_KM)."""
+    return DEFAULT_SERVICE_RADIUS_KM if pandit.service_radius_km is None else pandit.service_radius_km
+
+
+def _located(pandit) -> bool:
+    return pandit.latitude is not None and pandit.longitude is not None
+
+
+def _service_tokens(service) -> set:
+    return {*tokens(service.name), *tokens(service.category)}
+
+
+def _newest(*values):
+    return max((value for value in values if value is not None), default=None)
+
+
+class MarketSnapshot:
+    """
+    Immutable view of verified pandits and all services, with indexes for the
+    read endpoints. with_changes builds the next snapshot from this one.
+    """
+
+    def __init__(self, pandits: dict, unverified: dict, services: dict):
+        # Pandits by id (verified only), updated_at of the others by id, and services by id
+        self.pandits = pandits
+        self.unverified = unverified
+        self.services = services
+        self.built_at = time.time()
+        self.watermark = _newest(
+            *(pandit.updated_at for pandit in pandits.values()),
+            *unverified.values(),
+            *(service.updated_at for service in services.values()),
+        )
+
+        # Located pandits in a grid of coordinate cells (geo_index.py)
+        self.grid = GridIndex((p.id, p.latitude, p.longitude) for p in pandits.values() if _located(p))
+        # Longest travel radius, as coalesce(service_radius_km, DEFAULT_SERVICE_RADIUS_KM)
+        self.max_radius = max(map(_radius, pandits.values()), default=0.0)
+
+        # Services of each pandit (by id), and the ids of the services holding
+        # each name/category token
+        by_pandit = {}
+        postings = {}
+        for service in sorted(services.values(), key=lambda s: s.id):
+            by_pandit.setdefault(service.pandit_id, []).append(service)
+            for token in _service_tokens(service):
+                postings.setdefault(token, set()).add(service.id)
+        self.services_by_pandit = {pandit_id: tuple(items) for pandit_id, items in by_pandit.items()}
+        self.postings = {token: frozenset(ids) for token, ids in postings.items()}
+        self.vocabulary = sorted(postings)
+
+    def with_changes(self, pandit_rows=(), service_rows=(), deleted_pandits=(), deleted_services=()):
+        """
+        A new snapshot with pandit and service rows (as _pandit_rows and
+        _service_rows return them) put in and deleted ids taken out. Only what
+        they touch is rebuilt: the dicts are copied, but the grid cells, the
+        per-pandit service tuples and the postings that didn't change are shared.
+        """
+        snapshot = MarketSnapshot.__new__(MarketSnapshot)
+        # The last row read for an id wins
+        pandit_rows = list({row.id: row for row in pandit_rows}.values())
+        service_rows = list({row.id: row for row in service_rows}.values())
+        pandits, unverified, services = dict(self.pandits), dict(self.unverified), dict(self.services)
+        removed_services, added_services = {}, {}
+
+        moved, unlocated = [], set(deleted_pandits)
+        for pandit_id in deleted_pandits:
+            pandits.pop(pandit_id, None)
+            unverified.pop(pandit_id, None)
+            # The services go with the pandit (ON DELETE CASCADE)
+            for service in self.services_by_pandit.get(pandit_id, ()):
+                removed_services[service.id] = services.pop(service.id)
+        for service_id in deleted_services:
+            if service_id in services:
+                removed_services[service_id] = services.pop(service_id)
+        for row in pandit_rows:
+            if row.is_verified:
+                pandit = pandits[row.id] = PanditRecord(*row)
+                unverified.pop(row.id, None)
+                if _located(pandit):
+                    moved.append((pandit.id, pandit.latitude, pandit.longitude))
+                    continue
+            else:
+                pandits.pop(row.id, None)
+                unverified[row.id] = row.updated_at
+            unlocated.add(row.id)
+        for row in service_rows:
+            if row.id in services:
+                removed_services.setdefault(row.id, services[row.id])
+            added_services[row.id] = services[row.id] = ServiceRecord(*row)
+
+        snapshot.pandits, snapshot.unverified, snapshot.services = pandits, unverified, services
+        snapshot.built_at = time.time()
+        snapshot.watermark = _newest(
+            self.watermark,
+            *(row.updated_at for row in pandit_rows),
+            *(row.updated_at for row in service_rows),
+        )
+        if moved or unlocated:
+            snapshot.grid = self.grid.with_changes(moved, unlocated)
+            snapshot.max_radius = max(map(_radius, pandits.values()), default=0.0)
+        else:
+            snapshot.grid, snapshot.max_radius = self.grid, self.max_radius
+
+        # Rebuild the service tuples of the pandits whose services changed
+        by_pandit = dict(self.services_by_pandit)
+        touched = {s.pandit_id for s in (*removed_services.values(), *added_services.values())}
+        for pandit_id in touched:
+            items = {s.id: s for s in by_pandit.get(pandit_id, ()) if s.id not in removed_services}
+            items.update((s.id, s) for s in added_services.values() if s.pandit_id == pandit_id)
+            if items:
+                by_pandit[pandit_id] = tuple(items[key] for key in sorted(items))
+            else:
+                by_pandit.pop(pandit_id, None)
+        snapshot.services_by_pandit = by_pandit
+
+        # Move the changed services between postings, copying only those
+        changes = {}
+        for service in removed_services.values():
+            for token in _service_tokens(service):
+                changes.setdefault(token, [set(), set()])[0].add(service.id)
+        for service in added_services.values():
+            for token in _service_tokens(service):
+                changes.setdefault(token, [set(), set()])[1].add(service.id)
+        postings = dict(self.postings)
+        vocabulary = self.vocabulary
+        if changes:
+            vocabulary = list(vocabulary)
+        for token, (removed, added) in changes.items():
+            ids = (postings.get(token, frozenset()) - removed) | added
+            if ids and token not in postings:
+                bisect.insort(vocabulary, token)
+            elif not ids and token in postings:
+                del vocabulary[bisect.bisect_left(vocabulary, token)]
+            if ids:
+                postings[token] = frozenset(ids)
+            else:
+                postings.pop(token, None)
+        snapshot.postings, snapshot.vocabulary = postings, vocabulary
+        return snapshot
+
+    def _within(self, latitude: float, longitude: float, radius_km: float):
+        """
+        Pandits inside bounding_box() of the search circle, as within_bounding_box
+        selects them, and their distances: (records, distances).
+        """
+        keys, lats, lons = self.grid.in_box(latitude, longitude, radius_km)
+        distances = calculate_distances(latitude, longitude, lats, lons)
+        return [self.pandits[key] for key in keys], distances
+
+    def search_pandits(self, latitude: float, longitude: float, max_distance_km: float,
+                       min_rating: float = None, max_price: float = None, sort_by: str = "match_score",
+                       skip: int = 0, limit: int = None) -> list:
+        """(PanditRecord, distance_km, match_score) of /user/pandits/search, in its order."""
+        records, distances = self._within(latitude, longitude, max_distance_km)
+        prices = _array(p.price_per_service for p in records)
+        ratings = _array(p.rating_avg for p in records)
+        keep = distances <= max_distance_km
+        if min_rating:
+            keep &= ratings >= min_rating
+        if max_price:
+            keep &= prices <= max_price
+        positions = np.flatnonzero(keep)
+        distances, prices, ratings = distances[positions], prices[positions], ratings[positions]
+        scores = calculate_match_scores(distances, np.nan_to_num(prices), np.nan_to_num(ratings))
+
+        # NULL prices first, as in SQLite (NaN would sort last); NULL ratings
+        # already come last in rating order, as they do in SQL
+        primary = {
+            "distance": distances,
+            "price": np.where(np.isnan(prices), -np.inf, prices),
+            "rating": -ratings,
+        }.get(sort_by, -scores)
+        order = np.lexsort((_id_rank(records[i] for i in positions), primary))
+        page = order[skip:skip + limit if limit is not None else None]
+        return [(records[positions[i]], float(distances[i]), float(scores[i])) for i in page]
+
+    def pandits_covering(self, latitude: float, longitude: float, skip: int = 0, limit: int = None) -> list:
+        """(PanditRecord, distance_km) of pandits whose service radius includes the point, nearest first."""
+        # Anyone covering the point is within the longest radius of it
+        records, distances = self._within(latitude, longitude, self.max_radius)
+        positions = np.flatnonzero(distances <= _array(map(_radius, records)))
+        distances = distances[positions]
+        order = np.lexsort((_id_rank(records[i] for i in positions), distances))
+        page = order[skip:skip + limit if limit is not None else None]
+        return [(records[positions[i]], float(distances[i])) for i in page]
+
+    def matching_services(self, keyword: str):
+        """
+        Ids of the services matching keyword as match_services() would: every
+        word prefix-matches the name or category. None when keyword is empty.
+        """
+        if not keyword:
+            return None
+        matched = None
+        for word in re.findall(r"\w+", keyword):
+            terms = tokens(word)
+            if not terms:
+                return set()
+            # Services holding a token that starts with the first term
+            first = bisect.bisect_left(self.vocabulary, terms[0])
+            candidates = set()
+            for token in self.vocabulary[first:]:
+                if not token.startswith(terms[0]):
+                    break
+                candidates.update(self.postings[token])
+            if len(terms) > 1:
+                candidates = {
+                    service_id for service_id in candidates
+                    if _phrase_prefix(tokens(self.services[service_id].name), terms)
+                    or _phrase_prefix(tokens(self.services[service_id].category), terms)
+                }
+            matched = candidates if matched is None else matched & candidates
+        return matched if matched is not None else set()
+
+    def services_nearby(self, latitude: float, longitude: float, max_distance_km: float,
+                        keyword: str = None, min_price: float = None, max_price: float = None,
+                        sort_by: str = "distance_asc"):
+        """NearbyService rows of /services/nearby-distance, in its order."""
+        records, distances = self._within(latitude, longitude, max_distance_km)
+        matched = self.matching_services(keyword)
+        rows = []
+        for position in np.flatnonzero(distances <= max_distance_km):
+            pandit, distance = records[position], distances[position]
+            for service in self.services_by_pandit.get(pandit.id, ()):
+                if matched is not None and service.id not in matched:
+                    continue
+                if min_price is not None and not (service.base_price is not None and service.base_price >= min_price):
+                    continue
+                if max_price is not None and not (service.base_price is not None and service.base_price <= max_price):
+                    continue
+                rows.append(NearbyService(
+                    service.id, service.pandit_id, service.name, service.category, service.base_price,
+                    service.duration_minutes, pandit.full_name, float(distance)
+                ))
+        if sort_by == "distance_asc":
+            return sorted(rows, key=lambda row: (row.distance_km, row.id))
+        return _sorted(rows, lambda row: row.base_price, sort_by == "price_desc")
+
+    def pandit_services(self, pandit_id: str, keyword: str = None, sort_by: str = "price_asc") -> list:
+        """Services of one pandit for /pandits/{pandit_id}/services, in its order."""
+        services = list(self.services_by_pandit.get(pandit_id, ()))
+        if keyword:
+            pattern = f"%{keyword.lower()}%"
+            services = [s for s in services if _like(s.name, pattern) or _like(s.category, pattern)]
+        if sort_by in ("name_asc", "name_desc"):
+            return _sorted(services, lambda s: s.name, sort_by == "name_desc")
+        return _sorted(services, lambda s: s.base_price, sort_by == "price_desc")
+
+    def pandit_services_version(self, pandit_id: str) -> tuple:
+        """(max(updated_at), count) of a pandit's services, as etags.collection_version returns it."""
+        services = self.services_by_pandit.get(pandit_id, ())
+        return max((s.updated_at for s in services if s.updated_at is not None), default=None), len(services)
+
+
+def _pandit_rows(connection, *criteria):
+    columns = [getattr(models.Pandit, name) for name in PANDIT_FIELDS]
+    return connection.execute(select(*columns).where(*criteria)).all()
+
+
+def _service_rows(connection, *criteria):
+    columns = [getattr(models.Service, name) for name in SERVICE_FIELDS]
+    return connection.execute(select(*columns).where(*criteria)).all()
+
+
+def _rows_by_id(fetch, connection, model, ids) -> list:
+    """fetch()'s rows of model with the given ids, in chunks that fit SQLite's variable limit."""
+    ids = list(ids)
+    rows = []
+    for start in range(0, len(ids), FETCH_CHUNK):
+        rows += fetch(connection, model.id.in_(ids[start:start + FETCH_CHUNK]))
+    return rows
+
+
+def _loaded(record, row) -> bool:
+    """Whether record holds the values of row."""
+    return record is not None and tuple(getattr(record, name) for name in record.__slots__) == tuple(row)
+
+
+def _pandit_loaded(snapshot, row) -> bool:
+    if row.is_verified:
+        return _loaded(snapshot.pandits.get(row.id), row)
+    return row.id in snapshot.unverified and snapshot.unverified[row.id] == row.updated_at
+
+
+class Changes:
+    """Pandits and services written by this process and not yet applied to the read model."""
+
+    def __init__(self):
+        self.pandits = set()
+        self.services = set()
+        self.deleted_pandits = set()
+        self.deleted_services = set()
+        # Rows changed without saying which (bulk updates and deletes)
+        self.unknown = False
+
+    def __bool__(self):
+        return bool(self.pandits or self.services or self.deleted_pandits or self.deleted_services or self.unknown)
+
+    def merge(self, other):
+        self.pandits |= other.pandits
+        self.services |= other.services
+        self.deleted_pandits |= other.deleted_pandits
+        self.deleted_services |= other.deleted_services
+        self.unknown = self.unknown or other.unknown
+
+
+class ReadModel:
+    """
+    The current MarketSnapshot and the background thread that keeps it up to
+    date. Commits only record what they changed (note_changes) and wake the
+    thread, which reads those rows back by id and patches them into a new
+    snapshot; until it has, current() returns None so reads fall back to the
+    database and still see the write.
+    """
+
+    def __init__(self, db_engine=engine, poll_seconds: float = READ_MODEL_POLL_SECONDS):
+        self.engine = db_engine
+        self.poll_seconds = poll_seconds
+        self.snapshot = None
+        self._pending = Changes()
+        self._pending_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        # note_changes calls made, and how many of them the snapshot includes
+        self.requested = 0
+        self.applied = 0
+        self.refreshes = 0
+        self.full_loads = 0
+        self.resyncs = 0
+        self.changed_rows = 0
+        self.last_refresh_seconds = None
+
+    def start(self):
+        """Load the model and start the thread applying changes and polling for other processes' writes."""
+        self.refresh(full=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="read-model", daemon=True)
+            self._thread.start()
+
+    def current(self):
+        """The snapshot to answer a read from, or None to query the database."""
+        if not READ_MODEL_ENABLED or self.applied != self.requested:
+            return None
+        return self.snapshot
+
+    def note_changes(self, changes: Changes):
+        """Queue rows committed by this process for the refresh thread."""
+        if self.snapshot is None or not changes:
+            return
+        with self._pending_lock:
+            self._pending.merge(changes)
+            self.requested += 1
+        self._wake.set()
+
+    def refresh(self, poll: bool = True, full: bool = False):
+        """
+        Apply the queued changes to a new snapshot and swap it in. With poll,
+        also look for rows changed by other processes since the watermark.
+        """
+        with self._refresh_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, Changes()
+                requested = self.requested
+            started = time.perf_counter()
+            try:
+                with self.engine.connect() as connection:
+                    snapshot = self.snapshot
+                    if full or snapshot is None:
+                        snapshot = self._load(connection)
+                    else:
+                        snapshot = self._apply_changes(connection, snapshot, pending, poll)
+            except Exception:
+                # Retried by the next refresh; reads use the database meanwhile
+                with self._pending_lock:
+                    self._pending.merge(pending)
+                raise
+            self.snapshot = snapshot
+            self.applied = requested
+            self.last_refresh_seconds = time.perf_counter() - started
+
+    def _load(self, connection) -> MarketSnapshot:
+        self.full_loads += 1
+        pandits, unverified = {}, {}
+        for row in _pandit_rows(connection):
+            if row.is_verified:
+                pandits[row.id] = PanditRecord(*row)
+            else:
+                unverified[row.id] = row.updated_at
+        services = {row.id: ServiceRecord(*row) for row in _service_rows(connection)}
+        return MarketSnapshot(pandits, unverified, services)
+
+    def _apply_changes(self, connection, snapshot, pending: Changes, poll: bool) -> MarketSnapshot:
+        """snapshot with the pending rows, and with poll the rows changed since its watermark, applied."""
+        self.refreshes += 1
+        pandit_rows = _rows_by_id(_pandit_rows, connection, models.Pandit, pending.pandits)
+        service_rows = _rows_by_id(_service_rows, connection, models.Service, pending.services)
+        # Rows noted as written but gone by now were deleted since
+        deleted_pandits = pending.deleted_pandits | (pending.pandits - {row.id for row in pandit_rows})
+        deleted_services = pending.deleted_services | (pending.services - {row.id for row in service_rows})
+
+        if (poll or pending.unknown) and snapshot.watermark is not None:
+            # Served by the updated_at indexes; the lookback re-reads rows
+            # already applied, which are skipped
+            since = snapshot.watermark - REFRESH_LOOKBACK
+            fetched = {row.id for row in pandit_rows}
+            pandit_rows += [
+                row for row in _pandit_rows(connection, models.Pandit.updated_at >= since)
+                if row.id not in fetched and not _pandit_loaded(snapshot, row)
+            ]
+            fetched = {row.id for row in service_rows}
+            service_rows += [
+                row for row in _service_rows(connection, models.Service.updated_at >= since)
+                if row.id not in fetched and not _loaded(snapshot.services.get(row.id), row)
+            ]
+
+        if pandit_rows or service_rows or deleted_pandits or deleted_services:
+            snapshot = snapshot.with_changes(pandit_rows, service_rows, deleted_pandits, deleted_services)
+            self.changed_rows += len(pandit_rows) + len(service_rows)
+
+        if poll or pending.unknown:
+            # Deletes the ORM didn't see (other processes, bulk deletes) show
+            # up as counts that don't add up: compare the ids then
+            counters = read_stats(connection)
+            if counters.get("pandits") != len(snapshot.pandits) + len(snapshot.unverified) \
+                    or counters.get("services") != len(snapshot.services):
+                snapshot = self._resync(connection, snapshot)
+        return snapshot
+
+    def _resync(self, connection, snapshot) -> MarketSnapshot:
+        """snapshot with the rows it lacks added and the rows no longer in the database dropped."""
+        self.resyncs += 1
+        pandit_ids = set(connection.scalars(select(models.Pandit.id)))
+        service_ids = set(connection.scalars(select(models.Service.id)))
+        known_pandits = snapshot.pandits.keys() | snapshot.unverified.keys()
+        known_services = snapshot.services.keys()
+        pandit_rows = _rows_by_id(_pandit_rows, connection, models.Pandit, pandit_ids - known_pandits)
+        service_rows = _rows_by_id(_service_rows, connection, models.Service, service_ids - known_services)
+        return snapshot.with_changes(
+            pandit_rows, service_rows, known_pandits - pandit_ids, known_services - service_ids
+        )
+
+    def _run(self):
+        while True:
+            woken = self._wake.wait(self.poll_seconds if self.poll_seconds > 0 else None)
+            self._wake.clear()
+            try:
+                self.refresh(poll=not woken)
+            except Exception:
+                logger.exception("Read model refresh failed")
+                time.sleep(1)
+                self._wake.set()
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "enabled": READ_MODEL_ENABLED,
+            "verified_pandits": len(snapshot.pandits) if snapshot is not None else None,
+            "services": len(snapshot.services) if snapshot is not None else None,
+            "age_seconds": round(time.time() - snapshot.built_at, 2) if snapshot is not None else None,
+            "pending": self.requested - self.applied,
+            "poll_seconds": self.poll_seconds,
+            "refreshes": self.refreshes,
+            "full_loads": self.full_loads,
+            "resyncs": self.resyncs,
+            "changed_rows": self.changed_rows,
+            "last_refresh_ms": round(self.last_refresh_seconds * 1000, 2)
+            if self.last_refresh_seconds is not None else None,
+        }
+
+
+read_model = ReadModel()
+
+
+# Commits through the ORM queue the rows they wrote for the refresh thread
+def _changes(session) -> Changes:
+    return session.info.setdefault("read_model_changes", Changes())
+
+
+def _pandit_written(mapper, connection, target):
+    _changes(object_session(target)).pandits.add(target.id)
+
+
+def _service_written(mapper, connection, target):
+    _changes(object_session(target)).services.add(target.id)
+
+
+def _pandit_deleted(mapper, connection, target):
+    _changes(object_session(target)).deleted_pandits.add(target.id)
+
+
+def _service_deleted(mapper, connection, target):
+    _changes(object_session(target)).deleted_services.add(target.id)
+
+
+for _event in ("after_insert", "after_update"):
+    event.listen(models.Pandit, _event, _pandit_written)
+    event.listen(models.Service, _event, _service_written)
+event.listen(models.Pandit, "after_delete", _pandit_deleted)
+event.listen(models.Service, "after_delete", _service_deleted)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_write(orm_execute_state):
+    # Bulk query.update()/delete() don't say which rows they touched; updates
+    # bump updated_at and deletes change the counts, so the refresh polls
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (models.Pandit, models.Service):
+        return
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        _changes(orm_execute_state.session).unknown = True
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    if session.in_nested_transaction():
+        # A SAVEPOINT was released (write queue jobs); wait for the real commit
+        return
+    changes = session.info.pop("read_model_changes", None)
+    if changes:
+        read_model.note_changes(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    if session.in_nested_transaction():
+        # Only a SAVEPOINT was rolled back; the rest of the transaction may still commit
+        return
+    session.info.pop("read_model_changes", None)
@@ -0,0 +1,263 @@
+"""
+Cache of rendered responses for the public service catalog.
+
+The frontend loads /services on every page and /services/search repeats the
+same handful of queries, so these endpoints keep their JSON bodies here keyed
+by endpoint and normalized query parameters. Each entry is tagged with what it
+was built from: SERVICES for anything listing services across pandits, and
+("pandit_services", pandit_id) for one pandit's services. Creating, updating
+or deleting a service drops the entries tagged with it, and deleting a pandit
+drops its services' entries (the rows go with it through ON DELETE CASCADE).
+Other pandit updates (ratings, locations, verification) don't change these
+responses and leave the cache alone. Entries also expire after
+RESPONSE_CACHE_TTL_SECONDS as a backstop for writes made outside the ORM.
+
+A body is cached with its ETag, so a hit answers If-None-Match without the
+version query etags.py would otherwise run on every request. Other caches
+derived from the same rows (the search totals) register with on_invalidate
+to be cleared along with a tag.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from config import RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES
+from etags import etag_matches, not_modified
+import models
+
+SERVICES = ("services",)
+
+
+def pandit_services(pandit_id: str):
+    """Tag of responses built from one pandit's services."""
+    return ("pandit_services", pandit_id)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of response bodies with a TTL, a size budget and tag invalidation."""
+
+    def __init__(self, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (body, tags, expires, etag)
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._listeners = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        # Bumped on every invalidation so a response computed while a write
+        # was committing isn't stored
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (body, etag) for key, or None if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[3]
+
+    def put(self, key, body: bytes, tags, version: int, etag: str = None):
+        """Store body unless something was invalidated since version was read."""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, tuple(tags), time.monotonic() + self.ttl_seconds, etag)
+            self.bytes += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        body, tags, _, _ = self._entries.pop(key)
+        self.bytes -= len(body)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def on_invalidate(self, tag, callback):
+        """Call callback() whenever tag is invalidated or the cache is cleared."""
+        self._listeners.setdefault(tag, []).append(callback)
+
+    def invalidate(self, tags):
+        """Drop every entry carrying one of tags."""
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+        for tag in tags:
+            for callback in self._listeners.get(tag, ()):
+                callback()
+
+    def invalidate_kind(self, kind: str):
+        """Drop every entry carrying a tag of this kind, e.g. all pandit_services tags."""
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            for tag in [t for t in self._tags if t[0] == kind]:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._tags.clear()
+            self.bytes = 0
+        for callbacks in self._listeners.values():
+            for callback in callbacks:
+                callback()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def json_response(body: bytes, cache_status: str, etag: str = None) -> Response:
+    headers = {"X-Cache": cache_status}
+    if etag:
+        headers["ETag"] = etag
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def render(payload) -> bytes:
+    """Encode a response payload (dicts, lists, pydantic models) as JSON."""
+    return orjson.dumps(jsonable_encoder(payload))
+
+
+def cached_json(key, tags, compute, request=None, etag=None) -> Response:
+    """
+    Return the cached response for key, or render compute() and cache it under
+    tags. With etag, a function returning the current ETag, the response is
+    conditional on request's If-None-Match: etag() only runs on a miss, and its
+    value is cached with the body for the hits.
+    """
+    entry = response_cache.get(key)
+    if entry is not None:
+        body, tag = entry
+        if tag and etag_matches(request, tag):
+            return not_modified(tag)
+        return json_response(body, "HIT", tag)
+    # Read before the ETag, so a write committed after it keeps both out of the cache
+    version = response_cache.version
+    tag = etag() if etag else None
+    if tag and etag_matches(request, tag):
+        return not_modified(tag)
+    body = render(compute())
+    response_cache.put(key, body, tags, version, tag)
+    return json_response(body, "MISS", tag)
+
+
+async def cached_json_async(key, tags, compute, request=None, etag=None) -> Response:
+    """cached_json where compute() and etag() return awaitables."""
+    entry = response_cache.get(key)
+    if entry is not None:
+        body, tag = entry
+        if tag and etag_matches(request, tag):
+            return not_modified(tag)
+        return json_response(body, "HIT", tag)
+    version = response_cache.version
+    tag = await etag() if etag else None
+    if tag and etag_matches(request, tag):
+        return not_modified(tag)
+    body = render(await compute())
+    response_cache.put(key, body, tags, version, tag)
+    return json_response(body, "MISS", tag)
+
+
+def _forget(session, tags):
+    """Drop tags now, and again once session commits."""
+    response_cache.invalidate(tags)
+    if session is not None:
+        session.info.setdefault("response_tags", set()).update(tags)
+
+
+def _service_changed(mapper, connection, target):
+    tags = {SERVICES, pandit_services(target.pandit_id)}
+    # A service moved to another pandit leaves the old pandit's listing too
+    for pandit_id in inspect(target).attrs.pandit_id.history.deleted:
+        tags.add(pandit_services(pandit_id))
+    _forget(object_session(target), tags)
+
+
+def _pandit_deleted(mapper, connection, target):
+    _forget(object_session(target), {SERVICES, pandit_services(target.id)})
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(models.Service, _event, _service_changed)
+event.listen(models.Pandit, "after_delete", _pandit_deleted)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_write(orm_execute_state):
+    # Bulk query.update()/delete() skips the mapper events and doesn't say
+    # which pandits it touched, so drop every service listing
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    if (orm_execute_state.is_update and mapper.class_ is models.Service) or \
+            (orm_execute_state.is_delete and mapper.class_ in (models.Service, models.Pandit)):
+        response_cache.invalidate_kind("pandit_services")
+        _forget(orm_execute_state.session, {SERVICES})
+        orm_execute_state.session.info["response_all_pandits"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    # A request that read the old rows between the flush and the commit may
+    # have cached them again
+    tags = session.info.pop("response_tags", ())
+    if tags:
+        response_cache.invalidate(tags)
+    if session.info.pop("response_all_pandits", False):
+        response_cache.invalidate_kind("pandit_services")
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    session.info.pop("response_tags", None)
+    session.info.pop("response_all_pandits", None)
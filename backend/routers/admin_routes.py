@@ -1,18 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 import models, schemas
-from utils import hash_password, verify_password
-from auth import create_token, get_db, get_current_admin
+from starlette.concurrency import run_in_threadpool
+from passwords import password_pool, verify_password_async, save_password_hash
+from auth import create_token, get_db, get_current_admin, get_current_admin_async, get_read_db
+from stats import read_stats
+from database import storage_settings
+from writes import write_queue
+from query_metrics import query_stats
+from profiler import profiler
+from tracing import TracedRoute, trace_collector
+from principal_cache import principal_cache
+from response_cache import response_cache
+from read_model import read_model
+from pagination import keyset_paginate, set_next_cursor
+from etags import row_etag, conditional
+from serializers import Serializer
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+# Pandit lists encoded straight from the rows (serializers.py)
+all_pandits_json = Serializer(schemas.PanditResponse, "view_all_pandits")
+pending_pandits_json = Serializer(schemas.PanditResponse, "view_pending_pandits")
 
 # Admin Login (No registration - admins created manually)
 @router.post("/admin/login")
-def login_admin(admin: schemas.AdminLogin, db: Session = Depends(get_db)):
+async def login_admin(admin: schemas.AdminLogin, db: Session = Depends(get_db)):
     """Admin login endpoint"""
-    db_admin = db.query(models.Admin).filter(models.Admin.username == admin.username).first()
-    if not db_admin or not verify_password(admin.password, db_admin.hashed_password):
+    db_admin = await run_in_threadpool(
+        lambda: db.query(models.Admin).filter(models.Admin.username == admin.username).first()
+    )
+    if not db_admin:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    # Password checks run on the password pool, not the request threadpool
+    valid, new_hash = await verify_password_async(admin.password, db_admin.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        await run_in_threadpool(save_password_hash, db, db_admin, new_hash)
 
     token = create_token({"sub": str(db_admin.id), "type": "admin"})
     return {
@@ -24,45 +49,54 @@ def login_admin(admin: schemas.AdminLogin, db: Session = Depends(get_db)):
 
 # Get admin profile
 @router.get("/admin/profile", response_model=schemas.AdminResponse)
-def get_profile(admin=Depends(get_current_admin)):
+async def get_profile(request: Request, response: Response, admin=Depends(get_current_admin_async)):
     """Get current admin profile"""
+    unchanged = conditional(request, response, row_etag(admin))
+    if unchanged:
+        return unchanged
     return admin
 
 # View all pandits (with filter for verification status)
 @router.get("/admin/pandits", response_model=list[schemas.PanditResponse])
 def view_all_pandits(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     admin=Depends(get_current_admin),
     is_verified: bool = Query(None, description="Filter by verification status"),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100)
 ):
     """View all pandits with optional filter for verification status"""
-    query = db.query(models.Pandit)
+    query = db.query(*all_pandits_json.columns(models.Pandit))
     
     if is_verified is not None:
         query = query.filter(models.Pandit.is_verified == is_verified)
     
     pandits = query.order_by(models.Pandit.created_at.desc()).offset(skip).limit(limit).all()
-    return pandits
+    return all_pandits_json.respond(all_pandits_json.rows(pandits))
 
 # View pending verification requests
 @router.get("/admin/pandits/pending", response_model=list[schemas.PanditResponse])
 def view_pending_pandits(
-    db: Session = Depends(get_db),
-    admin=Depends(get_current_admin)
+    response: Response,
+    db: Session = Depends(get_read_db),
+    admin=Depends(get_current_admin),
+    cursor: str = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=100)
 ):
-    """View all pandits pending verification"""
-    pandits = db.query(models.Pandit).filter(
-        models.Pandit.is_verified == False
-    ).order_by(models.Pandit.created_at.desc()).all()
-    return pandits
+    """View pandits pending verification, newest first, one page at a time"""
+    query = db.query(models.Pandit).filter(models.Pandit.is_verified == False)
+    pandits, next_cursor = keyset_paginate(
+        query, [models.Pandit.created_at, models.Pandit.id], limit, cursor,
+        descending=True, sort="pending"
+    )
+    set_next_cursor(response, next_cursor)
+    return pending_pandits_json.respond(pending_pandits_json.rows(pandits), response)
 
 # Get specific pandit details
 @router.get("/admin/pandits/{pandit_id}", response_model=schemas.PanditResponse)
 def get_pandit_details(
     pandit_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     admin=Depends(get_current_admin)
 ):
     """Get detailed information about a specific pandit"""
@@ -159,18 +193,20 @@ def delete_pandit(
 # Get statistics
 @router.get("/admin/stats")
 def get_statistics(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     admin=Depends(get_current_admin)
 ):
     """Get platform statistics"""
-    total_users = db.query(models.User).count()
-    total_pandits = db.query(models.Pandit).count()
-    verified_pandits = db.query(models.Pandit).filter(models.Pandit.is_verified == True).count()
-    pending_pandits = db.query(models.Pandit).filter(models.Pandit.is_verified == False).count()
-    total_services = db.query(models.Service).count()
-    total_bookings = db.query(models.Booking).count()
-    pending_bookings = db.query(models.Booking).filter(models.Booking.status == "pending").count()
-    completed_bookings = db.query(models.Booking).filter(models.Booking.status == "completed").count()
+    # Counters are maintained by triggers (see stats.py)
+    counters = read_stats(db)
+    total_users = counters.get("users", 0)
+    total_pandits = counters.get("pandits", 0)
+    verified_pandits = counters.get("pandits_verified", 0)
+    pending_pandits = total_pandits - verified_pandits
+    total_services = counters.get("services", 0)
+    total_bookings = counters.get("bookings", 0)
+    pending_bookings = counters.get("bookings_pending", 0)
+    completed_bookings = counters.get("bookings_completed", 0)
     
     return {
         "users": {
@@ -190,3 +226,72 @@ def get_statistics(
             "completed": completed_bookings
         }
     }
+
+# Get cache statistics
+@router.get("/admin/stats/cache")
+def get_cache_statistics(admin=Depends(get_current_admin)):
+    """Get hit/miss statistics for in-memory caches"""
+    return {
+        "principals": principal_cache.stats(),
+        "responses": response_cache.stats()
+    }
+
+# Get password hashing pool statistics
+@router.get("/admin/stats/passwords")
+def get_password_statistics(admin=Depends(get_current_admin)):
+    """Get queue depth and latency of the password hashing pool"""
+    return password_pool.stats()
+
+# Get write pipeline statistics
+@router.get("/admin/stats/writes")
+def get_write_statistics(admin=Depends(get_current_admin)):
+    """Get queue wait, batch size and retry statistics of the write pipeline"""
+    return write_queue.stats()
+
+# Get read model statistics
+@router.get("/admin/stats/read-model")
+def get_read_model_statistics(admin=Depends(get_current_admin)):
+    """Get the size, age and refresh counts of the in-memory read model"""
+    return read_model.stats()
+
+# Get per-route query statistics
+@router.get("/admin/stats/queries")
+def get_query_statistics(admin=Depends(get_current_admin)):
+    """Get query counts, database time and the slowest statements by route"""
+    return query_stats.stats()
+
+# List recent request profiles
+@router.get("/admin/profiles")
+def list_profiles(admin=Depends(get_current_admin)):
+    """Get the kept request profiles, newest first"""
+    return profiler.summaries()
+
+# Get the stacks of one request profile
+@router.get("/admin/profiles/{profile_id}")
+def get_profile_stacks(profile_id: int, admin=Depends(get_current_admin)):
+    """Get a request profile in folded stack format, for flamegraph.pl or speedscope"""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=profile.folded(), media_type="text/plain")
+
+# List recent request traces
+@router.get("/admin/traces")
+def list_traces(admin=Depends(get_current_admin)):
+    """Get the kept request traces without their spans, newest first"""
+    return trace_collector.summaries()
+
+# Get the spans of one request trace
+@router.get("/admin/traces/{trace_id}")
+def get_trace(trace_id: str, admin=Depends(get_current_admin)):
+    """Get a request trace with all of its spans"""
+    trace = trace_collector.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+# Get storage settings
+@router.get("/admin/stats/storage")
+def get_storage_settings(admin=Depends(get_current_admin)):
+    """Get the effective SQLite settings and connection pool sizes"""
+    return storage_settings()
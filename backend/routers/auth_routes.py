@@ -1,20 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import models, schemas
-from utils import hash_password, verify_password
+from passwords import hash_password_async, verify_password_async, save_password_hash
 from auth import create_token, get_db
+from config import DEFAULT_SERVICE_RADIUS_KM
+from tracing import TracedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+# Registration and login are async so that password hashing waits on the
+# password pool (see passwords.py); database work still runs in the threadpool
+
+def add_and_refresh(db: Session, row):
+    """Insert a new row and reload its generated columns."""
+    db.add(row)
+    db.commit()
+    db.refresh(row)
 
 # User Authentication
 @router.post("/user/register")
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # Check if phone already exists
-    existing_user = db.query(models.User).filter(models.User.phone == user.phone).first()
+    existing_user = await run_in_threadpool(
+        lambda: db.query(models.User).filter(models.User.phone == user.phone).first()
+    )
     if existing_user:
         raise HTTPException(status_code=400, detail="Phone number already registered")
     
-    hashed = hash_password(user.password)
+    hashed = await hash_password_async(user.password)
     db_user = models.User(
         full_name=user.full_name, 
         phone=user.phone,
@@ -24,16 +38,22 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         longitude=user.longitude,
         location_name=user.location_name
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await run_in_threadpool(add_and_refresh, db, db_user)
     return {"msg": "User registered successfully", "user_id": str(db_user.id)}
 
 @router.post("/user/login")
-def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.phone == user.phone).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(
+        lambda: db.query(models.User).filter(models.User.phone == user.phone).first()
+    )
+    if not db_user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    valid, new_hash = await verify_password_async(user.password, db_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        # Stored with an outdated bcrypt cost
+        await run_in_threadpool(save_password_hash, db, db_user, new_hash)
 
     token = create_token({"sub": str(db_user.id), "type": "user"})
     return {
@@ -45,13 +65,15 @@ def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 # Pandit Authentication
 @router.post("/pandit/register")
-def register_pandit(pandit: schemas.PanditCreate, db: Session = Depends(get_db)):
+async def register_pandit(pandit: schemas.PanditCreate, db: Session = Depends(get_db)):
     # Check if phone already exists
-    existing_pandit = db.query(models.Pandit).filter(models.Pandit.phone == pandit.phone).first()
+    existing_pandit = await run_in_threadpool(
+        lambda: db.query(models.Pandit).filter(models.Pandit.phone == pandit.phone).first()
+    )
     if existing_pandit:
         raise HTTPException(status_code=400, detail="Phone number already registered")
     
-    hashed = hash_password(pandit.password)
+    hashed = await hash_password_async(pandit.password)
     db_pandit = models.Pandit(
         full_name=pandit.full_name,
         phone=pandit.phone,
@@ -64,18 +86,25 @@ def register_pandit(pandit: schemas.PanditCreate, db: Session = Depends(get_db))
         latitude=pandit.latitude,
         longitude=pandit.longitude,
         location_name=pandit.location_name,
-        price_per_service=pandit.price_per_service
+        price_per_service=pandit.price_per_service,
+        service_radius_km=pandit.service_radius_km or DEFAULT_SERVICE_RADIUS_KM
     )
-    db.add(db_pandit)
-    db.commit()
-    db.refresh(db_pandit)
+    await run_in_threadpool(add_and_refresh, db, db_pandit)
     return {"msg": "Pandit registered successfully", "pandit_id": str(db_pandit.id)}
 
 @router.post("/pandit/login")
-def login_pandit(pandit: schemas.PanditLogin, db: Session = Depends(get_db)):
-    db_pandit = db.query(models.Pandit).filter(models.Pandit.phone == pandit.phone).first()
-    if not db_pandit or not verify_password(pandit.password, db_pandit.hashed_password):
+async def login_pandit(pandit: schemas.PanditLogin, db: Session = Depends(get_db)):
+    db_pandit = await run_in_threadpool(
+        lambda: db.query(models.Pandit).filter(models.Pandit.phone == pandit.phone).first()
+    )
+    if not db_pandit:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    valid, new_hash = await verify_password_async(pandit.password, db_pandit.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        # Stored with an outdated bcrypt cost
+        await run_in_threadpool(save_password_hash, db, db_pandit, new_hash)
 
     token = create_token({"sub": str(db_pandit.id), "type": "pandit"})
     return {
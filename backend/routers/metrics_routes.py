@@ -0,0 +1,90 @@
+import hmac
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import metrics
+from metrics import Snapshot
+from auth import get_async_read_db, get_current_admin_async
+from config import METRICS_ENABLED, METRICS_TOKEN
+from database import engine, async_engine, read_engine, async_read_engine
+from passwords import password_pool
+from principal_cache import principal_cache
+from response_cache import response_cache
+from writes import write_queue
+
+router = APIRouter()
+
+POOLS = {"primary": engine, "async": async_engine, "read": read_engine, "async_read": async_read_engine}
+
+
+def pool_metrics() -> list:
+    """Connections in use and pool capacity of each engine with a sized pool."""
+    pools = {name: db_engine.pool for name, db_engine in POOLS.items() if hasattr(db_engine.pool, "checkedout")}
+    return [
+        Snapshot("pandit_db_pool_size", "gauge", "Connections kept in the pool.", ("pool",),
+                 {(name,): pool.size() for name, pool in pools.items()}),
+        Snapshot("pandit_db_pool_checked_out", "gauge", "Connections currently checked out.", ("pool",),
+                 {(name,): pool.checkedout() for name, pool in pools.items()}),
+        Snapshot("pandit_db_pool_overflow", "gauge", "Connections opened beyond the pool size.", ("pool",),
+                 {(name,): max(pool.overflow(), 0) for name, pool in pools.items()}),
+    ]
+
+
+def cache_metrics() -> list:
+    """Lookups and hit ratio of the principal and response caches."""
+    caches = {"principals": principal_cache.stats(), "responses": response_cache.stats()}
+    return [
+        Snapshot("pandit_cache_hits_total", "counter", "Cache lookups that found an entry.", ("cache",),
+                 {(name,): stats["hits"] for name, stats in caches.items()}),
+        Snapshot("pandit_cache_misses_total", "counter", "Cache lookups that missed.", ("cache",),
+                 {(name,): stats["misses"] for name, stats in caches.items()}),
+        Snapshot("pandit_cache_hit_ratio", "gauge", "Share of cache lookups that hit since startup.", ("cache",),
+                 {(name,): stats["hit_rate"] for name, stats in caches.items()}),
+        Snapshot("pandit_cache_entries", "gauge", "Entries held by the cache.", ("cache",),
+                 {(name,): stats["entries"] for name, stats in caches.items()}),
+    ]
+
+
+def worker_metrics() -> list:
+    """Saturation of the threads and queues that run blocking work."""
+    limiter = current_default_thread_limiter()
+    passwords = password_pool.stats()
+    writes = write_queue.stats()
+    return [
+        Snapshot("pandit_threadpool_threads", "gauge", "Threads available to sync route handlers.",
+                 samples={(): limiter.total_tokens}),
+        Snapshot("pandit_threadpool_busy", "gauge", "Threads running sync route handlers.",
+                 samples={(): limiter.borrowed_tokens}),
+        Snapshot("pandit_threadpool_waiting", "gauge", "Sync route handlers waiting for a thread.",
+                 samples={(): limiter.statistics().tasks_waiting}),
+        Snapshot("pandit_password_workers", "gauge", "Threads dedicated to password hashing.",
+                 samples={(): passwords["workers"]}),
+        Snapshot("pandit_password_in_flight", "gauge", "Password hashes running or queued.",
+                 samples={(): passwords["in_flight"]}),
+        Snapshot("pandit_password_rejected_total", "counter", "Password hashes refused because the queue was full.",
+                 samples={(): passwords["rejected"]}),
+        Snapshot("pandit_write_queue_limit", "gauge", "Writes the write pipeline queue holds.",
+                 samples={(): writes["queue_limit"]}),
+        Snapshot("pandit_write_queue_depth", "gauge", "Writes waiting for the write pipeline.",
+                 samples={(): writes["queued"]}),
+        Snapshot("pandit_write_queue_rejected_total", "counter", "Writes refused because the queue stayed full.",
+                 samples={(): writes["rejected"]}),
+    ]
+
+
+async def require_metrics_access(authorization: str = Header(None), db: AsyncSession = Depends(get_async_read_db)):
+    """Let through the METRICS_TOKEN bearer token or an admin's token, otherwise raise 401."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if METRICS_TOKEN and authorization is not None:
+        token = authorization.removeprefix("Bearer ")
+        if hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            return
+    await get_current_admin_async(authorization, db)
+
+
+# Prometheus scrape endpoint (scrape token or admin only)
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    families = [*metrics.REGISTRY, *pool_metrics(), *cache_metrics(), *worker_metrics()]
+    return Response(content=metrics.render(families), media_type=metrics.CONTENT_TYPE)
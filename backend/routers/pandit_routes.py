@@ -1,13 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 import models, schemas
-from auth import get_current_pandit, get_db
+from auth import get_current_pandit, get_current_pandit_async, get_db, get_read_db, get_async_read_db
+from ratings import record_rating
+from writes import write_queue
+from pagination import keyset_paginate_async, set_next_cursor
+from etags import row_etag, collection_etag, collection_etag_async, conditional
+from serializers import Serializer
+from tracing import TracedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+# List responses encoded straight from the rows (serializers.py)
+services_json = Serializer(schemas.ServiceResponse, "view_my_services")
+bookings_json = Serializer(schemas.BookingResponse, "view_bookings")
 
 # Get pandit profile
 @router.get("/pandit/profile", response_model=schemas.PanditResponse)
-def get_profile(pandit=Depends(get_current_pandit)):
+async def get_profile(request: Request, response: Response, pandit=Depends(get_current_pandit_async)):
+    # 304 if the client's copy is still current
+    unchanged = conditional(request, response, row_etag(pandit))
+    if unchanged:
+        return unchanged
     return pandit
 
 # Update pandit profile
@@ -17,10 +33,13 @@ def update_profile(
     region: str = Query(None),
     languages: str = Query(None),
     price_per_service: float = Query(None),
+    service_radius_km: float = Query(None, gt=0, description="How far you travel (km)"),
     db: Session = Depends(get_db),
     pandit=Depends(get_current_pandit)
 ):
     """Update pandit's profile information"""
+    # The authenticated pandit belongs to the read session
+    pandit = db.get(models.Pandit, pandit.id)
     if bio:
         pandit.bio = bio
     if region:
@@ -29,6 +48,8 @@ def update_profile(
         pandit.languages = languages
     if price_per_service is not None:
         pandit.price_per_service = price_per_service
+    if service_radius_km is not None:
+        pandit.service_radius_km = service_radius_km
     
     db.commit()
     return {"msg": "Profile updated successfully"}
@@ -39,21 +60,23 @@ def update_location(
     latitude: float = Query(...),
     longitude: float = Query(...),
     location_name: str = Query(None),
-    db: Session = Depends(get_db),
     pandit=Depends(get_current_pandit)
 ):
     """Update pandit's location"""
-    pandit.latitude = latitude
-    pandit.longitude = longitude
-    if location_name:
-        pandit.location_name = location_name
+    def update(db: Session):
+        row = db.get(models.Pandit, pandit.id)
+        row.latitude = latitude
+        row.longitude = longitude
+        if location_name:
+            row.location_name = location_name
+        return row
     
-    db.commit()
+    updated = write_queue.run(update)
     return {
         "msg": "Location updated successfully",
-        "latitude": pandit.latitude,
-        "longitude": pandit.longitude,
-        "location_name": pandit.location_name
+        "latitude": updated.latitude,
+        "longitude": updated.longitude,
+        "location_name": updated.location_name
     }
 
 # Add a new service
@@ -79,14 +102,22 @@ def add_service(
 # View my services
 @router.get("/pandit/services", response_model=list[schemas.ServiceResponse])
 def view_my_services(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
     pandit=Depends(get_current_pandit)
 ):
     """View all services offered by this pandit"""
-    services = db.query(models.Service).filter(
+    # 304 if none of the services changed since the client's copy
+    etag = collection_etag(db, request, models.Service, models.Service.pandit_id == pandit.id)
+    unchanged = conditional(request, response, etag)
+    if unchanged:
+        return unchanged
+    
+    services = db.query(*services_json.columns(models.Service)).filter(
         models.Service.pandit_id == pandit.id
     ).all()
-    return services
+    return services_json.respond(services_json.rows(services), response)
 
 # Update service
 @router.put("/pandit/services/{service_id}")
@@ -154,96 +185,114 @@ def delete_service(
 
 # View bookings
 @router.get("/pandit/bookings", response_model=list[schemas.BookingResponse])
-def view_bookings(
-    db: Session = Depends(get_db),
-    pandit=Depends(get_current_pandit),
-    status: str = Query(None, description="Filter by status")
+async def view_bookings(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    pandit=Depends(get_current_pandit_async),
+    status: str = Query(None, description="Filter by status"),
+    cursor: str = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=100)
 ):
-    """View all bookings for this pandit's services"""
-    query = db.query(models.Booking).filter(models.Booking.pandit_id == pandit.id)
+    """View bookings for this pandit's services, newest first, one page at a time"""
+    criteria = [models.Booking.pandit_id == pandit.id]
     
     if status:
-        query = query.filter(models.Booking.status == status)
+        criteria.append(models.Booking.status == status)
     
-    bookings = query.order_by(models.Booking.created_at.desc()).all()
-    return bookings
+    # 304 if none of these bookings changed since the client's copy
+    etag = await collection_etag_async(db, request, models.Booking, *criteria)
+    unchanged = conditional(request, response, etag)
+    if unchanged:
+        return unchanged
+    
+    query = select(models.Booking).where(*criteria)
+    bookings, next_cursor = await keyset_paginate_async(
+        db, query, [models.Booking.created_at, models.Booking.id], limit, cursor,
+        descending=True, sort="bookings"
+    )
+    set_next_cursor(response, next_cursor)
+    return bookings_json.respond(bookings_json.rows(bookings), response)
 
 # Confirm booking
 @router.put("/pandit/bookings/{booking_id}/confirm")
 def confirm_booking(
     booking_id: str,
-    db: Session = Depends(get_db),
     pandit=Depends(get_current_pandit)
 ):
     """Confirm a pending booking"""
-    booking = db.query(models.Booking).filter(
-        models.Booking.id == booking_id,
-        models.Booking.pandit_id == pandit.id
-    ).first()
+    def confirm(db: Session):
+        booking = db.query(models.Booking).filter(
+            models.Booking.id == booking_id,
+            models.Booking.pandit_id == pandit.id
+        ).first()
     
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
     
-    if booking.status != "pending":
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Cannot confirm booking with status: {booking.status}"
-        )
+        if booking.status != "pending":
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Cannot confirm booking with status: {booking.status}"
+            )
     
-    booking.status = "confirmed"
-    db.commit()
+        booking.status = "confirmed"
+    
+    write_queue.run(confirm)
     return {"msg": "Booking confirmed successfully"}
 
 # Reject booking
 @router.put("/pandit/bookings/{booking_id}/reject")
 def reject_booking(
     booking_id: str,
-    db: Session = Depends(get_db),
     pandit=Depends(get_current_pandit)
 ):
     """Reject a pending booking"""
-    booking = db.query(models.Booking).filter(
-        models.Booking.id == booking_id,
-        models.Booking.pandit_id == pandit.id
-    ).first()
+    def reject(db: Session):
+        booking = db.query(models.Booking).filter(
+            models.Booking.id == booking_id,
+            models.Booking.pandit_id == pandit.id
+        ).first()
     
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
     
-    if booking.status != "pending":
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Cannot reject booking with status: {booking.status}"
-        )
+        if booking.status != "pending":
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Cannot reject booking with status: {booking.status}"
+            )
     
-    booking.status = "rejected"
-    db.commit()
+        booking.status = "rejected"
+    
+    write_queue.run(reject)
     return {"msg": "Booking rejected"}
 
 # Mark booking as completed
 @router.put("/pandit/bookings/{booking_id}/complete")
 def complete_booking(
     booking_id: str,
-    db: Session = Depends(get_db),
     pandit=Depends(get_current_pandit)
 ):
     """Mark a confirmed booking as completed"""
-    booking = db.query(models.Booking).filter(
-        models.Booking.id == booking_id,
-        models.Booking.pandit_id == pandit.id
-    ).first()
+    def complete(db: Session):
+        booking = db.query(models.Booking).filter(
+            models.Booking.id == booking_id,
+            models.Booking.pandit_id == pandit.id
+        ).first()
     
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
     
-    if booking.status != "confirmed":
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Can only complete confirmed bookings. Current status: {booking.status}"
-        )
+        if booking.status != "confirmed":
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Can only complete confirmed bookings. Current status: {booking.status}"
+            )
     
-    booking.status = "completed"
-    db.commit()
+        booking.status = "completed"
+    
+    write_queue.run(complete)
     return {"msg": "Booking marked as completed"}
 
 # Rate user after service
@@ -251,66 +300,67 @@ def complete_booking(
 def rate_user(
     booking_id: str,
     review: schemas.ReviewCreate,
-    db: Session = Depends(get_db),
     pandit=Depends(get_current_pandit)
 ):
     """Rate a user after service completion"""
-    # Verify booking exists and belongs to pandit
-    booking = db.query(models.Booking).filter(
-        models.Booking.id == booking_id,
-        models.Booking.pandit_id == pandit.id
-    ).first()
+    def submit_review(db: Session):
+        # Verify booking exists and belongs to pandit
+        booking = db.query(models.Booking).filter(
+            models.Booking.id == booking_id,
+            models.Booking.pandit_id == pandit.id
+        ).first()
     
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
     
-    if booking.status != "completed":
-        raise HTTPException(status_code=400, detail="Can only review completed bookings")
+        if booking.status != "completed":
+            raise HTTPException(status_code=400, detail="Can only review completed bookings")
     
-    # Check if pandit already reviewed this booking
-    existing_review = db.query(models.Review).filter(
-        models.Review.booking_id == booking_id,
-        models.Review.reviewer_id == pandit.id,
-        models.Review.reviewer_type == "pandit"
-    ).first()
+        # Check if pandit already reviewed this booking
+        existing_review = db.query(models.Review).filter(
+            models.Review.booking_id == booking_id,
+            models.Review.reviewer_id == pandit.id,
+            models.Review.reviewer_type == "pandit"
+        ).first()
     
-    if existing_review:
-        raise HTTPException(status_code=400, detail="You have already reviewed this booking")
-    
-    # Create review
-    new_review = models.Review(
-        booking_id=booking_id,
-        reviewer_id=pandit.id,
-        reviewee_id=booking.user_id,
-        reviewer_type="pandit",
-        reviewee_type="user",
-        rating=review.rating,
-        comment=review.comment
-    )
-    db.add(new_review)
+        if existing_review:
+            raise HTTPException(status_code=400, detail="You have already reviewed this booking")
     
-    # Update user's average rating
-    user = db.query(models.User).filter(models.User.id == booking.user_id).first()
-    all_reviews = db.query(models.Review).filter(
-        models.Review.reviewee_id == booking.user_id,
-        models.Review.reviewee_type == "user"
-    ).all()
+        # Create review
+        new_review = models.Review(
+            booking_id=booking_id,
+            reviewer_id=pandit.id,
+            reviewee_id=booking.user_id,
+            reviewer_type="pandit",
+            reviewee_type="user",
+            rating=review.rating,
+            comment=review.comment
+        )
+        db.add(new_review)
     
-    total_rating = sum(r.rating for r in all_reviews) + review.rating
-    user.rating_avg = total_rating / (len(all_reviews) + 1)
+        # Update user's average rating
+        record_rating(db, models.User, booking.user_id, review.rating)
     
-    db.commit()
+    write_queue.run(submit_review)
     return {"msg": "Review submitted successfully"}
 
 # View reviews received
 @router.get("/pandit/reviews", response_model=list[schemas.ReviewResponse])
-def view_my_reviews(
-    db: Session = Depends(get_db),
-    pandit=Depends(get_current_pandit)
+async def view_my_reviews(
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    pandit=Depends(get_current_pandit_async),
+    cursor: str = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=100)
 ):
-    """View all reviews received by this pandit"""
-    reviews = db.query(models.Review).filter(
+    """View reviews received by this pandit, newest first, one page at a time"""
+    query = select(models.Review).where(
         models.Review.reviewee_id == pandit.id,
         models.Review.reviewee_type == "pandit"
-    ).all()
+    )
+    reviews, next_cursor = await keyset_paginate_async(
+        db, query, [models.Review.created_at, models.Review.id], limit, cursor,
+        descending=True, sort="reviews"
+    )
+    set_next_cursor(response, next_cursor)
     return reviews
@@ -1,21 +1,31 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, func, select
 import models, schemas
-from auth import get_db, get_current_user
-from utils import calculate_distance
+from auth import get_db, get_current_user, get_current_pandit, get_read_db, get_async_read_db
+from utils import within_bounding_box
+from service_search import match_services, search_terms
+from pagination import CountCache, keyset_paginate_async
+from response_cache import SERVICES, pandit_services, cached_json, cached_json_async, render, response_cache
+from etags import collection_etag, collection_etag_async, etag_matches, make_etag, not_modified
+from serializers import Serializer
+from read_model import read_model
+from tracing import TracedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+# Cached totals for /services/search, keyed by its filters and dropped with
+# the cached search responses whenever a service changes
+search_counts = CountCache()
+response_cache.on_invalidate(SERVICES, search_counts.clear)
+
+# Services encoded straight from the rows (serializers.py)
+services_json = Serializer(schemas.ServiceResponse, "list_services")
 
 @router.post("/services")
-def create_service(service: schemas.ServiceCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    # Check if user is a pandit
-    pandit = db.query(models.PanditProfile).filter(models.PanditProfile.user_id == user.id).first()
-    if not pandit:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=403, detail="Only pandits can create services. Please complete pandit onboarding first.")
-    
-    # Create service linked to pandit
+def create_service(service: schemas.ServiceCreate, db: Session = Depends(get_db), pandit=Depends(get_current_pandit)):
+    # Create service linked to the authenticated pandit
     db_service = models.Service(
         pandit_id=pandit.id,
         **service.dict()
@@ -25,125 +35,195 @@ def create_service(service: schemas.ServiceCreate, db: Session = Depends(get_db)
     return {"msg": "Service created", "service_id": str(db_service.id), "pandit_id": str(pandit.id)}
 
 @router.get("/services", response_model=list[schemas.ServiceResponse])
-def list_services(db: Session = Depends(get_db)):
-    return db.query(models.Service).all()
+def list_services(request: Request, db: Session = Depends(get_read_db)):
+    # Served from the response cache until a service changes, and 304 if no
+    # service changed since the client's copy
+    return cached_json(
+        ("services",), [SERVICES],
+        lambda: services_json.rows(db.query(*services_json.columns(models.Service)).all()),
+        request, lambda: collection_etag(db, request, models.Service)
+    )
 
 @router.get("/services/search")
-def search_services(
-    db: Session = Depends(get_db),
+async def search_services(
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
     keyword: str = Query(None, description="Search by service name or category"),
     category: str = Query(None, description="Filter by category"),
     min_price: float = Query(None, ge=0, description="Minimum price"),
     max_price: float = Query(None, ge=0, description="Maximum price"),
-    sort_by: str = Query("price_asc", pattern="^(price_asc|price_desc|duration_asc|duration_desc|name_asc|name_desc)$"),
-    skip: int = Query(0, ge=0, description="Pagination offset"),
-    limit: int = Query(10, ge=1, le=100, description="Pagination limit")
+    sort_by: str = Query("price_asc", pattern="^(relevance|price_asc|price_desc|duration_asc|duration_desc|name_asc|name_desc)$"),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Pagination offset (prefer cursor)"),
+    limit: int = Query(10, ge=1, le=100, description="Pagination limit"),
+    include_total: bool = Query(False, description="Also return the (cached) number of matches")
 ):
     """
     Search for services with keyword matching, filtering, and sorting.
     
+    Keywords match whole words or word prefixes in the service name or
+    category ("wed" finds "Wedding").
+    
     Supported sort options:
+    - relevance: Best keyword match first (price_asc without a keyword)
     - price_asc: Price ascending (low to high)
     - price_desc: Price descending (high to low)
     - duration_asc: Duration ascending (short to long)
     - duration_desc: Duration descending (long to short)
     - name_asc: Name ascending (A to Z)
     - name_desc: Name descending (Z to A)
-    """
-    query = db.query(models.Service)
     
-    # Apply keyword filter
-    if keyword:
-        keyword_lower = keyword.lower()
-        query = query.filter(
-            or_(
-                models.Service.name.ilike(f"%{keyword_lower}%"),
-                models.Service.category.ilike(f"%{keyword_lower}%")
+    Pages are fetched with keyset pagination: pass the returned next_cursor
+    to get the following page at the same cost as the first.
+    
+    Responses are cached by their normalized parameters until a service
+    changes.
+    """
+    async def search():
+        query = select(models.Service)
+        
+        # Apply keyword and category filters through the full-text index
+        query, rank = match_services(query, keyword, category)
+        
+        # Apply price range filter
+        if min_price is not None:
+            query = query.where(models.Service.base_price >= min_price)
+        if max_price is not None:
+            query = query.where(models.Service.base_price <= max_price)
+        
+        total = None
+        if include_total:
+            total = await search_counts.get_or_compute_async(
+                (search_terms(keyword), search_terms(category), min_price, max_price),
+                lambda: db.scalar(select(func.count()).select_from(query.subquery()))
             )
+        
+        # Sort key for keyset pagination (relevance needs a keyword or category to rank by)
+        if sort_by == "relevance" and rank is not None:
+            sort_key, descending = [rank, models.Service.id], False
+        elif sort_by in ("price_asc", "relevance"):
+            sort_key, descending = [models.Service.base_price, models.Service.id], False
+        elif sort_by == "price_desc":
+            sort_key, descending = [models.Service.base_price, models.Service.id], True
+        elif sort_by == "duration_asc":
+            sort_key, descending = [models.Service.duration_minutes, models.Service.id], False
+        elif sort_by == "duration_desc":
+            sort_key, descending = [models.Service.duration_minutes, models.Service.id], True
+        elif sort_by == "name_asc":
+            sort_key, descending = [models.Service.name, models.Service.id], False
+        else:
+            sort_key, descending = [models.Service.name, models.Service.id], True
+        
+        # Apply pagination
+        if skip and not cursor:
+            query = query.offset(skip)
+        services, next_cursor = await keyset_paginate_async(
+            db, query, sort_key, limit, cursor, descending=descending, sort=sort_by
         )
-    
-    # Apply category filter
-    if category:
-        query = query.filter(models.Service.category.ilike(f"%{category}%"))
-    
-    # Apply price range filter
-    if min_price is not None:
-        query = query.filter(models.Service.base_price >= min_price)
-    if max_price is not None:
-        query = query.filter(models.Service.base_price <= max_price)
-    
-    # Apply sorting
-    if sort_by == "price_asc":
-        query = query.order_by(models.Service.base_price.asc())
-    elif sort_by == "price_desc":
-        query = query.order_by(models.Service.base_price.desc())
-    elif sort_by == "duration_asc":
-        query = query.order_by(models.Service.duration_minutes.asc())
-    elif sort_by == "duration_desc":
-        query = query.order_by(models.Service.duration_minutes.desc())
-    elif sort_by == "name_asc":
-        query = query.order_by(models.Service.name.asc())
-    elif sort_by == "name_desc":
-        query = query.order_by(models.Service.name.desc())
-    
-    # Apply pagination
-    total = query.count()
-    services = query.offset(skip).limit(limit).all()
-    
-    return {
-        "total": total,
-        "skip": skip,
-        "limit": limit,
-        "items": [schemas.ServiceResponse.from_orm(s) for s in services]
-    }
+        
+        return {
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "items": [schemas.ServiceResponse.from_orm(s) for s in services]
+        }
+    
+    key = (
+        "services/search", search_terms(keyword), search_terms(category), min_price, max_price,
+        sort_by, cursor, skip, limit, include_total
+    )
+    # Any service change may change the matches, so the ETag covers them all
+    return await cached_json_async(
+        key, [SERVICES], search,
+        request, lambda: collection_etag_async(db, request, models.Service)
+    )
 
 @router.get("/pandits/{pandit_id}/services")
 def get_pandit_services(
     pandit_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     keyword: str = Query(None, description="Search by service name"),
     sort_by: str = Query("price_asc", pattern="^(price_asc|price_desc|name_asc|name_desc)$")
 ):
     """
     Get services offered by a specific pandit with search and filtering.
+    Responses are cached until one of the pandit's services changes.
     """
-    # Get services for this specific pandit
-    query = db.query(models.Service).filter(models.Service.pandit_id == pandit_id)
-    
-    # Apply keyword filter if provided
-    if keyword:
-        keyword_lower = keyword.lower()
-        query = query.filter(
-            or_(
-                models.Service.name.ilike(f"%{keyword_lower}%"),
-                models.Service.category.ilike(f"%{keyword_lower}%")
-            )
+    def page(services):
+        if not services:
+            return {"pandit_id": pandit_id, "services": []}
+        
+        return {
+            "pandit_id": pandit_id,
+            "total": len(services),
+            "items": [schemas.ServiceResponse.from_orm(s) for s in services]
+        }
+    
+    snapshot = read_model.current()
+    if snapshot is not None:
+        # Answered from the in-memory read model (read_model.py). Its ETag is
+        # the one collection_etag gives, and the response cache is skipped: an
+        # entry rendered from a snapshot could outlive the next swap
+        etag = make_etag(
+            models.Service.__tablename__, request.url.path, str(request.query_params),
+            *snapshot.pandit_services_version(pandit_id)
         )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        services = snapshot.pandit_services(pandit_id, keyword, sort_by)
+        return Response(content=render(page(services)), media_type="application/json", headers={"ETag": etag})
+    
+    def pandit_services_page():
+        # Get services for this specific pandit
+        query = db.query(models.Service).filter(models.Service.pandit_id == pandit_id)
+        
+        # Apply keyword filter if provided (a pandit has few services, so a plain
+        # substring match is cheaper here than going through the full-text index)
+        if keyword:
+            keyword_lower = keyword.lower()
+            query = query.filter(
+                or_(
+                    models.Service.name.ilike(f"%{keyword_lower}%"),
+                    models.Service.category.ilike(f"%{keyword_lower}%")
+                )
+            )
+        
+        # Apply sorting
+        if sort_by == "price_asc":
+            query = query.order_by(models.Service.base_price.asc())
+        elif sort_by == "price_desc":
+            query = query.order_by(models.Service.base_price.desc())
+        elif sort_by == "name_asc":
+            query = query.order_by(models.Service.name.asc())
+        elif sort_by == "name_desc":
+            query = query.order_by(models.Service.name.desc())
+        
+        return page(query.all())
     
-    # Apply sorting
-    if sort_by == "price_asc":
-        query = query.order_by(models.Service.base_price.asc())
-    elif sort_by == "price_desc":
-        query = query.order_by(models.Service.base_price.desc())
-    elif sort_by == "name_asc":
-        query = query.order_by(models.Service.name.asc())
-    elif sort_by == "name_desc":
-        query = query.order_by(models.Service.name.desc())
-    
-    services = query.all()
-    
-    if not services:
-        return {"pandit_id": pandit_id, "services": []}
-    
+    key = ("pandits/services", pandit_id, keyword.lower() if keyword else None, sort_by)
+    return cached_json(
+        key, [pandit_services(pandit_id)], pandit_services_page,
+        request, lambda: collection_etag(db, request, models.Service, models.Service.pandit_id == pandit_id)
+    )
+
+def nearby_item(row) -> dict:
+    """A /services/nearby-distance item from a row of service columns, full_name and distance_km."""
     return {
-        "pandit_id": pandit_id,
-        "total": len(services),
-        "items": [schemas.ServiceResponse.from_orm(s) for s in services]
+        "id": str(row.id),
+        "pandit_id": str(row.pandit_id),
+        "name": row.name,
+        "category": row.category,
+        "base_price": row.base_price,
+        "duration_minutes": row.duration_minutes,
+        "nearest_pandit": row.full_name,
+        "distance_km": round(row.distance_km, 2)
     }
 
 @router.get("/services/nearby-distance")
 def search_services_by_distance(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user=Depends(get_current_user),
     keyword: str = Query(None, description="Search by service name or category"),
     min_price: float = Query(None, ge=0, description="Minimum price"),
@@ -154,105 +234,97 @@ def search_services_by_distance(
     limit: int = Query(10, ge=1, le=100)
 ):
     """
-    Search for services based on user location and distance to available pandits.
-    Returns services sorted by distance to nearest pandit offering that service.
+    Search for services offered by verified pandits near the user's location.
+    Each service is measured against the pandit who offers it.
     
     Requires user to have set their location.
     """
-    # Check if user has location
-    if not user.latitude or not user.longitude:
-        return {"error": "User location not set. Please update your profile with location."}
-    
-    # Get all services
-    query = db.query(models.Service)
-    
-    # Apply keyword filter
-    if keyword:
-        keyword_lower = keyword.lower()
-        query = query.filter(
-            or_(
-                models.Service.name.ilike(f"%{keyword_lower}%"),
-                models.Service.category.ilike(f"%{keyword_lower}%")
-            )
+    if user.latitude is None or user.longitude is None:
+        raise HTTPException(status_code=400, detail="Please set your location first")
+    
+    # Answered from the in-memory read model unless it is disabled (read_model.py)
+    snapshot = read_model.current()
+    if snapshot is not None:
+        rows = snapshot.services_nearby(
+            user.latitude, user.longitude, max_distance_km, keyword, min_price, max_price, sort_by
         )
+        return {
+            "total": len(rows),
+            "skip": skip,
+            "limit": limit,
+            "items": [nearby_item(row) for row in rows[skip:skip + limit]]
+        }
+    
+    # Distance is computed by the haversine_km SQL function registered in
+    # database.py, so filtering, sorting and pagination all happen in SQLite
+    distance = func.haversine_km(
+        user.latitude, user.longitude,
+        models.Pandit.latitude, models.Pandit.longitude
+    )
+    distance_km = distance.label("distance_km")
+    
+    # Services joined to the pandit offering them. The window count returns
+    # the total number of matches alongside the page
+    query = db.query(
+        models.Service.id,
+        models.Service.pandit_id,
+        models.Service.name,
+        models.Service.category,
+        models.Service.base_price,
+        models.Service.duration_minutes,
+        models.Pandit.full_name,
+        distance_km,
+        func.count().over().label("total")
+    ).join(models.Pandit, models.Service.pandit_id == models.Pandit.id).filter(
+        models.Pandit.is_verified == True,
+        within_bounding_box(
+            models.Pandit.latitude, models.Pandit.longitude,
+            user.latitude, user.longitude, max_distance_km
+        ),
+        distance <= max_distance_km
+    )
     
-    # Apply price filters
+    query, _ = match_services(query, keyword)
     if min_price is not None:
         query = query.filter(models.Service.base_price >= min_price)
     if max_price is not None:
         query = query.filter(models.Service.base_price <= max_price)
     
-    services = query.all()
-    
-    # Get all pandits with locations
-    pandits = db.query(models.PanditProfile).filter(
-        and_(
-            models.PanditProfile.latitude != None,
-            models.PanditProfile.longitude != None
-        )
-    ).all()
-    
-    # Calculate distance for each service to nearest pandit
-    services_with_distance = []
-    
-    for service in services:
-        # Find nearest pandit offering this service
-        min_distance = float('inf')
-        nearest_pandit_name = None
-        
-        for pandit in pandits:
-            distance = calculate_distance(
-                user.latitude, user.longitude,
-                pandit.latitude, pandit.longitude
-            )
-            
-            if distance < min_distance and distance <= max_distance_km:
-                min_distance = distance
-                nearest_pandit_user = db.query(models.User).filter(models.User.id == pandit.user_id).first()
-                nearest_pandit_name = nearest_pandit_user.full_name if nearest_pandit_user else "Unknown"
-        
-        # Only include if found within max distance
-        if min_distance != float('inf'):
-            services_with_distance.append({
-                "id": str(service.id),
-                "name": service.name,
-                "category": service.category,
-                "base_price": service.base_price,
-                "duration_minutes": service.duration_minutes,
-                "nearest_pandit": nearest_pandit_name,
-                "distance_km": round(min_distance, 2)
-            })
-    
-    # Apply sorting
+    # Apply sorting (id breaks ties so pages are stable)
     if sort_by == "distance_asc":
-        services_with_distance.sort(key=lambda x: x["distance_km"])
+        query = query.order_by(distance_km.asc())
     elif sort_by == "price_asc":
-        services_with_distance.sort(key=lambda x: x["base_price"])
-    elif sort_by == "price_desc":
-        services_with_distance.sort(key=lambda x: x["base_price"], reverse=True)
+        query = query.order_by(models.Service.base_price.asc())
+    else:
+        query = query.order_by(models.Service.base_price.desc())
+    query = query.order_by(models.Service.id.asc())
     
     # Apply pagination
-    total = len(services_with_distance)
-    paginated = services_with_distance[skip:skip + limit]
+    rows = query.offset(skip).limit(limit).all()
+    if rows:
+        total = rows[0].total
+    elif skip:
+        # Past the last page: the window count has no row to ride on
+        total = query.with_entities(func.count()).order_by(None).scalar()
+    else:
+        total = 0
     
     return {
         "total": total,
         "skip": skip,
         "limit": limit,
-        "items": paginated
+        "items": [nearby_item(row) for row in rows]
     }
+
 @router.put("/services/{service_id}")
-def update_service(service_id: str, service_data: schemas.ServiceCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    from fastapi import HTTPException
-    
+def update_service(service_id: str, service_data: schemas.ServiceCreate, db: Session = Depends(get_db), pandit=Depends(get_current_pandit)):
     # Get the service
     service = db.query(models.Service).filter(models.Service.id == service_id).first()
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    # Check if user is the pandit who created this service
-    pandit = db.query(models.PanditProfile).filter(models.PanditProfile.id == service.pandit_id).first()
-    if not pandit or pandit.user_id != user.id:
+    # Check if this pandit created the service
+    if service.pandit_id != pandit.id:
         raise HTTPException(status_code=403, detail="You can only edit your own services")
     
     # Update service
@@ -265,17 +337,14 @@ def update_service(service_id: str, service_data: schemas.ServiceCreate, db: Ses
     return {"msg": "Service updated", "service_id": str(service.id)}
 
 @router.delete("/services/{service_id}")
-def delete_service(service_id: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    from fastapi import HTTPException
-    
+def delete_service(service_id: str, db: Session = Depends(get_db), pandit=Depends(get_current_pandit)):
     # Get the service
     service = db.query(models.Service).filter(models.Service.id == service_id).first()
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    # Check if user is the pandit who created this service
-    pandit = db.query(models.PanditProfile).filter(models.PanditProfile.id == service.pandit_id).first()
-    if not pandit or pandit.user_id != user.id:
+    # Check if this pandit created the service
+    if service.pandit_id != pandit.id:
         raise HTTPException(status_code=403, detail="You can only delete your own services")
     
     # Delete service
@@ -284,14 +353,7 @@ def delete_service(service_id: str, db: Session = Depends(get_db), user=Depends(
     return {"msg": "Service deleted", "service_id": str(service.id)}
 
 @router.get("/my-services")
-def get_my_services(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    from fastapi import HTTPException
-    
-    # Get pandit profile for current user
-    pandit = db.query(models.PanditProfile).filter(models.PanditProfile.user_id == user.id).first()
-    if not pandit:
-        raise HTTPException(status_code=403, detail="You are not a pandit")
-    
+def get_my_services(db: Session = Depends(get_read_db), pandit=Depends(get_current_pandit)):
     # Get all services created by this pandit
     services = db.query(models.Service).filter(models.Service.pandit_id == pandit.id).all()
-    return [schemas.ServiceResponse.from_orm(s) for s in services]
\ No newline at end of file
+    return [schemas.ServiceResponse.from_orm(s) for s in services]
@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import func, select
 import models, schemas
-from auth import get_current_user, get_db
-from utils import calculate_distance, calculate_match_score
+from auth import get_current_user, get_current_user_async, get_read_db, get_async_read_db
+from utils import calculate_match_score, within_bounding_box
+from service_area import pandits_covering
+from service_search import match_services
+from ratings import record_rating
+from writes import write_queue
+from pagination import keyset_paginate_async, set_next_cursor
+from etags import row_etag, collection_etag_async, conditional
+from serializers import Serializer
+from read_model import read_model
+from tracing import TracedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 # Get user profile
 @router.get("/user/profile", response_model=schemas.UserResponse)
-def get_profile(user=Depends(get_current_user)):
+async def get_profile(request: Request, response: Response, user=Depends(get_current_user_async)):
+    # 304 if the client's copy is still current
+    unchanged = conditional(request, response, row_etag(user))
+    if unchanged:
+        return unchanged
     return user
 
 # Update user location
@@ -18,27 +32,29 @@ def update_location(
     latitude: float = Query(...),
     longitude: float = Query(...),
     location_name: str = Query(None),
-    db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
     """Update user's location"""
-    user.latitude = latitude
-    user.longitude = longitude
-    if location_name:
-        user.location_name = location_name
+    def update(db: Session):
+        row = db.get(models.User, user.id)
+        row.latitude = latitude
+        row.longitude = longitude
+        if location_name:
+            row.location_name = location_name
+        return row
     
-    db.commit()
+    updated = write_queue.run(update)
     return {
         "msg": "Location updated successfully",
-        "latitude": user.latitude,
-        "longitude": user.longitude,
-        "location_name": user.location_name
+        "latitude": updated.latitude,
+        "longitude": updated.longitude,
+        "location_name": updated.location_name
     }
 
 # View all services
 @router.get("/user/services", response_model=list[schemas.ServiceResponse])
 def view_services(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user=Depends(get_current_user),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100)
@@ -50,35 +66,29 @@ def view_services(
 # Search services
 @router.get("/user/services/search")
 def search_services(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user=Depends(get_current_user),
     keyword: str = Query(None, description="Search by service name or category"),
     category: str = Query(None, description="Filter by category"),
     min_price: float = Query(None, ge=0),
     max_price: float = Query(None, ge=0),
-    sort_by: str = Query("price_asc", pattern="^(price_asc|price_desc|name_asc|name_desc)$")
+    sort_by: str = Query("price_asc", pattern="^(relevance|price_asc|price_desc|name_asc|name_desc)$")
 ):
     """Search for services with filters"""
     query = db.query(models.Service)
     
-    if keyword:
-        query = query.filter(
-            or_(
-                models.Service.name.ilike(f"%{keyword}%"),
-                models.Service.category.ilike(f"%{keyword}%")
-            )
-        )
-    
-    if category:
-        query = query.filter(models.Service.category.ilike(f"%{category}%"))
+    # Keyword and category are matched through the full-text index
+    query, rank = match_services(query, keyword, category)
     
     if min_price is not None:
         query = query.filter(models.Service.base_price >= min_price)
     if max_price is not None:
         query = query.filter(models.Service.base_price <= max_price)
     
-    # Apply sorting
-    if sort_by == "price_asc":
+    # Apply sorting (relevance needs a keyword or category to rank by)
+    if sort_by == "relevance" and rank is not None:
+        query = query.order_by(rank.asc())
+    elif sort_by in ("price_asc", "relevance"):
         query = query.order_by(models.Service.base_price.asc())
     elif sort_by == "price_desc":
         query = query.order_by(models.Service.base_price.desc())
@@ -93,155 +103,226 @@ def search_services(
         "items": [schemas.ServiceResponse.from_orm(s) for s in services]
     }
 
+# Pandit search results are encoded straight from the row tuples (serializers.py)
+search_pandits_json = Serializer(
+    schemas.PanditWithDistance, "search_pandits", computed=("distance_km", "match_score")
+)
+available_pandits_json = Serializer(
+    schemas.PanditWithDistance, "available_pandits", computed=("distance_km", "match_score")
+)
+bookings_json = Serializer(schemas.BookingResponse, "view_my_bookings")
+
 # Search pandits
 @router.get("/user/pandits/search", response_model=list[schemas.PanditWithDistance])
-def search_pandits(
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+async def search_pandits(
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_user_async),
     max_distance_km: float = Query(50, description="Maximum distance in kilometers"),
     min_rating: float = Query(0, ge=0, le=5),
     max_price: float = Query(None),
-    sort_by: str = Query("match_score", pattern="^(distance|price|rating|match_score)$")
+    sort_by: str = Query("match_score", pattern="^(distance|price|rating|match_score)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1, le=100, description="Page size (default: all matches)")
 ):
     """Find nearby pandits with filters"""
-    if not user.latitude or not user.longitude:
+    if user.latitude is None or user.longitude is None:
         raise HTTPException(status_code=400, detail="Please set your location first")
     
-    # Only show verified pandits to users
-    pandits = db.query(models.Pandit).filter(models.Pandit.is_verified == True).all()
-    matches = []
-    
-    for pandit in pandits:
-        if not pandit.latitude or not pandit.longitude:
-            continue
-        
-        distance = calculate_distance(
-            user.latitude, user.longitude,
-            pandit.latitude, pandit.longitude
-        )
-        
-        if distance > max_distance_km:
-            continue
-        if pandit.rating_avg < min_rating:
-            continue
-        if max_price and pandit.price_per_service > max_price:
-            continue
-        
-        match_score = calculate_match_score(
-            distance_km=distance,
-            price=pandit.price_per_service,
-            rating=pandit.rating_avg
-        )
-        
-        pandit_with_distance = schemas.PanditWithDistance(
-            id=pandit.id,
-            full_name=pandit.full_name,
-            phone=pandit.phone,
-            email=pandit.email,
-            experience_years=pandit.experience_years,
-            bio=pandit.bio,
-            region=pandit.region,
-            languages=pandit.languages,
-            latitude=pandit.latitude,
-            longitude=pandit.longitude,
-            location_name=pandit.location_name,
-            price_per_service=pandit.price_per_service,
-            rating_avg=pandit.rating_avg,
-            is_verified=pandit.is_verified,
-            distance_km=round(distance, 2),
-            match_score=match_score
+    # Answered from the in-memory read model unless it is disabled (read_model.py)
+    snapshot = read_model.current()
+    if snapshot is not None:
+        matches = snapshot.search_pandits(
+            user.latitude, user.longitude, max_distance_km, min_rating, max_price, sort_by, skip, limit
         )
-        matches.append(pandit_with_distance)
+        return search_pandits_json.respond([
+            search_pandits_json.row(pandit, distance_km=round(distance, 2), match_score=score)
+            for pandit, distance, score in matches
+        ])
     
-    # Sort results
+    # Distance and match score are computed by the SQL functions registered in
+    # database.py, so filtering, sorting and pagination all happen in SQLite
+    distance = func.haversine_km(
+        user.latitude, user.longitude,
+        models.Pandit.latitude, models.Pandit.longitude
+    )
+    distance_km = distance.label("distance_km")
+    match_score = func.match_score(
+        distance, models.Pandit.price_per_service, models.Pandit.rating_avg
+    ).label("match_score")
+    
+    # Only show verified pandits to users. The bounding box of the search
+    # circle and the rating/price filters use the composite indexes, so only
+    # rows inside them reach the distance function
+    query = select(*search_pandits_json.columns(models.Pandit), distance_km, match_score).where(
+        models.Pandit.is_verified == True,
+        within_bounding_box(
+            models.Pandit.latitude, models.Pandit.longitude,
+            user.latitude, user.longitude, max_distance_km
+        ),
+        distance <= max_distance_km
+    )
+    if min_rating:
+        query = query.where(models.Pandit.rating_avg >= min_rating)
+    if max_price:
+        query = query.where(models.Pandit.price_per_service <= max_price)
+    
+    # Sort results (id breaks ties so pages are stable)
     if sort_by == "distance":
-        matches.sort(key=lambda x: x.distance_km)
+        query = query.order_by(distance_km.asc())
     elif sort_by == "price":
-        matches.sort(key=lambda x: x.price_per_service)
+        query = query.order_by(models.Pandit.price_per_service.asc())
     elif sort_by == "rating":
-        matches.sort(key=lambda x: x.rating_avg, reverse=True)
+        query = query.order_by(models.Pandit.rating_avg.desc())
     else:
-        matches.sort(key=lambda x: x.match_score, reverse=True)
+        query = query.order_by(match_score.desc())
+    query = query.order_by(models.Pandit.id.asc())
+    
+    result = await db.execute(query.offset(skip).limit(limit))
+    return search_pandits_json.respond([
+        search_pandits_json.row(row, distance_km=round(row.distance_km, 2), match_score=row.match_score)
+        for row in result.all()
+    ])
+
+# Pandits who can come to an address
+@router.get("/user/pandits/available", response_model=list[schemas.PanditWithDistance])
+def available_pandits(
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_user),
+    latitude: float = Query(None, description="Service address latitude (default: your location)"),
+    longitude: float = Query(None, description="Service address longitude (default: your location)"),
+    booking_id: str = Query(None, description="Use the service address of one of your bookings"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1, le=100, description="Page size (default: all matches)")
+):
+    """Find verified pandits whose service area covers an address, nearest first"""
+    if booking_id:
+        booking = db.query(models.Booking).filter(
+            models.Booking.id == booking_id,
+            models.Booking.user_id == user.id
+        ).first()
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        if booking.service_latitude is None or booking.service_longitude is None:
+            raise HTTPException(status_code=400, detail="Booking has no service coordinates")
+        latitude, longitude = booking.service_latitude, booking.service_longitude
+    elif latitude is None or longitude is None:
+        latitude, longitude = user.latitude, user.longitude
+    if latitude is None or longitude is None:
+        raise HTTPException(status_code=400, detail="Please set your location first")
     
-    return matches
+    snapshot = read_model.current()
+    if snapshot is not None:
+        # Same radius check over the in-memory read model (read_model.py)
+        matches = snapshot.pandits_covering(latitude, longitude, skip, limit)
+    else:
+        # R*Tree lookup on the coverage boxes, then an exact radius check
+        columns = available_pandits_json.columns(models.Pandit)
+        rows = pandits_covering(db, latitude, longitude, columns).offset(skip).limit(limit).all()
+        matches = [(row, row.distance_km) for row in rows]
+    return available_pandits_json.respond([
+        available_pandits_json.row(
+            pandit, distance_km=round(distance, 2),
+            match_score=calculate_match_score(distance, pandit.price_per_service, pandit.rating_avg)
+        )
+        for pandit, distance in matches
+    ])
 
 # Create booking
 @router.post("/user/bookings")
 def create_booking(
     booking: schemas.BookingCreate,
-    db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
     """Create a new booking"""
-    # Check if pandit is verified
-    pandit = db.query(models.Pandit).filter(models.Pandit.id == booking.pandit_id).first()
-    if not pandit:
-        raise HTTPException(status_code=404, detail="Pandit not found")
+    # Validation and insert run together in the serialized write pipeline (writes.py)
+    def insert(db: Session):
+        # Check if pandit is verified
+        pandit = db.query(models.Pandit).filter(models.Pandit.id == booking.pandit_id).first()
+        if not pandit:
+            raise HTTPException(status_code=404, detail="Pandit not found")
     
-    if not pandit.is_verified:
-        raise HTTPException(status_code=403, detail="This pandit is not verified yet. Only verified pandits can accept bookings.")
+        if not pandit.is_verified:
+            raise HTTPException(status_code=403, detail="This pandit is not verified yet. Only verified pandits can accept bookings.")
     
-    service = db.query(models.Service).filter(models.Service.id == booking.service_id).first()
-    if not service:
-        raise HTTPException(status_code=404, detail="Service not found")
+        service = db.query(models.Service).filter(models.Service.id == booking.service_id).first()
+        if not service:
+            raise HTTPException(status_code=404, detail="Service not found")
     
-    if service.pandit_id != booking.pandit_id:
-        raise HTTPException(status_code=400, detail="Service not offered by this pandit")
+        if service.pandit_id != booking.pandit_id:
+            raise HTTPException(status_code=400, detail="Service not offered by this pandit")
     
-    new_booking = models.Booking(
-        user_id=user.id,
-        pandit_id=booking.pandit_id,
-        service_id=booking.service_id,
-        booking_date=booking.booking_date,
-        service_address=booking.service_address,
-        service_latitude=booking.service_latitude,
-        service_longitude=booking.service_longitude,
-        service_location_name=booking.service_location_name,
-        total_amount=service.base_price,
-        status="pending"
-    )
-    db.add(new_booking)
-    db.commit()
-    db.refresh(new_booking)
-    return {"msg": "Booking created successfully", "booking_id": str(new_booking.id)}
+        new_booking = models.Booking(
+            user_id=user.id,
+            pandit_id=booking.pandit_id,
+            service_id=booking.service_id,
+            booking_date=booking.booking_date,
+            service_address=booking.service_address,
+            service_latitude=booking.service_latitude,
+            service_longitude=booking.service_longitude,
+            service_location_name=booking.service_location_name,
+            total_amount=service.base_price,
+            status="pending"
+        )
+        db.add(new_booking)
+        db.flush()
+        return str(new_booking.id)
+    
+    booking_id = write_queue.run(insert)
+    return {"msg": "Booking created successfully", "booking_id": booking_id}
 
 # View my bookings
 @router.get("/user/bookings", response_model=list[schemas.BookingResponse])
-def view_my_bookings(
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
-    status: str = Query(None, description="Filter by status")
+async def view_my_bookings(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_user_async),
+    status: str = Query(None, description="Filter by status"),
+    cursor: str = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=100)
 ):
-    """View all bookings made by the user"""
-    query = db.query(models.Booking).filter(models.Booking.user_id == user.id)
+    """View bookings made by the user, newest first, one page at a time"""
+    criteria = [models.Booking.user_id == user.id]
     
     if status:
-        query = query.filter(models.Booking.status == status)
+        criteria.append(models.Booking.status == status)
+    
+    # 304 if none of these bookings changed since the client's copy
+    etag = await collection_etag_async(db, request, models.Booking, *criteria)
+    unchanged = conditional(request, response, etag)
+    if unchanged:
+        return unchanged
     
-    bookings = query.order_by(models.Booking.created_at.desc()).all()
-    return bookings
+    query = select(models.Booking).where(*criteria)
+    bookings, next_cursor = await keyset_paginate_async(
+        db, query, [models.Booking.created_at, models.Booking.id], limit, cursor,
+        descending=True, sort="bookings"
+    )
+    set_next_cursor(response, next_cursor)
+    return bookings_json.respond(bookings_json.rows(bookings), response)
 
 # Cancel booking
 @router.put("/user/bookings/{booking_id}/cancel")
 def cancel_booking(
     booking_id: str,
-    db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
     """Cancel a booking (only if pending or confirmed)"""
-    booking = db.query(models.Booking).filter(
-        models.Booking.id == booking_id,
-        models.Booking.user_id == user.id
-    ).first()
+    def cancel(db: Session):
+        booking = db.query(models.Booking).filter(
+            models.Booking.id == booking_id,
+            models.Booking.user_id == user.id
+        ).first()
+    
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
     
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
+        if booking.status not in ["pending", "confirmed"]:
+            raise HTTPException(status_code=400, detail=f"Cannot cancel booking with status: {booking.status}")
     
-    if booking.status not in ["pending", "confirmed"]:
-        raise HTTPException(status_code=400, detail=f"Cannot cancel booking with status: {booking.status}")
+        booking.status = "cancelled"
     
-    booking.status = "cancelled"
-    db.commit()
+    write_queue.run(cancel)
     return {"msg": "Booking cancelled successfully"}
 
 # Rate pandit after service
@@ -249,53 +330,46 @@ def cancel_booking(
 def rate_pandit(
     booking_id: str,
     review: schemas.ReviewCreate,
-    db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
     """Rate a pandit after service completion"""
-    # Verify booking exists and belongs to user
-    booking = db.query(models.Booking).filter(
-        models.Booking.id == booking_id,
-        models.Booking.user_id == user.id
-    ).first()
+    def submit_review(db: Session):
+        # Verify booking exists and belongs to user
+        booking = db.query(models.Booking).filter(
+            models.Booking.id == booking_id,
+            models.Booking.user_id == user.id
+        ).first()
     
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
     
-    if booking.status != "completed":
-        raise HTTPException(status_code=400, detail="Can only review completed bookings")
+        if booking.status != "completed":
+            raise HTTPException(status_code=400, detail="Can only review completed bookings")
     
-    # Check if user already reviewed this booking
-    existing_review = db.query(models.Review).filter(
-        models.Review.booking_id == booking_id,
-        models.Review.reviewer_id == user.id,
-        models.Review.reviewer_type == "user"
-    ).first()
+        # Check if user already reviewed this booking
+        existing_review = db.query(models.Review).filter(
+            models.Review.booking_id == booking_id,
+            models.Review.reviewer_id == user.id,
+            models.Review.reviewer_type == "user"
+        ).first()
     
-    if existing_review:
-        raise HTTPException(status_code=400, detail="You have already reviewed this booking")
+        if existing_review:
+            raise HTTPException(status_code=400, detail="You have already reviewed this booking")
     
-    # Create review
-    new_review = models.Review(
-        booking_id=booking_id,
-        reviewer_id=user.id,
-        reviewee_id=booking.pandit_id,
-        reviewer_type="user",
-        reviewee_type="pandit",
-        rating=review.rating,
-        comment=review.comment
-    )
-    db.add(new_review)
-    
-    # Update pandit's average rating
-    pandit = db.query(models.Pandit).filter(models.Pandit.id == booking.pandit_id).first()
-    all_reviews = db.query(models.Review).filter(
-        models.Review.reviewee_id == booking.pandit_id,
-        models.Review.reviewee_type == "pandit"
-    ).all()
+        # Create review
+        new_review = models.Review(
+            booking_id=booking_id,
+            reviewer_id=user.id,
+            reviewee_id=booking.pandit_id,
+            reviewer_type="user",
+            reviewee_type="pandit",
+            rating=review.rating,
+            comment=review.comment
+        )
+        db.add(new_review)
     
-    total_rating = sum(r.rating for r in all_reviews) + review.rating
-    pandit.rating_avg = total_rating / (len(all_reviews) + 1)
+        # Update pandit's average rating
+        record_rating(db, models.Pandit, booking.pandit_id, review.rating)
     
-    db.commit()
+    write_queue.run(submit_review)
     return {"msg": "Review submitted successfully"}
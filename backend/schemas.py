@@ -25,6 +25,7 @@ class UserResponse(BaseModel):
     longitude: Optional[float]
     location_name: Optional[str]
     rating_avg: float
+    rating_count: Optional[int] = 0
 
     class Config:
         from_attributes = True
@@ -61,6 +62,7 @@ class PanditCreate(BaseModel):
     longitude: Optional[float] = None
     location_name: Optional[str] = None
     price_per_service: Optional[float] = Field(default=0, gt=0, description="Price per service (must be > 0)")
+    service_radius_km: Optional[float] = Field(default=None, gt=0, description="How far the pandit travels (km)")
 
 class PanditLogin(BaseModel):
     phone: str
@@ -79,7 +81,9 @@ class PanditResponse(BaseModel):
     longitude: Optional[float]
     location_name: Optional[str]
     price_per_service: float
+    service_radius_km: Optional[float] = None
     rating_avg: float
+    rating_count: Optional[int] = 0
     is_verified: bool
 
     class Config:
@@ -98,7 +102,9 @@ class PanditWithDistance(BaseModel):
     longitude: Optional[float]
     location_name: Optional[str]
     price_per_service: float
+    service_radius_km: Optional[float] = None
     rating_avg: float
+    rating_count: Optional[int] = 0
     is_verified: bool
     distance_km: float
     match_score: float
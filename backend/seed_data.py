@@ -0,0 +1,291 @@
+"""
+Deterministic synthetic dataset for benchmarks.
+
+Seeds users and pandits clustered around Indian cities, services drawn from a
+catalog of common pujas, bookings in every status and reviews of completed
+bookings. The same --seed always produces the same rows (ids and timestamps
+included, only the salted password hash differs), so benchmark runs against
+the same dataset can be compared.
+
+Rows are bulk inserted, then the coverage index, rating aggregates and
+statistics counters are rebuilt from them. Every account's password is
+DEFAULT_PASSWORD. Point DATABASE_URL at a scratch database:
+
+    DATABASE_URL=sqlite:///./bench.db python seed_data.py --users 5000 --pandits 1000 --bookings 20000
+"""
+
+import argparse
+import math
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, text
+from database import engine, upgrade_schema
+from service_area import create_coverage_index, rebuild_coverage
+from service_search import create_service_search_index
+from ratings import backfill_ratings
+from stats import create_stats_counters, reconcile_stats
+from utils import hash_password
+import models
+
+DEFAULT_PASSWORD = "password123"
+
+# (city, latitude, longitude, share of people living there)
+CITIES = [
+    ("Delhi", 28.6139, 77.2090, 0.22),
+    ("Mumbai", 19.0760, 72.8777, 0.18),
+    ("Bengaluru", 12.9716, 77.5946, 0.12),
+    ("Kolkata", 22.5726, 88.3639, 0.10),
+    ("Chennai", 13.0827, 80.2707, 0.08),
+    ("Hyderabad", 17.3850, 78.4867, 0.08),
+    ("Pune", 18.5204, 73.8567, 0.07),
+    ("Varanasi", 25.3176, 82.9739, 0.06),
+    ("Jaipur", 26.9124, 75.7873, 0.05),
+    ("Lucknow", 26.8467, 80.9462, 0.04),
+]
+# Standard deviation of the distance from the city centre
+CITY_SPREAD_KM = 12
+
+# (name, category, typical price, duration in minutes)
+SERVICE_CATALOG = [
+    ("Griha Pravesh Puja", "Housewarming", 2100, 120),
+    ("Satyanarayan Katha", "Katha", 1100, 90),
+    ("Vivah Sanskar", "Wedding", 11000, 300),
+    ("Mundan Sanskar", "Sanskar", 1500, 60),
+    ("Namkaran Sanskar", "Sanskar", 1100, 60),
+    ("Rudrabhishek", "Puja", 2500, 120),
+    ("Maha Mrityunjaya Jaap", "Jaap", 5100, 240),
+    ("Navagraha Shanti", "Puja", 3100, 150),
+    ("Lakshmi Puja", "Festival", 1500, 90),
+    ("Shraddh Karma", "Rituals", 2100, 120),
+]
+LANGUAGES = [
+    "Hindi", "Hindi, Sanskrit", "Hindi, English", "Marathi, Hindi", "Tamil, Sanskrit",
+    "Bengali, Hindi", "Kannada, Sanskrit", "Telugu, Sanskrit",
+]
+BOOKING_STATUS_WEIGHTS = {"completed": 45, "pending": 20, "confirmed": 15, "cancelled": 10, "rejected": 10}
+RATING_WEIGHTS = [2, 3, 10, 35, 50]  # 1 to 5 stars
+
+# Timestamps are spread over the year before this date
+EPOCH = datetime(2025, 1, 1)
+BATCH_SIZE = 1000
+
+
+class Generator:
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.cities = [city[:3] for city in CITIES]
+        self.city_weights = [city[3] for city in CITIES]
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self, after: datetime = None) -> datetime:
+        if after is None:
+            return EPOCH - timedelta(seconds=self.rng.randrange(365 * 24 * 3600))
+        return after + timedelta(seconds=self.rng.randrange(1, 30 * 24 * 3600))
+
+    def location(self):
+        """(city, latitude, longitude) of a random point around a weighted city."""
+        city, latitude, longitude = self.rng.choices(self.cities, self.city_weights)[0]
+        distance = abs(self.rng.gauss(0, CITY_SPREAD_KM))
+        bearing = self.rng.uniform(0, 2 * math.pi)
+        latitude += distance * math.cos(bearing) / 111.32
+        longitude += distance * math.sin(bearing) / (111.32 * math.cos(math.radians(latitude)))
+        return city, round(latitude, 6), round(longitude, 6)
+
+    def users(self, count: int, hashed_password: str):
+        for i in range(count):
+            city, latitude, longitude = self.location()
+            created = self.timestamp()
+            yield {
+                "id": self.uuid(),
+                "full_name": f"User {i}",
+                "phone": f"9{i:09d}",
+                "email": f"user{i}@example.com",
+                "hashed_password": hashed_password,
+                "latitude": latitude,
+                "longitude": longitude,
+                "location_name": city,
+                "created_at": created,
+                "updated_at": created,
+            }
+
+    def pandits(self, count: int, hashed_password: str):
+        for i in range(count):
+            city, latitude, longitude = self.location()
+            created = self.timestamp()
+            yield {
+                "id": self.uuid(),
+                "full_name": f"Pandit {i}",
+                "phone": f"8{i:09d}",
+                "email": f"pandit{i}@example.com",
+                "hashed_password": hashed_password,
+                "experience_years": self.rng.randint(1, 40),
+                "bio": f"Performs pujas and sanskars in and around {city}",
+                "region": city,
+                "languages": self.rng.choice(LANGUAGES),
+                "latitude": latitude,
+                "longitude": longitude,
+                "location_name": city,
+                "price_per_service": float(self.rng.choice([501, 1100, 1500, 2100, 3100, 5100])),
+                "service_radius_km": float(self.rng.choice([10, 15, 25, 25, 40])),
+                "is_verified": self.rng.random() < 0.85,
+                "created_at": created,
+                "updated_at": created,
+            }
+
+    def services(self, pandits, per_pandit: int):
+        for pandit in pandits:
+            count = min(len(SERVICE_CATALOG), self.rng.randint(1, 2 * per_pandit - 1))
+            offered = self.rng.sample(SERVICE_CATALOG, count)
+            for name, category, price, duration in offered:
+                created = self.timestamp(pandit["created_at"])
+                yield {
+                    "id": self.uuid(),
+                    "pandit_id": pandit["id"],
+                    "name": name,
+                    "category": category,
+                    "base_price": float(round(price * self.rng.uniform(0.8, 1.5))),
+                    "duration_minutes": duration,
+                    "created_at": created,
+                    "updated_at": created,
+                }
+
+    def bookings(self, count: int, users, services_by_city):
+        statuses = list(BOOKING_STATUS_WEIGHTS)
+        weights = list(BOOKING_STATUS_WEIGHTS.values())
+        for _ in range(count):
+            user = self.rng.choice(users)
+            # Users book pandits from their own city
+            service, pandit = self.rng.choice(services_by_city[user["location_name"]])
+            created = self.timestamp(max(user["created_at"], service["created_at"]))
+            address = f"{self.rng.randint(1, 999)}, Sector {self.rng.randint(1, 80)}, {user['location_name']}"
+            yield {
+                "id": self.uuid(),
+                "user_id": user["id"],
+                "pandit_id": pandit["id"],
+                "service_id": service["id"],
+                "booking_date": (created + timedelta(days=self.rng.randint(1, 60))).strftime("%Y-%m-%d"),
+                "service_address": address,
+                "service_latitude": user["latitude"],
+                "service_longitude": user["longitude"],
+                "service_location_name": "Home",
+                "status": self.rng.choices(statuses, weights)[0],
+                "total_amount": service["base_price"],
+                "created_at": created,
+                "updated_at": self.timestamp(created),
+            }
+
+    def reviews(self, bookings, user_review_rate: float, pandit_review_rate: float):
+        for booking in bookings:
+            if booking["status"] != "completed":
+                continue
+            reviewers = []
+            if self.rng.random() < user_review_rate:
+                reviewers.append(("user", booking["user_id"], "pandit", booking["pandit_id"]))
+            if self.rng.random() < pandit_review_rate:
+                reviewers.append(("pandit", booking["pandit_id"], "user", booking["user_id"]))
+            for reviewer_type, reviewer_id, reviewee_type, reviewee_id in reviewers:
+                yield {
+                    "id": self.uuid(),
+                    "booking_id": booking["id"],
+                    "reviewer_id": reviewer_id,
+                    "reviewee_id": reviewee_id,
+                    "reviewer_type": reviewer_type,
+                    "reviewee_type": reviewee_type,
+                    "rating": self.rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+                    "comment": "Generated review",
+                    "created_at": self.timestamp(booking["updated_at"]),
+                }
+
+
+def insert_rows(connection, model, rows) -> int:
+    """Insert rows in batches and return how many there were."""
+    rows = list(rows)
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(insert(model), rows[start:start + BATCH_SIZE])
+    return len(rows)
+
+
+def reset(connection):
+    """Delete every user, pandit, service, booking and review (admins are kept)."""
+    for model in (models.Review, models.Booking, models.Service, models.Pandit, models.User):
+        connection.execute(model.__table__.delete())
+
+
+def seed(connection, users: int, pandits: int, services_per_pandit: int, bookings: int,
+         user_review_rate: float = 0.6, pandit_review_rate: float = 0.3, seed: int = 0) -> dict:
+    """Generate and insert the dataset, returning the number of rows of each kind."""
+    generator = Generator(seed)
+    # One bcrypt hash shared by every account, or seeding would take minutes
+    hashed_password = hash_password(DEFAULT_PASSWORD)
+
+    user_rows = list(generator.users(users, hashed_password))
+    pandit_rows = list(generator.pandits(pandits, hashed_password))
+    service_rows = list(generator.services(pandit_rows, services_per_pandit))
+
+    # Bookable services (verified pandits) by city
+    pandits_by_id = {pandit["id"]: pandit for pandit in pandit_rows}
+    services_by_city = {}
+    for service in service_rows:
+        pandit = pandits_by_id[service["pandit_id"]]
+        if pandit["is_verified"]:
+            services_by_city.setdefault(pandit["region"], []).append((service, pandit))
+    bookable = [entry for entries in services_by_city.values() for entry in entries]
+    for city, *_ in CITIES:
+        # A city without verified pandits borrows from everywhere
+        services_by_city.setdefault(city, bookable)
+    booking_rows = list(generator.bookings(bookings, user_rows, services_by_city)) if bookable else []
+    review_rows = list(generator.reviews(booking_rows, user_review_rate, pandit_review_rate))
+
+    counts = {
+        "users": insert_rows(connection, models.User, user_rows),
+        "pandits": insert_rows(connection, models.Pandit, pandit_rows),
+        "services": insert_rows(connection, models.Service, service_rows),
+        "bookings": insert_rows(connection, models.Booking, booking_rows),
+        "reviews": insert_rows(connection, models.Review, review_rows),
+    }
+    # Bulk inserts skip the ORM events that maintain these
+    rebuild_coverage(connection)
+    backfill_ratings(connection)
+    reconcile_stats(connection)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a synthetic dataset for benchmarks")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--pandits", type=int, default=500)
+    parser.add_argument("--services-per-pandit", type=int, default=3,
+                        help="Average number of services per pandit")
+    parser.add_argument("--bookings", type=int, default=10000)
+    parser.add_argument("--user-review-rate", type=float, default=0.6,
+                        help="Share of completed bookings rated by the user")
+    parser.add_argument("--pandit-review-rate", type=float, default=0.3,
+                        help="Share of completed bookings rated by the pandit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true",
+                        help="Delete existing users, pandits and their data first")
+    args = parser.parse_args()
+
+    upgrade_schema()
+    create_coverage_index(engine)
+    create_service_search_index(engine)
+    create_stats_counters(engine)
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        if args.reset:
+            reset(connection)
+        elif connection.execute(select(func.count()).select_from(models.User)).scalar():
+            parser.error("the database already has users; use --reset or an empty DATABASE_URL")
+        counts = seed(
+            connection, args.users, args.pandits, args.services_per_pandit, args.bookings,
+            args.user_review_rate, args.pandit_review_rate, args.seed
+        )
+        connection.execute(text("ANALYZE"))
+    for name, count in counts.items():
+        print(f"{name}: {count}")
+    print(f"Seeded in {time.perf_counter() - started:.1f}s (password: {DEFAULT_PASSWORD})")
@@ -0,0 +1,157 @@
+"""
+Service-area coverage index for pandits.
+
+A verified pandit with a location serves the circle of service_radius_km around
+it. The bounding box of that circle is kept in the pandit_coverage SQLite R*Tree,
+keyed by pandits.index_key, so finding the pandits who can come to an address
+is an R*Tree point lookup followed by an exact distance check on the hits.
+"""
+
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.sql import column, table
+from config import DEFAULT_SERVICE_RADIUS_KM
+from database import assign_index_keys
+import models
+from utils import bounding_box
+
+pandit_coverage = table(
+    "pandit_coverage",
+    column("id"),
+    column("min_lat"),
+    column("max_lat"),
+    column("min_lon"),
+    column("max_lon"),
+)
+
+# Pandit columns that change the coverage box
+COVERAGE_FIELDS = ("latitude", "longitude", "service_radius_km", "is_verified")
+
+# Gives each new pandit the next index_key
+INDEX_KEY_TRIGGER = """CREATE TRIGGER IF NOT EXISTS pandits_index_key AFTER INSERT ON pandits
+    WHEN new.index_key IS NULL BEGIN
+    UPDATE pandits SET index_key = (SELECT coalesce(max(index_key), 0) + 1 FROM pandits)
+    WHERE rowid = new.rowid;
+END"""
+
+
+def coverage_box(latitude: float, longitude: float, radius_km: float):
+    """R*Tree box (min_lat, max_lat, min_lon, max_lon) around a service circle."""
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+    if len(lon_ranges) > 1:
+        # One box per pandit, so a circle crossing the antimeridian spans all longitudes
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lon_ranges[0][0], lon_ranges[0][1]
+
+
+def _coverage_row(index_key, is_verified, latitude, longitude, radius_km):
+    """Coverage entry for a pandit, or None if they can't be booked by location."""
+    if not is_verified or latitude is None or longitude is None:
+        return None
+    min_lat, max_lat, min_lon, max_lon = coverage_box(
+        latitude, longitude, DEFAULT_SERVICE_RADIUS_KM if radius_km is None else radius_km
+    )
+    return {
+        "id": index_key,
+        "min_lat": min_lat,
+        "max_lat": max_lat,
+        "min_lon": min_lon,
+        "max_lon": max_lon,
+    }
+
+
+def rebuild_coverage(connection):
+    """Recompute every coverage box from the pandits table."""
+    connection.execute(text("DELETE FROM pandit_coverage"))
+    pandits = connection.execute(text(
+        "SELECT index_key, is_verified, latitude, longitude, service_radius_km FROM pandits"
+    )).all()
+    rows = [row for row in (_coverage_row(*p) for p in pandits) if row is not None]
+    if rows:
+        connection.execute(text(
+            "INSERT INTO pandit_coverage (id, min_lat, max_lat, min_lon, max_lon) "
+            "VALUES (:id, :min_lat, :max_lat, :min_lon, :max_lon)"
+        ), rows)
+
+
+def create_coverage_index(engine):
+    """
+    Create the pandit_coverage R*Tree and the index_key trigger, filling the
+    R*Tree when it is created or when existing pandits had to be given keys.
+    """
+    with engine.begin() as connection:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pandit_coverage'"
+        )).first()
+        connection.execute(text(INDEX_KEY_TRIGGER))
+        numbered = assign_index_keys(connection, "pandits")
+        if not exists:
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE pandit_coverage USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+            ))
+        if numbered or not exists:
+            rebuild_coverage(connection)
+
+
+def sync_coverage(connection, pandit):
+    """Replace a pandit's coverage box inside the current transaction."""
+    index_key = connection.execute(
+        text("SELECT index_key FROM pandits WHERE id = :id"), {"id": pandit.id}
+    ).scalar()
+    if index_key is None:
+        return
+    connection.execute(text("DELETE FROM pandit_coverage WHERE id = :id"), {"id": index_key})
+    row = _coverage_row(
+        index_key, pandit.is_verified, pandit.latitude, pandit.longitude, pandit.service_radius_km
+    )
+    if row is not None:
+        connection.execute(text(
+            "INSERT INTO pandit_coverage (id, min_lat, max_lat, min_lon, max_lon) "
+            "VALUES (:id, :min_lat, :max_lat, :min_lon, :max_lon)"
+        ), row)
+
+
+@event.listens_for(models.Pandit, "after_insert")
+def _pandit_inserted(mapper, connection, pandit):
+    sync_coverage(connection, pandit)
+
+
+@event.listens_for(models.Pandit, "after_update")
+def _pandit_updated(mapper, connection, pandit):
+    state = inspect(pandit)
+    if any(state.attrs[field].history.has_changes() for field in COVERAGE_FIELDS):
+        sync_coverage(connection, pandit)
+
+
+@event.listens_for(models.Pandit, "before_delete")
+def _pandit_deleted(mapper, connection, pandit):
+    connection.execute(
+        text("DELETE FROM pandit_coverage WHERE id = (SELECT index_key FROM pandits WHERE id = :id)"),
+        {"id": pandit.id}
+    )
+
+
+def pandits_covering(db, latitude: float, longitude: float, columns=None):
+    """
+    Query of (Pandit, distance_km) for verified pandits whose service radius
+    includes the given point, nearest first. With columns, rows hold those
+    pandit columns instead of the Pandit.
+    """
+    distance = func.haversine_km(
+        latitude, longitude, models.Pandit.latitude, models.Pandit.longitude
+    )
+    distance_km = distance.label("distance_km")
+    # The R*Tree point lookup drives the query and pandits are fetched by
+    # index_key. Only verified pandits have coverage boxes, and is_verified is
+    # re-checked on the fetched rows in case a box outlived the verification
+    # (wrapped in coalesce so SQLite can't pick the is_verified indexes instead)
+    covering = select(pandit_coverage.c.id).where(
+        pandit_coverage.c.min_lat <= latitude,
+        pandit_coverage.c.max_lat >= latitude,
+        pandit_coverage.c.min_lon <= longitude,
+        pandit_coverage.c.max_lon >= longitude
+    )
+    return db.query(*(columns or [models.Pandit]), distance_km).filter(
+        models.Pandit.index_key.in_(covering),
+        func.coalesce(models.Pandit.is_verified, False).is_(True),
+        distance <= func.coalesce(models.Pandit.service_radius_km, DEFAULT_SERVICE_RADIUS_KM)
+    ).order_by(distance_km.asc(), models.Pandit.id.asc())
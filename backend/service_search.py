@@ -0,0 +1,104 @@
+"""
+Full-text keyword search over services.
+
+services_fts is an external-content SQLite FTS5 index over services.name and
+services.category, keyed by services.index_key and kept in sync by triggers on
+the services table (the insert trigger also assigns the key). Keywords are
+matched as token prefixes ("wed" finds "Wedding") and results can be ranked
+with bm25 instead of scanning every row with a leading-wildcard LIKE.
+"""
+
+import re
+from sqlalchemy import false, literal_column, select, text
+from sqlalchemy.sql import column, table
+from database import assign_index_keys
+import models
+
+services_fts = table("services_fts", column("rowid"), column("rank"))
+
+SERVICE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS services_fts USING fts5(
+        name, category, content='services', content_rowid='index_key', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS services_fts_insert AFTER INSERT ON services BEGIN
+        UPDATE services SET index_key = (SELECT coalesce(max(index_key), 0) + 1 FROM services)
+        WHERE rowid = new.rowid AND new.index_key IS NULL;
+        INSERT INTO services_fts(rowid, name, category)
+        SELECT index_key, new.name, new.category FROM services WHERE rowid = new.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS services_fts_delete AFTER DELETE ON services BEGIN
+        INSERT INTO services_fts(services_fts, rowid, name, category)
+        VALUES ('delete', old.index_key, old.name, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS services_fts_update AFTER UPDATE OF name, category ON services BEGIN
+        INSERT INTO services_fts(services_fts, rowid, name, category)
+        VALUES ('delete', old.index_key, old.name, old.category);
+        INSERT INTO services_fts(rowid, name, category) VALUES (new.index_key, new.name, new.category);
+    END""",
+]
+
+
+def create_service_search_index(engine):
+    """
+    Create services_fts and its triggers, indexing existing rows the first time.
+    An index from before services had an index_key (keyed by the rowid, which
+    VACUUM may renumber) is dropped and rebuilt.
+    """
+    with engine.begin() as connection:
+        definition = connection.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'services_fts'"
+        )).scalar()
+        if definition is not None and "index_key" not in definition:
+            connection.execute(text("DROP TABLE services_fts"))
+            for trigger in ("insert", "delete", "update"):
+                connection.execute(text(f"DROP TRIGGER IF EXISTS services_fts_{trigger}"))
+            definition = None
+        assign_index_keys(connection, "services")
+        for statement in SERVICE_SEARCH_DDL:
+            connection.execute(text(statement))
+        if definition is None:
+            rebuild_service_search_index(connection)
+
+
+def rebuild_service_search_index(connection):
+    """Re-index every service from the services table."""
+    connection.execute(text("INSERT INTO services_fts(services_fts) VALUES ('rebuild')"))
+
+
+def fts_query(keyword: str = None, category: str = None):
+    """
+    Build an FTS5 MATCH expression: every word of keyword must prefix-match
+    name or category, and every word of category must prefix-match category.
+    Returns None when neither contains a searchable word.
+    """
+    terms = [f'"{word}"*' for word in re.findall(r"\w+", keyword or "")]
+    terms += [f'category : "{word}"*' for word in re.findall(r"\w+", category or "")]
+    return " AND ".join(terms) or None
+
+
+def search_terms(value: str = None):
+    """
+    Normalized form of a keyword or category for cache keys: the lowercased
+    words fts_query would match, so "Wedding " and "wedding" share an entry.
+    """
+    if not value:
+        return None
+    return " ".join(re.findall(r"\w+", value.lower()))
+
+
+def match_services(query, keyword: str = None, category: str = None):
+    """
+    Restrict a query over models.Service to services matching keyword and/or
+    category. Returns the filtered query and the bm25 rank column to sort by
+    (lower is better), or (query, None) if there is nothing to match.
+    """
+    if not keyword and not category:
+        return query, None
+    expression = fts_query(keyword, category)
+    if expression is None:
+        return query.filter(false()), None
+    matches = select(services_fts.c.rowid, services_fts.c.rank).where(
+        literal_column("services_fts").op("MATCH")(expression)
+    ).subquery()
+    query = query.join(matches, matches.c.rowid == models.Service.index_key)
+    return query, matches.c.rank
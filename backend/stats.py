@@ -0,0 +1,118 @@
+"""
+Platform statistics counters.
+
+stats_counters holds one row per number shown on the admin dashboard. Triggers
+on users, pandits, services and bookings keep the counts current inside the
+writing transaction, including rows removed by ON DELETE CASCADE and bulk
+deletes, so reading the statistics is a lookup of a few rows instead of a
+COUNT(*) over each table.
+
+Run this file to rebuild the counters from the tables:
+
+    python stats.py
+"""
+
+from sqlalchemy import text
+from database import engine, upgrade_schema
+
+BOOKING_STATUSES = ("pending", "confirmed", "rejected", "completed", "cancelled")
+
+STATS_DDL = [
+    """CREATE TABLE IF NOT EXISTS stats_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users BEGIN
+        UPDATE stats_counters SET value = value + 1 WHERE name = 'users';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users BEGIN
+        UPDATE stats_counters SET value = value - 1 WHERE name = 'users';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_pandits_insert AFTER INSERT ON pandits BEGIN
+        UPDATE stats_counters SET value = value + 1
+        WHERE name = 'pandits' OR (name = 'pandits_verified' AND new.is_verified);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_pandits_delete AFTER DELETE ON pandits BEGIN
+        UPDATE stats_counters SET value = value - 1
+        WHERE name = 'pandits' OR (name = 'pandits_verified' AND old.is_verified);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_pandits_verify AFTER UPDATE OF is_verified ON pandits
+    WHEN coalesce(old.is_verified, 0) != coalesce(new.is_verified, 0) BEGIN
+        UPDATE stats_counters SET value = value + (CASE WHEN new.is_verified THEN 1 ELSE -1 END)
+        WHERE name = 'pandits_verified';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_services_insert AFTER INSERT ON services BEGIN
+        UPDATE stats_counters SET value = value + 1 WHERE name = 'services';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_services_delete AFTER DELETE ON services BEGIN
+        UPDATE stats_counters SET value = value - 1 WHERE name = 'services';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_bookings_insert AFTER INSERT ON bookings BEGIN
+        UPDATE stats_counters SET value = value + 1
+        WHERE name IN ('bookings', 'bookings_' || new.status);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_bookings_delete AFTER DELETE ON bookings BEGIN
+        UPDATE stats_counters SET value = value - 1
+        WHERE name IN ('bookings', 'bookings_' || old.status);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_bookings_status AFTER UPDATE OF status ON bookings
+    WHEN old.status IS NOT new.status BEGIN
+        UPDATE stats_counters SET value = value - 1 WHERE name = 'bookings_' || old.status;
+        UPDATE stats_counters SET value = value + 1 WHERE name = 'bookings_' || new.status;
+    END""",
+]
+
+
+def create_stats_counters(engine):
+    """Create stats_counters and its triggers, counting existing rows the first time."""
+    with engine.begin() as connection:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_counters'"
+        )).first()
+        for statement in STATS_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            reconcile_stats(connection)
+
+
+def reconcile_stats(connection):
+    """Recount every counter from the tables and return the new values."""
+    users, pandits, verified, services = connection.execute(text(
+        "SELECT (SELECT count(*) FROM users), (SELECT count(*) FROM pandits), "
+        "(SELECT count(*) FROM pandits WHERE is_verified), (SELECT count(*) FROM services)"
+    )).one()
+    counters = {
+        "users": users,
+        "pandits": pandits,
+        "pandits_verified": verified,
+        "services": services,
+        "bookings": 0,
+    }
+    counters.update({f"bookings_{status}": 0 for status in BOOKING_STATUSES})
+    for status, count in connection.execute(text(
+        "SELECT status, count(*) FROM bookings GROUP BY status"
+    )):
+        counters["bookings"] += count
+        if status in BOOKING_STATUSES:
+            counters[f"bookings_{status}"] = count
+
+    connection.execute(text("DELETE FROM stats_counters"))
+    connection.execute(
+        text("INSERT INTO stats_counters (name, value) VALUES (:name, :value)"),
+        [{"name": name, "value": value} for name, value in counters.items()]
+    )
+    return counters
+
+
+def read_stats(db) -> dict:
+    """Current counter values by name."""
+    return dict(db.execute(text("SELECT name, value FROM stats_counters")).all())
+
+
+if __name__ == "__main__":
+    upgrade_schema()
+    create_stats_counters(engine)
+    with engine.begin() as connection:
+        counters = reconcile_stats(connection)
+    for name, value in counters.items():
+        print(f"{name}: {value}")
@@ -0,0 +1,113 @@
+"""
+Shared fixtures for the backend tests.
+
+The app is imported against a fresh SQLite database in a temporary directory,
+so the tests never touch pandit.db. Rows are added straight through the ORM
+(with a fixed password hash, as bcrypt is slow) and requests authenticate with
+tokens from auth.create_token.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+_database_dir = tempfile.mkdtemp(prefix="pandit-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+import main
+import models
+from auth import create_token
+from database import SessionLocal
+
+PASSWORD_HASH = "$2b$12$KIXQJ1y6Jx1Qe8Q6q7yYxO6m8kq0e1p4zQ3Jb0rS9vWn2yQ3b5G6u"
+
+_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def bearer(principal) -> dict:
+    """Authorization header for a User, Pandit or Admin row."""
+    principal_type = {models.User: "user", models.Pandit: "pandit", models.Admin: "admin"}[type(principal)]
+    return {"Authorization": "Bearer " + create_token({"sub": principal.id, "type": principal_type})}
+
+
+@pytest.fixture
+def make_user(db):
+    def make(**fields):
+        number = next(_numbers)
+        values = dict(full_name=f"User {number}", phone=f"u-{number}", hashed_password=PASSWORD_HASH,
+                      latitude=28.6, longitude=77.2)
+        values.update(fields)
+        user = models.User(**values)
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_pandit(db):
+    def make(**fields):
+        number = next(_numbers)
+        values = dict(
+            full_name=f"Pandit {number}", phone=f"p-{number}", hashed_password=PASSWORD_HASH,
+            experience_years=5, bio="Vedic rituals", region="Delhi", languages="Hindi",
+            latitude=28.6, longitude=77.2, price_per_service=1000, is_verified=True
+        )
+        values.update(fields)
+        pandit = models.Pandit(**values)
+        db.add(pandit)
+        db.commit()
+        return pandit
+    return make
+
+
+@pytest.fixture
+def make_service(db):
+    def make(pandit, **fields):
+        values = dict(name="Griha Pravesh", category="Housewarming", base_price=2100, duration_minutes=120)
+        values.update(fields)
+        service = models.Service(pandit_id=pandit.id, **values)
+        db.add(service)
+        db.commit()
+        return service
+    return make
+
+
+@pytest.fixture
+def make_booking(db):
+    def make(user, service, **fields):
+        values = dict(booking_date="2025-01-01", service_address="12 Temple Road", status="pending",
+                      total_amount=service.base_price)
+        values.update(fields)
+        booking = models.Booking(user_id=user.id, pandit_id=service.pandit_id, service_id=service.id, **values)
+        db.add(booking)
+        db.commit()
+        return booking
+    return make
+
+
+@pytest.fixture
+def admin(db):
+    number = next(_numbers)
+    admin = models.Admin(username=f"admin-{number}", email=f"admin-{number}@example.com",
+                         hashed_password=PASSWORD_HASH)
+    db.add(admin)
+    db.commit()
+    return admin
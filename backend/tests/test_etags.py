@@ -0,0 +1,55 @@
+from conftest import bearer
+
+
+def test_cached_services_answer_304_without_queries(client, make_pandit, make_service):
+    make_service(make_pandit())
+    first = client.get("/services")
+    etag = first.headers["etag"]
+
+    # Cached body: the stored ETag answers without querying the database
+    cached = client.get("/services", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+    assert '"0 queries"' in cached.headers["server-timing"]
+
+    # Weak and listed forms match too
+    assert client.get("/services", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/services", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_service_change_changes_the_etag(client, make_pandit, make_service):
+    pandit = make_pandit()
+    etag = client.get("/services").headers["etag"]
+
+    make_service(pandit, name="Satyanarayan Katha")
+    response = client.get("/services", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "Satyanarayan Katha" in {service["name"] for service in response.json()}
+
+
+def test_search_etag_covers_the_query_string(client, make_pandit, make_service):
+    make_service(make_pandit(), name="Rudrabhishek")
+    puja = client.get("/services/search", params={"keyword": "rudra"})
+    other = client.get("/services/search", params={"keyword": "havan"})
+    assert puja.headers["etag"] != other.headers["etag"]
+
+    # Not cached for this exact URL yet: the ETag is computed before rendering
+    response = client.get("/services/search", params={"keyword": "rudra", "limit": 5})
+    repeat = client.get("/services/search", params={"keyword": "rudra", "limit": 5},
+                        headers={"If-None-Match": response.headers["etag"]})
+    assert repeat.status_code == 304
+
+
+def test_profile_etag_follows_updates(client, make_user):
+    user = make_user()
+    headers = bearer(user)
+    etag = client.get("/user/profile", headers=headers).headers["etag"]
+    assert client.get("/user/profile", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    assert client.put("/user/location", headers=headers, params={"latitude": 19.07, "longitude": 72.88}).status_code == 200
+    response = client.get("/user/profile", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["latitude"] == 19.07
+    assert response.headers["etag"] != etag
@@ -0,0 +1,41 @@
+import threading
+from metrics import Counter, Histogram
+from routers import metrics_routes
+from conftest import bearer
+
+
+def test_metrics_need_an_admin_or_the_scrape_token(client, monkeypatch, admin, make_user):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=bearer(make_user())).status_code == 401
+
+    response = client.get("/metrics", headers=bearer(admin))
+    assert response.status_code == 200
+    assert "# TYPE pandit_http_requests_total counter" in response.text
+
+    monkeypatch.setattr(metrics_routes, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secre"}).status_code == 401
+
+
+def test_finished_threads_fold_into_the_totals():
+    requests = Counter("test_requests_total", "Requests.", ["route"])
+    latency = Histogram("test_latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+
+    def record():
+        requests.inc("/services")
+        latency.observe(0.5, "/services")
+
+    for _ in range(3):
+        threads = [threading.Thread(target=record) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        requests.samples()
+    record()
+
+    assert requests.samples() == {("/services",): 61}
+    assert latency.samples() == {("/services",): [0, 61, 0, 30.5]}
+    # Only the live main thread keeps a shard of its own
+    assert list(requests._shards._threads) == [threading.current_thread()]
+    assert list(latency._shards._threads) == [threading.current_thread()]
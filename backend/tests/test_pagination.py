@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+import models
+from pagination import keyset_paginate
+from routers.service_routes import search_counts
+from conftest import bearer
+
+
+def pages(client, path, headers, params=None):
+    """Every item of a cursor-paginated list endpoint, one page at a time."""
+    items, cursor = [], None
+    while True:
+        response = client.get(path, headers=headers, params={**(params or {}), **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.json()
+        if isinstance(body, dict):
+            items += body["items"]
+            cursor = body["next_cursor"]
+        else:
+            items += body
+            cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return items
+
+
+def test_pending_pandits_page_through_null_created_at(client, db, admin, make_pandit):
+    started = datetime(2024, 1, 1)
+    pandits = [make_pandit(is_verified=False, created_at=started + timedelta(hours=n)) for n in range(5)]
+    for pandit in pandits[:2]:
+        db.execute(update(models.Pandit).where(models.Pandit.id == pandit.id).values(created_at=None))
+    db.commit()
+
+    pending = db.query(models.Pandit).filter(models.Pandit.is_verified == False).all()
+    dated = sorted((p for p in pending if p.created_at), key=lambda p: (p.created_at, p.id), reverse=True)
+    undated = sorted((p.id for p in pending if p.created_at is None), reverse=True)
+    expected = [p.id for p in dated] + undated
+
+    got = [p["id"] for p in pages(client, "/admin/pandits/pending", bearer(admin), {"limit": 2})]
+    assert got == expected
+
+
+def test_ascending_keys_start_with_nulls(db, make_pandit):
+    region = "Pagination Ascending"
+    pandits = [make_pandit(region=region, service_radius_km=radius) for radius in (5, 30, 5, 10, 20, 10)]
+    unset = [p.id for p in pandits[::2]]
+    db.execute(update(models.Pandit).where(models.Pandit.id.in_(unset)).values(service_radius_km=None))
+    db.commit()
+    query = db.query(models.Pandit).filter(models.Pandit.region == region)
+    columns = [models.Pandit.service_radius_km, models.Pandit.id]
+
+    got, cursor = [], None
+    while True:
+        page, cursor = keyset_paginate(query, columns, 2, cursor, sort="radius")
+        got += [p.id for p in page]
+        if cursor is None:
+            break
+
+    ranked = sorted((p.service_radius_km, p.id) for p in pandits if p.id not in unset)
+    assert got == sorted(unset) + [pandit_id for _, pandit_id in ranked]
+
+
+def test_async_bookings_page_through_null_created_at(client, db, make_user, make_pandit, make_service, make_booking):
+    user, pandit = make_user(), make_pandit()
+    service = make_service(pandit)
+    started = datetime(2024, 1, 1)
+    bookings = [make_booking(user, service, created_at=started + timedelta(days=n)) for n in range(6)]
+    nulled = [b.id for b in bookings[1::2]]
+    db.execute(update(models.Booking).where(models.Booking.id.in_(nulled)).values(created_at=None))
+    db.commit()
+
+    dated = sorted((b for b in bookings if b.id not in nulled), key=lambda b: (b.created_at, b.id), reverse=True)
+    expected = [b.id for b in dated] + sorted(nulled, reverse=True)
+    got = [b["id"] for b in pages(client, "/pandit/bookings", bearer(pandit), {"limit": 2})]
+    assert got == expected
+
+
+def test_bad_cursor_is_rejected(client, admin):
+    response = client.get("/admin/pandits/pending", headers=bearer(admin), params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_search_totals_share_normalized_filters(client, make_pandit, make_service):
+    make_service(make_pandit(), name="Kelvaro Puja")
+    for keyword in ("Kelvaro", "kelvaro ", "KELVARO"):
+        assert client.get("/services/search", params={"keyword": keyword, "include_total": "true"}).json()["total"] == 1
+    assert search_counts.get(("kelvaro", None, None, None)) == 1
+    assert search_counts.get(("Kelvaro", None, None, None)) is None
@@ -0,0 +1,47 @@
+import uuid
+from sqlalchemy import update
+import models
+from auth import create_token
+from conftest import bearer
+from principal_cache import principal_cache
+
+
+def test_repeat_requests_are_served_from_the_cache(client, make_user):
+    headers = bearer(make_user())
+    client.get("/user/profile", headers=headers)
+    hits = principal_cache.stats()["hits"]
+    client.get("/user/profile", headers=headers)
+    assert principal_cache.stats()["hits"] == hits + 1
+
+
+def test_queued_write_refreshes_the_principal(client, make_user):
+    headers = bearer(make_user())
+    client.get("/user/profile", headers=headers)
+
+    client.put("/user/location", headers=headers, params={"latitude": 12.97, "longitude": 77.59})
+    profile = client.get("/user/profile", headers=headers).json()
+    assert (profile["latitude"], profile["longitude"]) == (12.97, 77.59)
+
+
+def test_bulk_update_refreshes_the_principal(client, db, make_user):
+    user = make_user()
+    headers = bearer(user)
+    client.get("/user/profile", headers=headers)
+
+    db.execute(update(models.User).where(models.User.id == user.id).values(full_name="Renamed"))
+    db.commit()
+    assert client.get("/user/profile", headers=headers).json()["full_name"] == "Renamed"
+
+
+def test_deleted_pandit_token_stops_working(client, admin, make_pandit):
+    pandit = make_pandit()
+    headers = bearer(pandit)
+    assert client.get("/pandit/profile", headers=headers).status_code == 200
+
+    client.delete(f"/admin/pandits/{pandit.id}", headers=bearer(admin))
+    assert client.get("/pandit/profile", headers=headers).status_code == 401
+
+
+def test_token_of_a_missing_user_is_rejected(client):
+    token = create_token({"sub": str(uuid.uuid4()), "type": "user"})
+    assert client.get("/user/profile", headers={"Authorization": "Bearer " + token}).status_code == 401
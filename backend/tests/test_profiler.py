@@ -0,0 +1,14 @@
+from conftest import bearer
+
+
+def test_only_existing_admins_can_request_a_profile(client, db, admin, make_user):
+    token = bearer(admin)["Authorization"]
+    response = client.get("/services", headers={"X-Profile": token})
+    profile_id = response.headers["x-profile-id"]
+    assert client.get(f"/admin/profiles/{profile_id}", headers=bearer(admin)).status_code == 200
+
+    assert "x-profile-id" not in client.get("/services", headers={"X-Profile": bearer(make_user())["Authorization"]}).headers
+
+    db.delete(admin)
+    db.commit()
+    assert "x-profile-id" not in client.get("/services", headers={"X-Profile": token}).headers
@@ -0,0 +1,56 @@
+import time
+from sqlalchemy import text
+from database import engine
+from ratings import backfill_ratings
+from conftest import bearer
+
+
+def review(client, user, booking, rating):
+    return client.post(f"/user/bookings/{booking.id}/review", headers=bearer(user),
+                       json={"booking_id": booking.id, "rating": rating, "comment": "Thank you"})
+
+
+def test_reviews_update_the_aggregates(client, db, make_user, make_pandit, make_service, make_booking):
+    user, pandit = make_user(), make_pandit()
+    service = make_service(pandit)
+    for rating in (4, 2):
+        booking = make_booking(user, service, status="completed")
+        assert review(client, user, booking, rating).status_code == 200
+
+    db.refresh(pandit)
+    assert (pandit.rating_count, pandit.rating_sum, pandit.rating_avg) == (2, 6, 3.0)
+
+
+def test_review_of_a_missing_booking_changes_nothing(client, db, make_user, make_pandit):
+    user, pandit = make_user(), make_pandit()
+    response = client.post("/user/bookings/no-such-booking/review", headers=bearer(user),
+                           json={"booking_id": "no-such-booking", "rating": 5, "comment": "?"})
+    assert response.status_code == 404
+    db.refresh(pandit)
+    assert pandit.rating_count == 0
+
+
+def test_backfill_fixes_drifted_rows_and_bumps_updated_at(client, db, make_user, make_pandit, make_service, make_booking):
+    user = make_user()
+    drifted, untouched = make_pandit(), make_pandit()
+    for pandit, rating in ((drifted, 5), (untouched, 3)):
+        booking = make_booking(user, make_service(pandit), status="completed")
+        review(client, user, booking, rating)
+    db.execute(text("UPDATE pandits SET rating_count = 9, rating_sum = 9, rating_avg = 1 WHERE id = :id"),
+               {"id": drifted.id})
+    db.commit()
+    db.refresh(drifted)
+    db.refresh(untouched)
+    before = drifted.updated_at, untouched.updated_at
+
+    time.sleep(0.01)
+    with engine.begin() as connection:
+        backfill_ratings(connection)
+
+    db.refresh(drifted)
+    db.refresh(untouched)
+    assert (drifted.rating_count, drifted.rating_sum, drifted.rating_avg) == (1, 5, 5.0)
+    assert drifted.updated_at > before[0]
+    assert untouched.updated_at == before[1]
+    # The cached principal was dropped along with the stale aggregates
+    assert client.get("/pandit/profile", headers=bearer(drifted)).json()["rating_avg"] == 5.0
@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy import text
+from database import engine
+from read_model import read_model
+from conftest import bearer
+
+# Away from the other tests' pandits
+CAPE_TOWN = (-33.92, 18.42)
+
+SEARCHES = [
+    ("/user/pandits/search", {"max_distance_km": 30}),
+    ("/user/pandits/search", {"max_distance_km": 30, "sort_by": "distance", "limit": 2, "skip": 1}),
+    ("/user/pandits/available", {}),
+    ("/services/nearby-distance", {"max_distance_km": 30, "limit": 100}),
+]
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user(latitude=CAPE_TOWN[0], longitude=CAPE_TOWN[1])
+
+
+def from_database(client, monkeypatch, path, params, headers):
+    with monkeypatch.context() as patch:
+        patch.setattr(read_model, "current", lambda: None)
+        return client.get(path, params=params, headers=headers).json()
+
+
+def assert_model_matches_database(client, monkeypatch, user):
+    read_model.refresh()
+    assert read_model.current() is not None
+    headers = bearer(user)
+    for path, params in SEARCHES:
+        assert client.get(path, params=params, headers=headers).json() == \
+            from_database(client, monkeypatch, path, params, headers), path
+
+
+def found(client, user):
+    return {p["id"]: p for p in client.get("/user/pandits/search", params={"max_distance_km": 30},
+                                           headers=bearer(user)).json()}
+
+
+def test_writes_are_visible_before_and_after_they_are_applied(client, monkeypatch, user, make_pandit, make_service):
+    pandit = make_pandit(latitude=CAPE_TOWN[0] + 0.05, longitude=CAPE_TOWN[1], service_radius_km=20)
+    make_service(pandit, name="Vastu Shanti")
+    # Straight after the commit: from the database, or the model once it caught up
+    assert pandit.id in found(client, user)
+    assert_model_matches_database(client, monkeypatch, user)
+
+    client.put("/pandit/location", headers=bearer(pandit), params={"latitude": CAPE_TOWN[0] + 0.1, "longitude": CAPE_TOWN[1]})
+    assert found(client, user)[pandit.id]["latitude"] == CAPE_TOWN[0] + 0.1
+    assert_model_matches_database(client, monkeypatch, user)
+    assert read_model.stats()["pending"] == 0
+
+
+def test_verification_and_service_changes(client, monkeypatch, admin, user, make_pandit, make_service):
+    pandit = make_pandit(latitude=CAPE_TOWN[0], longitude=CAPE_TOWN[1] + 0.05)
+    service = make_service(pandit, name="Annaprashan")
+
+    client.put(f"/admin/pandits/{pandit.id}/reject", headers=bearer(admin))
+    assert pandit.id not in found(client, user)
+    assert_model_matches_database(client, monkeypatch, user)
+
+    client.put(f"/admin/pandits/{pandit.id}/approve", headers=bearer(admin))
+    client.put(f"/pandit/services/{service.id}", headers=bearer(pandit), params={"base_price": 999})
+    make_service(pandit, name="Upanayana")
+    assert_model_matches_database(client, monkeypatch, user)
+    listed = client.get(f"/pandits/{pandit.id}/services").json()["items"]
+    assert {(s["name"], s["base_price"]) for s in listed} >= {("Annaprashan", 999), ("Upanayana", 2100)}
+
+
+def test_rows_deleted_by_another_process_are_resynced(client, monkeypatch, user, make_pandit, make_service):
+    pandit = make_pandit(latitude=CAPE_TOWN[0] - 0.05, longitude=CAPE_TOWN[1])
+    make_service(pandit, name="Shraddh")
+    read_model.refresh()
+    resyncs = read_model.stats()["resyncs"]
+
+    # Raw SQL, as another process would delete it: no session hooks run
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM pandits WHERE id = :id"), {"id": pandit.id})
+    read_model.refresh()
+    assert read_model.stats()["resyncs"] == resyncs + 1
+    assert pandit.id not in found(client, user)
+    assert_model_matches_database(client, monkeypatch, user)
+
+
+def test_null_prices_and_ratings_order_as_in_sql(client, db, monkeypatch, user, make_pandit):
+    pandits = [make_pandit(latitude=CAPE_TOWN[0] + 0.01 * n, longitude=CAPE_TOWN[1] - 0.2, price_per_service=price)
+               for n, price in enumerate((1500, 500, 800, 500))]
+    unpriced = [pandits[0].id, pandits[2].id]
+    # The schema can't set NULLs, but older rows and other writers can
+    pandits[0].price_per_service = pandits[2].price_per_service = None
+    pandits[1].rating_avg = None
+    db.commit()
+    read_model.refresh()
+
+    headers = bearer(user)
+    for sort_by in ("price", "rating", "match_score"):
+        for page in ({}, {"skip": 1, "limit": 2}):
+            params = {"max_distance_km": 40, "sort_by": sort_by, **page}
+            assert read_model.current() is not None
+            from_model = client.get("/user/pandits/search", params=params, headers=headers).json()
+            assert from_model == from_database(client, monkeypatch, "/user/pandits/search", params, headers), params
+    ordered = client.get("/user/pandits/search", params={"max_distance_km": 40, "sort_by": "price"}, headers=headers).json()
+    assert [p["id"] for p in ordered[:2]] == sorted(unpriced)
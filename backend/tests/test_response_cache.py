@@ -0,0 +1,65 @@
+from conftest import bearer
+
+
+def service_names(response):
+    return {service["name"] for service in response.json()}
+
+
+def test_service_writes_invalidate_the_catalog(client, make_pandit):
+    pandit = make_pandit()
+    headers = bearer(pandit)
+    client.get("/services")
+    assert client.get("/services").headers["x-cache"] == "HIT"
+
+    created = client.post("/pandit/services", headers=headers, json={
+        "name": "Navgraha Shanti", "category": "Shanti", "base_price": 3100, "duration_minutes": 180
+    })
+    service_id = created.json()["service_id"]
+    response = client.get("/services")
+    assert response.headers["x-cache"] == "MISS"
+    assert "Navgraha Shanti" in service_names(response)
+
+    client.put(f"/pandit/services/{service_id}", headers=headers, params={"name": "Navgraha Puja"})
+    names = service_names(client.get("/services"))
+    assert "Navgraha Puja" in names and "Navgraha Shanti" not in names
+
+    client.delete(f"/pandit/services/{service_id}", headers=headers)
+    assert "Navgraha Puja" not in service_names(client.get("/services"))
+
+
+def test_search_results_follow_writes(client, make_pandit, make_service):
+    pandit = make_pandit()
+    params = {"keyword": "kaalsarp"}
+    assert client.get("/services/search", params=params).json()["items"] == []
+    assert client.get("/services/search", params=params).headers["x-cache"] == "HIT"
+
+    make_service(pandit, name="Kaalsarp Dosh Puja")
+    response = client.get("/services/search", params=params)
+    assert response.headers["x-cache"] == "MISS"
+    assert [item["name"] for item in response.json()["items"]] == ["Kaalsarp Dosh Puja"]
+
+
+def test_bulk_delete_invalidates_the_catalog(client, admin, make_pandit, make_service):
+    pandit = make_pandit()
+    make_service(pandit, name="Mundan Sanskar")
+    assert "Mundan Sanskar" in service_names(client.get("/services"))
+
+    # Deleting a pandit removes its services with a bulk DELETE
+    assert client.delete(f"/admin/pandits/{pandit.id}", headers=bearer(admin)).status_code == 200
+    assert "Mundan Sanskar" not in service_names(client.get("/services"))
+
+
+
+def test_search_total_follows_writes(client, make_pandit, make_service):
+    pandit = make_pandit()
+    params = {"keyword": "Trivexa", "include_total": "true"}
+    make_service(pandit, name="Trivexa Puja")
+    assert client.get("/services/search", params=params).json()["total"] == 1
+
+    second = make_service(pandit, name="Trivexa Havan")
+    body = client.get("/services/search", params=params).json()
+    assert (body["total"], len(body["items"])) == (2, 2)
+
+    client.delete(f"/pandit/services/{second.id}", headers=bearer(pandit))
+    body = client.get("/services/search", params=params).json()
+    assert (body["total"], len(body["items"])) == (1, 1)
@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Optional
+import pytest
+from pydantic import BaseModel, TypeAdapter
+import models
+import schemas
+from read_model import read_model
+from response_cache import response_cache
+from routers import admin_routes, pandit_routes, service_routes, user_routes
+from serializers import Serializer
+from conftest import bearer
+
+SERIALIZERS = (
+    service_routes.services_json, pandit_routes.services_json, pandit_routes.bookings_json,
+    user_routes.bookings_json, user_routes.search_pandits_json, user_routes.available_pandits_json,
+    admin_routes.all_pandits_json, admin_routes.pending_pandits_json,
+)
+
+
+class Visit(BaseModel):
+    id: int
+    note: Optional[str]
+    fee: float
+    radius_km: Optional[float]
+    visited_at: datetime
+    left_at: Optional[datetime]
+    distance_km: float
+
+
+def expected_json(schema, items) -> bytes:
+    adapter = TypeAdapter(list[schema])
+    return adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_serializer_matches_pydantic(monkeypatch, fast):
+    serializer = Serializer(Visit, "test_visits", computed=("distance_km",))
+    monkeypatch.setattr(serializer, "fast", fast)
+    rows = [
+        SimpleNamespace(id=1, note=None, fee=1000, radius_km=None, left_at=None,
+                        visited_at=datetime(2024, 3, 1, 9, 30)),
+        SimpleNamespace(id=2, note="Havan", fee=0.1 + 0.2, radius_km=12, left_at=datetime(2024, 3, 1, 11),
+                        visited_at=datetime(2024, 3, 1, 10, 15, 0, 500, tzinfo=timezone.utc)),
+    ]
+    items = [serializer.row(row, distance_km=distance) for row, distance in zip(rows, (3, 7.25))]
+    expected = expected_json(Visit, [{**vars(row), "distance_km": d} for row, d in zip(rows, (3, 7.25))])
+
+    response = serializer.respond(items)
+    if fast:
+        assert response.body == expected
+    else:
+        assert expected_json(Visit, response) == expected
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_routes_match_pydantic(client, db, monkeypatch, fast, admin, make_user, make_pandit, make_service,
+                               make_booking):
+    for serializer in SERIALIZERS:
+        monkeypatch.setattr(serializer, "fast", fast)
+    response_cache.clear()
+
+    user = make_user(latitude=64.14, longitude=-21.94)
+    pandit = make_pandit(latitude=64.15, longitude=-21.9, price_per_service=1500, service_radius_km=12.5,
+                         rating_avg=4, is_verified=False, created_at=datetime(2024, 5, 1, 8, 0, 0, 250))
+    # Newest pandit, so first in /admin/pandits
+    bare = make_pandit(latitude=64.12, longitude=-21.85, price_per_service=999.99, email=None,
+                       location_name=None, created_at=datetime(2099, 1, 1))
+    service = make_service(pandit, base_price=2100)
+    make_service(bare, base_price=0.1 + 0.2)
+    make_booking(user, service, total_amount=2100, service_latitude=64.14, service_longitude=-21.94)
+    make_booking(user, service, total_amount=1850.5, service_latitude=None, service_location_name=None)
+    db.query(models.Pandit).filter(models.Pandit.id == pandit.id).update({"is_verified": True})
+    db.commit()
+    read_model.refresh()
+
+    def check(path, headers, schema, computed=()):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        listed = response.json()
+        assert listed
+        model = {schemas.ServiceResponse: models.Service, schemas.BookingResponse: models.Booking}.get(
+            schema, models.Pandit)
+        db.expire_all()
+        rows = [db.get(model, item["id"]) for item in listed]
+        items = [{**{name: getattr(row, name) for name in schema.model_fields if name not in computed},
+                  **{name: item[name] for name in computed}} for row, item in zip(rows, listed)]
+        assert response.content == expected_json(schema, items)
+
+    check("/services", None, schemas.ServiceResponse)
+    check("/pandit/services", bearer(pandit), schemas.ServiceResponse)
+    check("/pandit/bookings", bearer(pandit), schemas.BookingResponse)
+    check("/user/bookings", bearer(user), schemas.BookingResponse)
+    computed = ("distance_km", "match_score")
+    check("/user/pandits/search", bearer(user), schemas.PanditWithDistance, computed)
+    check("/user/pandits/available", bearer(user), schemas.PanditWithDistance, computed)
+    check("/admin/pandits?limit=1", bearer(admin), schemas.PanditResponse)
+
+    pending = make_pandit(is_verified=False, email=None, latitude=None, longitude=None, price_per_service=750)
+    check("/admin/pandits/pending", bearer(admin), schemas.PanditResponse)
+    assert pending.id in {item["id"] for item in client.get("/admin/pandits/pending", headers=bearer(admin)).json()}
@@ -0,0 +1,96 @@
+from sqlalchemy import text
+from read_model import read_model
+from service_area import pandits_covering, rebuild_coverage
+from conftest import bearer
+
+# Far from the other tests' pandits, so only this module's show up here
+SYDNEY = (-33.87, 151.21)
+
+
+def covering_ids(db, latitude, longitude):
+    return [pandit.id for pandit, _ in pandits_covering(db, latitude, longitude)]
+
+
+def coverage_box(db, pandit):
+    return db.execute(text("SELECT min_lat, max_lat, min_lon, max_lon FROM pandit_coverage WHERE id = :id"),
+                      {"id": pandit.index_key}).first()
+
+
+def test_new_pandits_get_distinct_index_keys(db, make_pandit):
+    first, second = make_pandit(), make_pandit()
+    assert first.index_key is not None and second.index_key == first.index_key + 1
+
+
+def test_radius_decides_who_covers_an_address(db, make_pandit):
+    near = make_pandit(latitude=SYDNEY[0], longitude=SYDNEY[1], service_radius_km=5)
+    far = make_pandit(latitude=SYDNEY[0] + 0.2, longitude=SYDNEY[1], service_radius_km=50)
+    short = make_pandit(latitude=SYDNEY[0] + 0.2, longitude=SYDNEY[1], service_radius_km=10)
+
+    assert covering_ids(db, *SYDNEY) == [near.id, far.id]
+    assert short.id not in covering_ids(db, *SYDNEY)
+
+
+def test_updates_move_the_coverage_box(db, make_pandit):
+    pandit = make_pandit(latitude=SYDNEY[0], longitude=SYDNEY[1] + 1, service_radius_km=5)
+    index_key = pandit.index_key
+    assert pandit.id not in covering_ids(db, *SYDNEY)
+
+    pandit.longitude = SYDNEY[1]
+    db.commit()
+    assert pandit.index_key == index_key
+    assert pandit.id in covering_ids(db, *SYDNEY)
+
+    pandit.service_radius_km = 50
+    db.commit()
+    min_lat, max_lat, _, _ = coverage_box(db, pandit)
+    assert max_lat - min_lat > 0.8
+
+
+def test_unverified_and_deleted_pandits_leave_the_index(db, make_pandit):
+    pandit = make_pandit(latitude=SYDNEY[0], longitude=SYDNEY[1], service_radius_km=5)
+    pandit.is_verified = False
+    db.commit()
+    assert coverage_box(db, pandit) is None
+    assert pandit.id not in covering_ids(db, *SYDNEY)
+
+    pandit.is_verified = True
+    db.commit()
+    index_key = pandit.index_key
+    db.delete(pandit)
+    db.commit()
+    assert db.execute(text("SELECT count(*) FROM pandit_coverage WHERE id = :id"), {"id": index_key}).scalar() == 0
+
+
+def test_stale_box_is_rechecked_against_is_verified(db, make_pandit):
+    pandit = make_pandit(latitude=SYDNEY[0], longitude=SYDNEY[1], service_radius_km=5)
+    # A raw UPDATE skips the mapper events and leaves the box behind
+    db.execute(text("UPDATE pandits SET is_verified = 0 WHERE id = :id"), {"id": pandit.id})
+    db.commit()
+    assert coverage_box(db, pandit) is not None
+    assert pandit.id not in covering_ids(db, *SYDNEY)
+
+
+def test_rebuild_gives_the_maintained_box(db, make_pandit):
+    pandit = make_pandit(latitude=SYDNEY[0], longitude=SYDNEY[1], service_radius_km=7)
+    maintained = coverage_box(db, pandit)
+    rebuild_coverage(db.connection())
+    assert coverage_box(db, pandit) == maintained
+    db.rollback()
+
+
+def test_zero_coordinates_are_a_location(client, monkeypatch, db, make_user, make_pandit):
+    # Greenwich meridian near Accra, and the equator off Gabon
+    meridian = make_pandit(latitude=5.6, longitude=0.0, service_radius_km=20)
+    equator = make_pandit(latitude=0.0, longitude=9.4, service_radius_km=20)
+    assert coverage_box(db, meridian) is not None and coverage_box(db, equator) is not None
+    assert covering_ids(db, 5.6, 0.05) == [meridian.id]
+    assert covering_ids(db, 0.05, 9.4) == [equator.id]
+
+    headers = bearer(make_user(latitude=5.6, longitude=0.05))
+    read_model.refresh()
+    from_model = client.get("/user/pandits/available", headers=headers).json()
+    with monkeypatch.context() as patch:
+        patch.setattr(read_model, "current", lambda: None)
+        from_database = client.get("/user/pandits/available", headers=headers).json()
+    assert [p["id"] for p in from_model] == [meridian.id]
+    assert from_model == from_database
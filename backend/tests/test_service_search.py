@@ -0,0 +1,44 @@
+from sqlalchemy import text
+from conftest import bearer
+
+
+def search(client, **params):
+    return [item["name"] for item in client.get("/services/search", params=params).json()["items"]]
+
+
+def test_keywords_match_word_prefixes(client, make_pandit, make_service):
+    pandit = make_pandit()
+    make_service(pandit, name="Zyntheta Vivah Sanskar", category="Zyntheta Wedding")
+    make_service(pandit, name="Zyntheta Naamkaran", category="Zyntheta Naming")
+
+    assert search(client, keyword="zyntheta viv") == ["Zyntheta Vivah Sanskar"]
+    assert search(client, keyword="ZYNTHETA", sort_by="name_asc") == ["Zyntheta Naamkaran", "Zyntheta Vivah Sanskar"]
+    assert search(client, keyword="zyntheta", category="zyntheta wed") == ["Zyntheta Vivah Sanskar"]
+    assert search(client, keyword="yntheta") == []
+
+
+def test_index_follows_updates_and_deletes(client, make_pandit):
+    pandit = make_pandit()
+    headers = bearer(pandit)
+    service_id = client.post("/pandit/services", headers=headers, json={
+        "name": "Quorvex Havan", "category": "Havan", "base_price": 1100, "duration_minutes": 60
+    }).json()["service_id"]
+    assert search(client, keyword="quorvex") == ["Quorvex Havan"]
+
+    client.put(f"/pandit/services/{service_id}", headers=headers, params={"name": "Blentor Havan"})
+    assert search(client, keyword="quorvex") == []
+    assert search(client, keyword="blentor") == ["Blentor Havan"]
+
+    client.delete(f"/pandit/services/{service_id}", headers=headers)
+    assert search(client, keyword="blentor") == []
+
+
+def test_fts_rows_are_keyed_on_index_key(db, make_pandit, make_service):
+    service = make_service(make_pandit(), name="Plorbic Jaap")
+    assert service.index_key is not None
+    rowids = db.execute(text("SELECT rowid FROM services_fts WHERE services_fts MATCH 'plorbic'")).scalars().all()
+    assert rowids == [service.index_key]
+
+
+def test_punctuation_is_not_fts_syntax(client):
+    assert client.get("/services/search", params={"keyword": '"un(closed* AND'}).status_code == 200
@@ -0,0 +1,71 @@
+from sqlalchemy import text
+from database import engine
+from stats import read_stats, reconcile_stats
+from conftest import bearer
+
+
+def counted(db) -> dict:
+    """What the counters should say, counted from the tables."""
+    users, pandits, verified, services, bookings, pending, completed = db.execute(text(
+        "SELECT (SELECT count(*) FROM users), (SELECT count(*) FROM pandits), "
+        "(SELECT count(*) FROM pandits WHERE is_verified), (SELECT count(*) FROM services), "
+        "(SELECT count(*) FROM bookings), (SELECT count(*) FROM bookings WHERE status = 'pending'), "
+        "(SELECT count(*) FROM bookings WHERE status = 'completed')"
+    )).one()
+    return {
+        "users": users, "pandits": pandits, "pandits_verified": verified, "services": services,
+        "bookings": bookings, "bookings_pending": pending, "bookings_completed": completed,
+    }
+
+
+def counters(db) -> dict:
+    values = read_stats(db)
+    return {name: values[name] for name in counted(db)}
+
+
+def test_triggers_keep_the_counters_in_step(db, make_user, make_pandit, make_service, make_booking):
+    user, pandit = make_user(), make_pandit(is_verified=False)
+    service = make_service(pandit)
+    booking = make_booking(user, service)
+    assert counters(db) == counted(db)
+
+    pandit.is_verified = True
+    booking.status = "completed"
+    db.commit()
+    assert counters(db) == counted(db)
+
+    db.delete(booking)
+    db.delete(service)
+    db.commit()
+    db.delete(pandit)
+    db.delete(user)
+    db.commit()
+    assert counters(db) == counted(db)
+
+
+def test_admin_stats_match_the_tables(client, db, admin, make_pandit, make_service):
+    make_service(make_pandit(is_verified=False))
+    stats = client.get("/admin/stats", headers=bearer(admin)).json()
+    expected = counted(db)
+    assert stats["users"]["total"] == expected["users"]
+    assert stats["pandits"] == {
+        "total": expected["pandits"],
+        "verified": expected["pandits_verified"],
+        "pending_verification": expected["pandits"] - expected["pandits_verified"],
+    }
+    assert stats["services"]["total"] == expected["services"]
+    assert stats["bookings"] == {
+        "total": expected["bookings"],
+        "pending": expected["bookings_pending"],
+        "completed": expected["bookings_completed"],
+    }
+
+
+def test_reconcile_repairs_drifted_counters(db):
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE stats_counters SET value = value + 7 WHERE name IN ('users', 'bookings')"))
+    assert counters(db) != counted(db)
+
+    with engine.begin() as connection:
+        reconcile_stats(connection)
+    assert counters(db) == counted(db)
@@ -0,0 +1,43 @@
+import pytest
+import tracing
+from conftest import bearer
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1)
+
+
+def span_tree(client, admin, response) -> dict:
+    """name -> (parent name, ...) for the spans of response's trace."""
+    trace = client.get(f"/admin/traces/{response.headers['x-trace-id']}", headers=bearer(admin)).json()
+    names = {span["id"]: span["name"] for span in trace["spans"]}
+    parents = {}
+    for span in trace["spans"]:
+        parents.setdefault(span["name"], set()).add(names.get(span["parent_id"]))
+    return parents
+
+
+def check_shape(parents: dict):
+    assert parents["request"] == {None}
+    assert parents["handler"] == {"request"}
+    assert parents["dependencies"] == parents["endpoint"] == parents["serialize"] == {"handler"}
+    assert parents["jwt.decode"] == parents["principal.load"] == {"dependencies"}
+    # The principal's row is loaded under principal.load, the route's own queries under endpoint
+    assert parents["db.query"] == {"principal.load", "endpoint"}
+
+
+def test_sync_route_span_tree(client, traced, admin, make_pandit, make_service):
+    pandit = make_pandit()
+    make_service(pandit)
+    response = client.get("/pandit/services", headers=bearer(pandit))
+    assert response.status_code == 200
+    check_shape(span_tree(client, admin, response))
+
+
+def test_async_route_span_tree(client, traced, admin, make_user, make_pandit, make_service, make_booking):
+    user = make_user()
+    make_booking(user, make_service(make_pandit()))
+    response = client.get("/user/bookings", headers=bearer(user))
+    assert response.status_code == 200
+    check_shape(span_tree(client, admin, response))
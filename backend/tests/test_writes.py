@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+import models
+import writes
+from writes import WriteQueue
+
+
+def busy_error():
+    return OperationalError("COMMIT", {}, sqlite3.OperationalError("database is locked"))
+
+
+@pytest.fixture
+def write_queue():
+    queue = WriteQueue(batch_window_ms=200, retry_backoff_ms=1)
+    yield queue
+    queue.stop()
+
+
+def add_user(name):
+    def job(session):
+        session.add(models.User(full_name=name, phone=name, hashed_password="x"))
+        session.flush()
+    return job
+
+
+def test_failing_job_only_undoes_its_own_savepoint(db, write_queue):
+    def fails(session):
+        add_user("wq-failed")(session)
+        raise ValueError("bad booking")
+
+    failed = write_queue.submit(fails)
+    committed = write_queue.submit(add_user("wq-committed"))
+    with pytest.raises(ValueError):
+        failed.result()
+    committed.result()
+
+    phones = {phone for phone, in db.query(models.User.phone).filter(models.User.phone.like("wq-%"))}
+    assert phones == {"wq-committed"}
+    stats = write_queue.stats()
+    assert stats["batches"] == 1 and stats["completed"] == 1 and stats["failed"] == 1
+
+
+def test_busy_batch_is_retried(db, write_queue):
+    attempts = []
+
+    def flaky(session):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise busy_error()
+        add_user("wq-retried")(session)
+
+    write_queue.run(flaky)
+    assert len(attempts) == 2
+    assert write_queue.stats()["retried_batches"] == 1
+    assert db.query(models.User).filter(models.User.phone == "wq-retried").count() == 1
+
+
+def test_busy_after_every_retry_is_a_503(write_queue):
+    def always_busy(session):
+        raise busy_error()
+
+    with pytest.raises(HTTPException) as error:
+        write_queue.run(always_busy)
+    assert error.value.status_code == 503
+    assert write_queue.stats()["retried_batches"] == write_queue.retries
+
+
+def test_full_queue_is_a_503(monkeypatch):
+    monkeypatch.setattr(writes, "WRITE_QUEUE_TIMEOUT_SECONDS", 0.05)
+    queue = WriteQueue(queue_limit=1, batch_window_ms=0)
+    started, release = threading.Event(), threading.Event()
+
+    def blocker(session):
+        started.set()
+        release.wait()
+
+    try:
+        first = queue.submit(blocker)
+        started.wait()
+        queued = queue.submit(lambda session: None)
+        with pytest.raises(HTTPException) as error:
+            queue.submit(lambda session: None)
+        assert error.value.status_code == 503
+        assert error.value.headers["Retry-After"] == "1"
+        assert queue.stats()["rejected"] == 1
+    finally:
+        release.set()
+        queue.stop()
+    first.result()
+    queued.result()
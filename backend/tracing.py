@@ -0,0 +1,265 @@
+"""
+Lightweight request tracing.
+
+TracingMiddleware traces a TRACE_SAMPLE_RATE share of requests. A traced
+request gets a tree of spans, each with its start offset, duration and a few
+attributes:
+
+    request                 GET /user/bookings
+      handler               the route handler, split into:
+        dependencies        request parsing and Depends(), e.g.
+          jwt.decode
+          principal.load
+            db.query
+        endpoint            the route function, with its db.query spans
+        serialize           response validation and encoding
+      password              bcrypt on the password pool (logins)
+
+The current span lives in a context variable, so spans opened in the
+threadpool, in greenlets of async sessions and in write queue jobs land in
+the right trace. Finished traces are kept in memory for /admin/traces and,
+with TRACE_FILE set, appended to that file as JSON lines.
+"""
+
+import functools
+import inspect
+import itertools
+import json
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import TRACE_SAMPLE_RATE, TRACE_FILE, TRACES_KEPT
+from query_metrics import statement_shape
+
+current_span: ContextVar = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "id", "parent_id", "name", "start", "end", "attributes")
+
+    def __init__(self, trace, span_id: int, parent_id, name: str, attributes: dict):
+        self.trace = trace
+        self.id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.attributes = attributes
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def to_dict(self, origin: float) -> dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """Spans of one request."""
+
+    def __init__(self, method: str, path: str):
+        self.id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started_at = datetime.now(timezone.utc)
+        self.spans = []
+        self._ids = itertools.count(1)
+
+    def start_span(self, name: str, parent_id=None, **attributes) -> Span:
+        span = Span(self, next(self._ids), parent_id, name, attributes)
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> dict:
+        root = self.spans[0]
+        return {
+            "trace_id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round((root.end - root.start) * 1000, 3),
+            "spans": [span.to_dict(root.start) for span in self.spans],
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record the enclosed block as a child of the current span, if the request is traced."""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.trace.start_span(name, parent.id, **attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as error:
+        child.attributes["error"] = type(error).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+class TraceCollector:
+    """The most recent traces, plus an optional JSON lines file of all of them."""
+
+    def __init__(self, kept: int = TRACES_KEPT, path: str = TRACE_FILE):
+        self.path = path
+        self._traces = deque(maxlen=kept)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def add(self, trace: Trace):
+        record = trace.to_dict()
+        with self._lock:
+            self._traces.append(record)
+            if self.path:
+                if self._file is None:
+                    self._file = open(self.path, "a", buffering=1)
+                self._file.write(json.dumps(record) + "\n")
+
+    def get(self, trace_id: str):
+        with self._lock:
+            return next((record for record in self._traces if record["trace_id"] == trace_id), None)
+
+    def summaries(self) -> list:
+        with self._lock:
+            records = list(self._traces)
+        return [
+            {key: value for key, value in record.items() if key != "spans"} | {"spans": len(record["spans"])}
+            for record in reversed(records)
+        ]
+
+
+trace_collector = TraceCollector()
+
+
+# Every statement of a traced request is a span
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_span(conn, cursor, statement, parameters, context, executemany):
+    parent = current_span.get()
+    if parent is not None:
+        query = parent.trace.start_span("db.query", parent.id, statement=statement_shape(statement))
+        conn.info.setdefault("trace_spans", []).append(query)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_query_span(conn, cursor, statement, parameters, context, executemany):
+    if current_span.get() is not None and conn.info.get("trace_spans"):
+        conn.info["trace_spans"].pop().finish()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_query_span(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("trace_spans"):
+        query = connection.info["trace_spans"].pop()
+        query.attributes["error"] = type(exception_context.original_exception).__name__
+        query.finish()
+
+
+def _traced_endpoint(endpoint):
+    """endpoint wrapped in an "endpoint" span, keeping its signature for FastAPI."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def traced(*args, **kwargs):
+            with span("endpoint", function=endpoint.__name__):
+                return await endpoint(*args, **kwargs)
+    else:
+        @functools.wraps(endpoint)
+        def traced(*args, **kwargs):
+            with span("endpoint", function=endpoint.__name__):
+                return endpoint(*args, **kwargs)
+    return traced
+
+
+def _split_handler(handler: Span):
+    """Add dependencies and serialize spans around the endpoint span of handler."""
+    trace = handler.trace
+    children = [child for child in trace.spans if child.parent_id == handler.id]
+    endpoint = next((child for child in children if child.name == "endpoint"), None)
+    dependencies = trace.start_span("dependencies", handler.id)
+    dependencies.start = handler.start
+    dependencies.end = endpoint.start if endpoint is not None else handler.end
+    for child in children:
+        if child is not endpoint and child.start < dependencies.end:
+            child.parent_id = dependencies.id
+    if endpoint is not None and endpoint.end is not None:
+        serialize = trace.start_span("serialize", handler.id)
+        serialize.start = endpoint.end
+        serialize.end = handler.end
+
+
+class TracedRoute(APIRoute):
+    """APIRoute that records the dependency, endpoint and serialization phases of traced requests."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _traced_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            if current_span.get() is None:
+                return await handler(request)
+            with span("handler") as handler_span:
+                response = await handler(request)
+            _split_handler(handler_span)
+            return response
+
+        return traced_handler
+
+
+class TracingMiddleware:
+    """ASGI middleware that traces a sample of HTTP requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        root = trace.start_span("request", method=scope["method"], path=scope["path"])
+        token = current_span.set(root)
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                message["headers"] = headers + [(b"x-trace-id", trace.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            current_span.reset(token)
+            root.finish()
+            route = scope.get("route")
+            trace.route = route.path if route is not None else None
+            trace.status = status
+            trace_collector.add(trace)
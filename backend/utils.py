@@ -1,7 +1,11 @@
 from passlib.context import CryptContext
 import math
+import numpy as np
+from sqlalchemy import and_, or_
+from config import BCRYPT_ROUNDS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost than BCRYPT_ROUNDS report needs_update
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -9,12 +13,50 @@ def hash_password(password: str):
 def verify_password(plain, hashed):
     return pwd_context.verify(plain, hashed)
 
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """
+    Latitude/longitude box enclosing every point within radius_km of (lat, lon).
+    Returns (min_lat, max_lat, lon_ranges) where lon_ranges is a list of
+    (min_lon, max_lon) pairs: two when the box crosses the antimeridian and a
+    single (-180, 180) range when the circle reaches a pole.
+    """
+    R = 6371  # Earth's radius in kilometers
+    epsilon = 1e-9  # keeps points exactly on the radius inside the box
+    
+    angular = max(radius_km, 0) / R
+    dlat = math.degrees(angular) + epsilon
+    min_lat = max(-90.0, lat - dlat)
+    max_lat = min(90.0, lat + dlat)
+    
+    if angular >= math.pi or max_lat >= 90.0 or min_lat <= -90.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    
+    dlon = math.degrees(math.asin(ratio)) + epsilon
+    min_lon = lon - dlon
+    max_lon = lon + dlon
+    if min_lon < -180.0:
+        return min_lat, max_lat, [(min_lon + 360.0, 180.0), (-180.0, max_lon)]
+    if max_lon > 180.0:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+def within_bounding_box(lat_column, lon_column, lat: float, lon: float, radius_km: float):
+    """SQL filter keeping rows whose coordinates fall inside bounding_box()."""
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    return and_(
+        lat_column.between(min_lat, max_lat),
+        or_(*[lon_column.between(low, high) for low, high in lon_ranges])
+    )
+
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Calculate distance between two coordinates using Haversine formula.
     Returns distance in kilometers.
     """
-    if not all([lat1, lon1, lat2, lon2]):
+    if None in (lat1, lon1, lat2, lon2):
         return float('inf')  # Return infinity if any coordinate is missing
     
     R = 6371  # Earth's radius in kilometers
@@ -61,3 +103,59 @@ def calculate_match_score(distance_km: float, price: float, rating: float,
                   rating_score * rating_weight)
     
     return round(total_score, 2)
+
+
+def calculate_distances(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """
+    Vectorized calculate_distance from one point to arrays of coordinates.
+    Returns an array of distances in kilometers. Entries with a missing
+    (None or NaN) coordinate are infinity, as in calculate_distance.
+    Used by the in-memory read model and grid index; queries that run in
+    SQLite use the scalar version through haversine_km (database.py).
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if lat is None or lon is None:
+        return np.full(lats.shape, np.inf)
+    
+    R = 6371  # Earth's radius in kilometers
+    
+    lat1_rad = math.radians(lat)
+    lat2_rad = np.radians(lats)
+    delta_lat = np.radians(lats - lat)
+    delta_lon = np.radians(lons - lon)
+    
+    a = np.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    missing = np.isnan(lats) | np.isnan(lons)
+    return np.where(missing, np.inf, R * c)
+
+def calculate_match_scores(distances_km, prices, ratings,
+                           max_distance: float = 50, max_price: float = 5000,
+                           distance_weight: float = 0.4, price_weight: float = 0.3,
+                           rating_weight: float = 0.3) -> np.ndarray:
+    """
+    Vectorized calculate_match_score over arrays of distances, prices and ratings.
+    Takes the same thresholds and weights and returns an array of scores rounded
+    to 2 decimals. Like calculate_distances, this scores the read model's
+    candidates; SQL queries call calculate_match_score through match_score.
+    """
+    distances_km = np.asarray(distances_km, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    ratings = np.asarray(ratings, dtype=float)
+    
+    with np.errstate(invalid="ignore"):
+        distance_score = np.where(
+            distances_km <= max_distance,
+            np.maximum(0, 100 * (1 - distances_km / max_distance)),
+            0
+        )
+        price_score = np.where(prices > 0, np.maximum(0, 100 * (1 - prices / max_price)), 50)
+        rating_score = np.where(ratings > 0, (ratings / 5) * 100, 50)
+    
+    total_score = (distance_score * distance_weight +
+                   price_score * price_weight +
+                   rating_score * rating_weight)
+    
+    return np.round(total_score, 2)
@@ -0,0 +1,216 @@
+"""
+Serialized write pipeline.
+
+SQLite allows one writer at a time, and request sessions that write
+concurrently end up waiting on each other's locks or failing with "database is
+locked". Hot write paths (bookings, status changes, reviews, locations)
+instead hand their transaction to write_queue as a function of a session. A
+single writer thread runs queued jobs on one connection and commits several of
+them together (group commit). Each job runs inside its own SAVEPOINT, so a job
+that raises only undoes its own changes. If the commit hits SQLITE_BUSY the
+whole batch is rolled back and re-run with backoff.
+
+The queue is bounded: when it stays full for WRITE_QUEUE_TIMEOUT_SECONDS the
+request gets a 503 instead of piling up.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+from config import (
+    WRITE_QUEUE_LIMIT, WRITE_QUEUE_TIMEOUT_SECONDS, WRITE_BATCH_MAX, WRITE_BATCH_WINDOW_MS,
+    WRITE_RETRIES, WRITE_RETRY_BACKOFF_MS
+)
+from database import WriteSessionLocal
+
+
+def is_busy_error(error: Exception) -> bool:
+    """True for SQLite's SQLITE_BUSY/SQLITE_LOCKED errors, which are worth retrying."""
+    message = str(getattr(error, "orig", error)).lower()
+    return isinstance(error, OperationalError) and ("locked" in message or "busy" in message)
+
+
+class WriteJob:
+    def __init__(self, fn):
+        self.fn = fn
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+        # fn runs in the submitting request's context, so its queries are
+        # attributed to that request (query_metrics.py, profiler.py)
+        self.context = contextvars.copy_context()
+
+    def run(self, session):
+        return self.context.run(self.fn, session)
+
+
+class WriteQueue:
+    """Single-writer queue with group commit, busy retries and statistics."""
+
+    def __init__(self, session_factory=WriteSessionLocal, queue_limit: int = WRITE_QUEUE_LIMIT,
+                 batch_max: int = WRITE_BATCH_MAX, batch_window_ms: float = WRITE_BATCH_WINDOW_MS,
+                 retries: int = WRITE_RETRIES, retry_backoff_ms: float = WRITE_RETRY_BACKOFF_MS):
+        self.session_factory = session_factory
+        self.queue_limit = queue_limit
+        self.batch_max = batch_max
+        self.batch_window = batch_window_ms / 1000
+        self.retries = retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_limit)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.retried_batches = 0
+        self.max_batch_size = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.commit_seconds = 0.0
+
+    def submit(self, fn) -> Future:
+        """
+        Queue fn(session) to run in the next write transaction. The returned
+        future holds fn's result (or exception) once the transaction committed.
+        fn must not commit; it should return plain values or objects it loaded.
+        """
+        self._ensure_started()
+        job = WriteJob(fn)
+        try:
+            self._queue.put(job, timeout=WRITE_QUEUE_TIMEOUT_SECONDS)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many writes in progress, please retry",
+                headers={"Retry-After": "1"}
+            )
+        with self._stats_lock:
+            self.submitted += 1
+        return job.future
+
+    def run(self, fn):
+        """Submit fn and wait for its committed result."""
+        return self.submit(fn).result()
+
+    def stop(self):
+        """Finish queued jobs and stop the writer thread."""
+        with self._start_lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._work, name="db-writer", daemon=True)
+                    self._thread.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.batch_max:
+                try:
+                    timeout = deadline - time.perf_counter()
+                    job = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._run_batch(batch)
+                    return
+                batch.append(job)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        with self._stats_lock:
+            for job in batch:
+                wait = started - job.enqueued
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                with self._stats_lock:
+                    self.retried_batches += 1
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            session = self.session_factory()
+            try:
+                outcomes = []
+                for job in batch:
+                    savepoint = session.begin_nested()
+                    try:
+                        result = job.run(session)
+                        savepoint.commit()
+                    except Exception as error:
+                        if is_busy_error(error):
+                            raise
+                        savepoint.rollback()
+                        outcomes.append((False, error))
+                    else:
+                        outcomes.append((True, result))
+                session.commit()
+            except Exception as error:
+                session.rollback()
+                if is_busy_error(error) and attempt < self.retries:
+                    continue
+                if is_busy_error(error):
+                    error = HTTPException(
+                        status_code=503,
+                        detail="Database is busy, please retry",
+                        headers={"Retry-After": "1"}
+                    )
+                outcomes = [(False, error)] * len(batch)
+            finally:
+                session.close()
+            break
+
+        with self._stats_lock:
+            self.batches += 1
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.commit_seconds += time.perf_counter() - started
+            for ok, _ in outcomes:
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+        for job, (ok, value) in zip(batch, outcomes):
+            if ok:
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(value)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            done = self.completed + self.failed
+            return {
+                "queue_limit": self.queue_limit,
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "retried_batches": self.retried_batches,
+                "avg_batch_size": round(done / self.batches, 2) if self.batches else None,
+                "max_batch_size": self.max_batch_size,
+                "avg_wait_ms": round(self.wait_seconds / done * 1000, 2) if done else None,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "avg_batch_ms": round(self.commit_seconds / self.batches * 1000, 2) if self.batches else None,
+            }
+
+
+write_queue = WriteQueue()